@@ -4,22 +4,236 @@
 # aidan.gray@idg.jhu.edu
 #
 # AD7124 Analog-Digital Converter for the 12 temperature sensors.
+#
+# Two conversion modes. 'single' reads the data register and rewrites
+# ADC_CONTROL to start the next single conversion, so every sample costs
+# two transactions and returns whatever the previous restart produced.
+# A read before that conversion has settled would only return the same
+# sample again and restart the conversion, so that sample is returned
+# without touching the bus. Readers that poll faster than the filter
+# settles (the interlock, a fast PID loop) therefore cannot keep a channel
+# from ever finishing a conversion.
+# 'continuous' sets ADC_CONTROL once, with the STATUS register appended to
+# every data read (DATA_STATUS). A sample whose RDY bit shows it was
+# already read is discarded and STATUS is polled until the next one is
+# ready, so a read only ever returns a fresh conversion, and the channel
+# and error flag of each sample come for free.
+#
+# The digital filter is chosen per channel from FILTER_PROFILES (adc_filt),
+# trading noise for output data rate and settling time. The conversion
+# and settling times the scans are timed by are worked out from FILTER_0
+# and the power mode, so they also hold for a filter set up by hand.
 
-import RPi.GPIO as GPIO
+import asyncio
 import logging
 import time
 import struct
 
 from polyFit import polyFit
 
-DELAY = 0.00000000004
+CONVERSION_MODES = ('single', 'continuous')
+
+# ADC_CONTROL bits
+ADC_CTRL_DATA_STATUS = 1 << 10
+ADC_CTRL_POWER_MODE = 0b11 << 6
+ADC_CTRL_MODE = 0b1111 << 2      # 0000 = continuous conversion
+
+# STATUS bits
+STATUS_RDY = 1 << 7              # low while an unread conversion is waiting
+STATUS_ERROR = 1 << 6
+STATUS_POR = 1 << 4
+STATUS_CHANNEL = 0x0F
+
+# Registers written from AD7124_reg_dict at start up and on reset, so the
+# dictionary is an exact mirror of the chip for them. OFFSET/GAIN are not
+# (the chip keeps its factory calibration until they are set).
+SHADOWED_REGS = ('IO_CONTROL_1', 'IO_CONTROL_2', 'ERROR_EN', 'CHANNEL_0', 'CHANNEL_1',
+                 'CONFIG_0', 'CONFIG_1', 'FILTER_0', 'FILTER_1')
+
+MCLK_HZ = (76800, 153600, 614400, 614400)  # by POWER_MODE: low, mid, full
+READY_POLL = 0.002               # seconds between STATUS polls
+RESET_DELAY = 0.1                # seconds between the steps of a reset
+RESET_TIMEOUT = 2.0              # seconds for the POR flag to clear after a reset
+
+POWER_MODES = {'low': 0b00, 'mid': 0b01, 'full': 0b11}
+
+# FILTER_0/1 fields
+FILTER_TYPE = 0b111 << 21
+FILTER_REJ60 = 1 << 20           # extra 60 Hz notch when the first notch is at 50 Hz
+FILTER_POST = 0b111 << 17
+FILTER_SINGLE_CYCLE = 1 << 16    # only output settled conversions
+FILTER_FS = 0x7FF
+
+FILTER_SINC4 = 0b000
+FILTER_SINC3 = 0b010
+FILTER_FAST_SINC4 = 0b100        # sinc4 + averaging, settles in one conversion
+FILTER_FAST_SINC3 = 0b101
+FILTER_POST_SINC3 = 0b111        # sinc3 + post filter, fixed output data rate
+
+POST_FILTER_HZ = {0b010: 27.27, 0b011: 25.0, 0b101: 20.0, 0b110: 16.67}  # at full power
+FAST_AVG = (8, 16, 16, 16)       # fast settling filter averaging, by POWER_MODE
+
+# ADC filter profiles, selected per channel by index with adc_filt.
+# Output data rate, settling time (from a SYNC pulse or restart to the
+# first settled conversion) and RMS noise trade against each other:
+#
+#   0 sinc4_9sps   9.4 SPS  427 ms  0.7 uV  EEPROM default
+#   1 sinc4_50sps   50 SPS   80 ms  1.5 uV  50 Hz rejection
+#   2 sinc3_50sps   50 SPS   60 ms  1.9 uV  50 Hz rejection
+#   3 fast_50sps  50.5 SPS   20 ms  2.1 uV  fast settling sinc4
+#   4 post_25sps    25 SPS   40 ms  1.2 uV  50/60 Hz rejection
+#   5 low_power     10 SPS  400 ms  1.6 uV  50/60 Hz rejection, low power
+#
+# NOISE_UV is approximate, at gain 1 with the 2.5V reference, from the
+# datasheet noise tables. It is there to rank the profiles, the noise of
+# a channel also depends on its gain.
+FILTER_PROFILES = (
+    {'NAME': 'sinc4_9sps', 'FILTER': FILTER_SINC4, 'POST': 0b011, 'FS': 2047, 'POWER': 'full', 'NOISE_UV': 0.7},
+    {'NAME': 'sinc4_50sps', 'FILTER': FILTER_SINC4, 'POST': 0b011, 'FS': 384, 'POWER': 'full', 'NOISE_UV': 1.5},
+    {'NAME': 'sinc3_50sps', 'FILTER': FILTER_SINC3, 'POST': 0b011, 'FS': 384, 'POWER': 'full', 'NOISE_UV': 1.9},
+    {'NAME': 'fast_50sps', 'FILTER': FILTER_FAST_SINC4, 'POST': 0b011, 'FS': 20, 'POWER': 'full', 'NOISE_UV': 2.1},
+    {'NAME': 'post_25sps', 'FILTER': FILTER_POST_SINC3, 'POST': 0b011, 'FS': 384, 'POWER': 'full', 'NOISE_UV': 1.2},
+    {'NAME': 'low_power', 'FILTER': FILTER_SINC4, 'POST': 0b011, 'FS': 240, 'POWER': 'low', 'NOISE_UV': 1.6},
+    )
+
+# IO_CONTROL_1 fields
+IO1_IOUT0 = 0b111 << 11          # excitation current
+IO1_4_WIRE = 1 << 15
+IO1_REF_LO = 1 << 22             # 'lo'=small resistor
+EXCIT_CODES = {0: 0, 1: 1, 2: 2, 3: 3, 4: 4, 5: 5, 6: 7, 7: 7}  # 0=off, 1=50uA, 3=250uA, ...
+
+# CONFIG_0 fields
+CFG0_PGA = 0b111
+CFG0_REF_SEL = 0b11 << 3
+PGA_CODES = {1: 0, 2: 1, 4: 2, 8: 3, 16: 4, 32: 5, 64: 6, 128: 7}
+REFIN_CODES = {1: 0, 2: 1, 3: 2, 4: 3}  # 1=REFIN1(+)/REFIN1(-), 3=internal reference
+
+# Front end setup and scale constants for each sensor type (SNS_TYPE).
+# EXCIT: excitation current code, PGA: gain, REFIN: reference input,
+# REF_V: reference resistor, WIRES: 2/4 wire, CAL: Gbl.sensor_cal key.
+# Diodes are measured as a voltage, so their EXCIT_CUR is 1.0 to leave
+# the reading undivided.
+SNS_PROFILES = {
+    1: {'NAME': 'PT-100 2-Wire', 'EXCIT': 3, 'PGA': 16, 'REFIN': 1, 'REF_V': 'lo', 'WIRES': 2,
+        'VREF': 0.98, 'EXCIT_CUR': 0.000250, 'CAL': 'PT100'},
+    2: {'NAME': 'PT-100 4-Wire', 'EXCIT': 3, 'PGA': 16, 'REFIN': 1, 'REF_V': 'lo', 'WIRES': 4,
+        'VREF': 0.98, 'EXCIT_CUR': 0.000250, 'CAL': 'PT100'},
+    3: {'NAME': 'PT-1000 2-Wire', 'EXCIT': 3, 'PGA': 2, 'REFIN': 1, 'REF_V': 'lo', 'WIRES': 2,
+        'VREF': 0.98, 'EXCIT_CUR': 0.000250, 'CAL': 'PT1000'},
+    4: {'NAME': 'PT-1000 4-Wire', 'EXCIT': 3, 'PGA': 2, 'REFIN': 1, 'REF_V': 'lo', 'WIRES': 4,
+        'VREF': 0.98, 'EXCIT_CUR': 0.000250, 'CAL': 'PT1000'},
+    5: {'NAME': 'DIODE 2-Wire', 'EXCIT': 1, 'PGA': 1, 'REFIN': 3, 'REF_V': 'lo', 'WIRES': 2,
+        'VREF': 2.5, 'EXCIT_CUR': 1.0, 'CAL': 'DIODE'},
+    6: {'NAME': 'DIODE 4-Wire', 'EXCIT': 1, 'PGA': 1, 'REFIN': 3, 'REF_V': 'lo', 'WIRES': 4,
+        'VREF': 2.5, 'EXCIT_CUR': 1.0, 'CAL': 'DIODE'},
+    }
+
+def io_control_1_bits(io_control_1, excit=None, refV=None, wires=None):
+    """
+    Input:
+    - io_control_1: current register value
+    - excit:        excitation current code, 0-7
+    - refV:         'hi' or 'lo'
+    - wires:        2 or 4
+    A field left as None, or given an unknown value, is not changed.
+
+    Output:
+    - new register value
+    """
+    if excit in EXCIT_CODES:
+        io_control_1 = (io_control_1 & ~IO1_IOUT0) | (EXCIT_CODES[excit] << 11)
+    if refV == 'hi':
+        io_control_1 &= ~IO1_REF_LO
+    elif refV == 'lo':
+        io_control_1 |= IO1_REF_LO
+    if wires == 2:
+        io_control_1 &= ~IO1_4_WIRE
+    elif wires == 4:
+        io_control_1 |= IO1_4_WIRE
+    return io_control_1
+
+def config_0_bits(config_0, pga=None, refin=None):
+    """
+    Input:
+    - config_0: current register value
+    - pga:      gain, 1-128
+    - refin:    reference input, 1-4
+    A field left as None, or given an unknown value, is not changed.
+
+    Output:
+    - new register value
+    """
+    if pga in PGA_CODES:
+        config_0 = (config_0 & ~CFG0_PGA) | PGA_CODES[pga]
+    if refin in REFIN_CODES:
+        config_0 = (config_0 & ~CFG0_REF_SEL) | (REFIN_CODES[refin] << 3)
+    return config_0
+
+def sns_registers(profile, io_control_1, config_0):
+    """
+    Input:
+    - profile:      SNS_PROFILES entry
+    - io_control_1: current IO_CONTROL_1 value
+    - config_0:     current CONFIG_0 value
+
+    Output:
+    - IO_CONTROL_1 and CONFIG_0 values for the sensor type
+    """
+    io_control_1 = io_control_1_bits(io_control_1, excit=profile['EXCIT'],
+                                     refV=profile['REF_V'], wires=profile['WIRES'])
+    config_0 = config_0_bits(config_0, pga=profile['PGA'], refin=profile['REFIN'])
+    return io_control_1, config_0
+
+def filter_registers(profile, adc_control):
+    """
+    Input:
+    - profile:     FILTER_PROFILES entry
+    - adc_control: current ADC_CONTROL value
+
+    Output:
+    - FILTER_0 and ADC_CONTROL values for the profile
+    """
+    filter_0 = (profile['FILTER'] << 21) | FILTER_REJ60 | (profile['POST'] << 17) | profile['FS']
+    adc_control = (adc_control & ~ADC_CTRL_POWER_MODE) | (POWER_MODES[profile['POWER']] << 6)
+    return filter_0, adc_control
+
+def filter_timing(filter_0, powerMode):
+    """
+    Input:
+    - filter_0:  FILTER_0 value
+    - powerMode: ADC_CONTROL POWER_MODE field, 0-3
+
+    Output:
+    - seconds between continuous mode conversions
+    - seconds from a SYNC pulse or restart to the first settled conversion
+    """
+    filterType = (filter_0 & FILTER_TYPE) >> 21
+
+    if filterType == FILTER_POST_SINC3:
+        # unknown post filter settings are taken as the slowest one
+        period = 1 / POST_FILTER_HZ.get((filter_0 & FILTER_POST) >> 17, min(POST_FILTER_HZ.values()))
+        return period, period
+
+    period = 32 * max(filter_0 & FILTER_FS, 1) / MCLK_HZ[powerMode]
+    order = 3 if filterType in (FILTER_SINC3, FILTER_FAST_SINC3) else 4
+
+    if filterType in (FILTER_FAST_SINC4, FILTER_FAST_SINC3):
+        period *= order + FAST_AVG[powerMode] - 1
+        settling = period
+    else:
+        settling = order * period
+
+    if filter_0 & FILTER_SINGLE_CYCLE:
+        period = settling
+
+    return period, settling
 
 class AD7124Error(ValueError):
     pass
 
 class AD7124:
 
-    def __init__(self, idx, io, eeprom, tlm, cal):
+    def __init__(self, idx, io, eeprom, tlm, cal, convMode='single'):
         if idx < 0 or idx > 11:
             raise AD7124Error("Failed to initialize AD7124. Index out of range.")
         
@@ -32,9 +246,7 @@ class AD7124:
         self.calib_fit = None
 
         # GPIO Pins
-        self.mosi = self.io.pin_map['SPI0_MOSI']
-        self.miso = self.io.pin_map['SPI0_MISO']
-        self.sclk = self.io.pin_map['SPI0_SCLK']
+        self.spi = self.io.spi0
         self.sync = self.io.pin_map['nADC_SYNC']
 
         # Get initialization data from EEPROM
@@ -51,7 +263,7 @@ class AD7124:
                                 'FILTER_1':     [0x22, int.from_bytes(self.eeprom.ADCmem[self.idx][21:24], byteorder='big', signed=False), 3],
                                 'OFFSET_0':     [0x29, int.from_bytes(self.eeprom.ADCmem[self.idx][24:27], byteorder='big', signed=False), 3],
                                 'OFFSET_1':     [0x2A, int.from_bytes(self.eeprom.ADCmem[self.idx][27:30], byteorder='big', signed=False), 3],
-                                'filler':       [0x00, int.from_bytes(self.eeprom.ADCmem[self.idx][30:32], byteorder='big', signed=False), 2],
+                                'ADC_FILT':     [0x00, int.from_bytes(self.eeprom.ADCmem[self.idx][30:32], byteorder='big', signed=False), 2],
                                 'GAIN_0':       [0x31, int.from_bytes(self.eeprom.ADCmem[self.idx][32:35], byteorder='big', signed=False), 3],
                                 'GAIN_1':       [0x32, int.from_bytes(self.eeprom.ADCmem[self.idx][35:38], byteorder='big', signed=False), 3],
                                 'SNS_TYPE':      [0x00, int.from_bytes(self.eeprom.ADCmem[self.idx][38:39], byteorder='big', signed=False), 1],
@@ -77,9 +289,34 @@ class AD7124:
             adcC &=~ (1<<1)
             self.AD7124_reg_dict['ADC_CONTROL'][1] = adcC
         
-        for n in list(self.AD7124_reg_dict)[0:10]:
-            register = self.AD7124_reg_dict[n]
-            self.__adc_write_data(register[0], register[1], register[2])
+        # FILTER_PROFILES index, anything else (0xFFFF when never set)
+        # leaves FILTER_0 and the power mode as stored
+        self.filter_profile = self.AD7124_reg_dict['ADC_FILT'][1]
+        if self.filter_profile < len(FILTER_PROFILES):
+            filter_0, adcC = filter_registers(FILTER_PROFILES[self.filter_profile],
+                                              self.AD7124_reg_dict['ADC_CONTROL'][1])
+            self.AD7124_reg_dict['FILTER_0'][1] = filter_0
+            self.AD7124_reg_dict['ADC_CONTROL'][1] = adcC
+        else:
+            self.filter_profile = None
+
+        # Fold the sensor type's setup into the registers written below, so
+        # set_sns_type finds nothing left to write
+        profile = SNS_PROFILES.get(self.AD7124_reg_dict['SNS_TYPE'][1])
+        if profile is not None:
+            io_control_1, config_0 = sns_registers(profile,
+                                                   self.AD7124_reg_dict['IO_CONTROL_1'][1],
+                                                   self.AD7124_reg_dict['CONFIG_0'][1])
+            self.AD7124_reg_dict['IO_CONTROL_1'][1] = io_control_1
+            self.AD7124_reg_dict['CONFIG_0'][1] = config_0
+
+        self.__reload_registers()
+
+        self.sample_status = None  # STATUS byte of the last continuous mode sample
+        self.data = None           # last single mode sample
+        self.lastRead = 0.0        # time.monotonic() of the last sample read
+        self.resetting = False
+        self.set_conversion_mode(convMode)
 
         temp_calMode = self.AD7124_reg_dict['CAL_MODE'][1]  # 0=Default Calibration, 1=User set
         self.sns_type = self.AD7124_reg_dict['SNS_TYPE'][1]  # 0=Not set, 1=2wire-PT100, 2=4wire-PT100, 3=2wire-PT1000, 4=4wire-PT1000, 5=2wire-DIODE, 6=4wire-DIODE
@@ -94,32 +331,57 @@ class AD7124:
                 calCoeffs.append(coeff_float)
             self.calib_fit = polyFit(coeffs=calCoeffs)
 
-    def reset(self):
-        data2 = 65535
-        data3 = 16777215
+    async def reset(self, bus, timeout=RESET_TIMEOUT):
+        """
+        Reset the chip and reload its registers from the register mirror.
+        Each step is a separate request on the bus and the waits are spent
+        on the event loop, so the other ADCs are read in between. This one
+        reads as -999 until it is done.
 
-        # Write 64 1's in a row to reset the AD7124
-        self.__adc_xmit_data(0, 0, data3, 3)
-        time.sleep(0.1)
-        self.__adc_xmit_data(0, 0, data3, 3)
-        time.sleep(0.1)
-        self.__adc_xmit_data(0, 0, data2, 2)
-        time.sleep(0.1)
+        Input:
+        - bus:     BusWorker of the ADC bank
+        - timeout: seconds to wait for the power-on reset flag to clear
+
+        Output:
+        - 'OK', or a BAD response if the flag did not clear in time
+        """
+        if self.resetting:
+            return f'BAD,command failure: ADC {self.idx+1} is already being reset'
+
+        self.resetting = True
+        try:
+            await bus.run(self.__send_reset)
+            await asyncio.sleep(RESET_DELAY)
+            await bus.run(self.__reload_registers)
+
+            deadline = time.monotonic() + timeout
+            while await bus.run(self.get_POR_FLAG):
+                if time.monotonic() > deadline:
+                    msg = f'ADC {self.idx+1} POR flag did not clear within {timeout}s of a reset'
+                    self.logger.error(msg)
+                    return f'BAD,command failure: {msg}'
+                await asyncio.sleep(RESET_DELAY)
+
+            self.sample_status = None
+            self.data = None
+            await bus.run(self.__reset_conversion_mode)
+        finally:
+            self.resetting = False
+
+        return 'OK'
 
-        GPIO.output(self.sync, 1)  # SYNC(CS) HIGH
-        time.sleep(DELAY)
+    def __send_reset(self):
+        # Write 64 1's in a row to reset the AD7124
+        self.__adc_xmit_data(0, 0, 0xFFFFFF, 3)
+        self.__adc_xmit_data(0, 0, 0xFFFFFF, 3)
+        self.__adc_xmit_data(0, 0, 0xFFFF, 2)
+        self.io.output(self.sync, 1)  # SYNC(CS) HIGH
 
+    def __reload_registers(self):
         for n in list(self.AD7124_reg_dict)[0:10]:
             register = self.AD7124_reg_dict[n]
             self.__adc_write_data(register[0], register[1], register[2])
 
-        while self.get_POR_FLAG():
-            time.sleep(0.1)
-            print('...')
-
-        self.__reset_conversion_mode()
-        return 'OK'
-
 
     def __adc_xmit_data(self, readWrite, regAddr, data, dataSize):
         """
@@ -142,36 +404,17 @@ class AD7124:
             else:
                 writeByteArray = regAddr.to_bytes(1, byteorder = 'big') + data.to_bytes(dataSize, byteorder = 'big')
             
-            GPIO.output(self.sync, 1)  # SYNC (CS) HIGH
+            self.io.output(self.sync, 1)  # SYNC (CS) HIGH
             
             self.io.adc_sel(self.idx)  # Select the ADC
             
-            GPIO.output(self.sync, 0)  # SYNC (CS) LOW
+            self.io.output(self.sync, 0)  # SYNC (CS) LOW
 
-            for byte in writeByteArray:
-                self.__adc_write_byte(byte) 
-            
-            GPIO.output(self.sclk, 1)  # set clock high
+            self.spi.write(writeByteArray)
         
         else:
             raise AD7124Error('Max write size = 24bits, Min write size = 8bits.')
 
-    def __adc_write_byte(self, writeByte):
-        """
-        Write a single byte to the ADC
-
-        Input:
-        - writeByte: 1 byte
-        """
-        
-        for i in range(8):
-            GPIO.output(self.sclk, 0)  # set clock low         
-            if writeByte & 2**(7-i):
-                GPIO.output(self.mosi, 1)
-            else:
-                GPIO.output(self.mosi, 0)
-            GPIO.output(self.sclk, 1)  # Clock high
-
     def __adc_write_data(self, regAddr, data, dataSize):
         """
         Write data to the ADC
@@ -186,31 +429,7 @@ class AD7124:
         """
 
         self.__adc_xmit_data(0, regAddr, data, dataSize)
-        GPIO.output(self.sync, 1)  # SYNC(CS) HIGH
-        time.sleep(DELAY)
-
-    def __adc_read_byte(self):
-        """
-        Write a single byte from the ADC
-
-        Output:
-        - readByte: 1 byte
-        """
-        readByte = 0
-
-        GPIO.output(self.sclk, 1)  # set clock high
-        
-        for i in range(8):         
-            GPIO.output(self.sclk, 0)  # Clock low
-            bitVal = GPIO.input(self.miso)
-            GPIO.output(self.sclk, 1)  # Clock high
-            
-            if bitVal == 1:
-                readByte = readByte | 2**(7-i)
-
-        GPIO.output(self.sclk, 1)  # Clock high
-        
-        return readByte
+        self.io.output(self.sync, 1)  # SYNC(CS) HIGH
 
     def __adc_read_data(self, regAddr, readSize):
         """
@@ -226,16 +445,9 @@ class AD7124:
 
         self.__adc_xmit_data(1, regAddr, 0, 0)
 
-        nopComm = 0
-        nopByteArray = nopComm.to_bytes(readSize, byteorder = 'big')
-
-        returnBytes = bytearray(0)
-        for byte in nopByteArray:
-            readByte = self.__adc_read_byte()
-            returnBytes.append(readByte)
+        returnBytes = self.spi.read(readSize)
         
-        GPIO.output(self.sync, 1)  # SYNC (CS) HIGH
-        time.sleep(DELAY)
+        self.io.output(self.sync, 1)  # SYNC (CS) HIGH
 
         # convert bytearray to int
         returnData = int.from_bytes(returnBytes, byteorder = 'big')
@@ -244,10 +456,67 @@ class AD7124:
 
     def __reset_conversion_mode(self):
         self.__adc_write_data(self.AD7124_reg_dict['ADC_CONTROL'][0],
-                                self.AD7124_reg_dict['ADC_CONTROL'][1],
+                                self.adc_control,
                                 self.AD7124_reg_dict['ADC_CONTROL'][2])
-        cntrl_data = self.AD7124_reg_dict['ADC_CONTROL'][1]
-        print(f'writing: {cntrl_data}')
+
+    def __write_register(self, name, data):
+        """
+        Write a register and its mirror. Shadowed registers that already
+        hold data are not written.
+
+        Output:
+        - True if the register was written
+        """
+        register = self.AD7124_reg_dict[name]
+        if name in SHADOWED_REGS and register[1] == data:
+            return False
+
+        register[1] = data
+        self.__adc_write_data(register[0], data, register[2])
+        return True
+
+    def verify(self):
+        """
+        Read the chip back and compare it with the register mirror, to
+        catch a power-on reset or registers that drifted.
+
+        Output:
+        - list of problems, empty if the chip matches: 'POR' if the
+          power-on reset flag is set, then every register that differs
+        """
+        problems = []
+        if self.get_POR_FLAG():
+            problems.append('POR')
+
+        for name in SHADOWED_REGS:
+            register = self.AD7124_reg_dict[name]
+            if self.__adc_read_data(register[0], register[2]) != register[1]:
+                problems.append(name)
+
+        if problems:
+            self.logger.warning(f'ADC {self.idx+1} does not match its register mirror: {problems}')
+
+        return problems
+
+    def __read_sample(self):
+        """
+        Read the next unread continuous mode conversion.
+
+        Output:
+        - (data, status)
+        """
+        raw = self.__adc_read_data(0x02, 4)  # DATA + appended STATUS
+
+        if raw & STATUS_RDY:
+            # Already read, wait for the next conversion
+            deadline = time.monotonic() + 4 * self.conversion_period() + 0.1
+            while self.get_STATUS() & STATUS_RDY:
+                if time.monotonic() > deadline:
+                    raise AD7124Error(f'ADC {self.idx+1}: timed out waiting for a conversion')
+                time.sleep(READY_POLL)
+            raw = self.__adc_read_data(0x02, 4)
+
+        return raw >> 8, raw & 0xFF
 
     def float_to_int(self, f, sign=False):
         i = int.from_bytes(bytearray(struct.pack(">f", f)), byteorder='big', signed=sign)
@@ -264,7 +533,7 @@ class AD7124:
 
     def get_POR_FLAG(self):
         status = self.get_STATUS()
-        if status & (1 << 4) != 0:
+        if status & STATUS_POR != 0:
             return True
         else:
             return False
@@ -273,10 +542,70 @@ class AD7124:
         return self.__adc_read_data(0x01, 2)
 
     def get_DATA(self):
+        if self.conv_mode == 'continuous':
+            data, status = self.__read_sample()
+            self.sample_status = status
+            self.tlm[f'sns_status_{self.idx+1}'] = status
+            self.lastRead = time.monotonic()
+            return data
+
+        if self.data is not None and not self.sample_ready():
+            # The conversion restarted by the last read has not settled
+            return self.data
+
         data = self.__adc_read_data(0x02, 3)
         self.__reset_conversion_mode()
+        self.data = data
+        self.lastRead = time.monotonic()
         return data
 
+    def sample_ready(self):
+        """
+        Output:
+        - True if sample_interval() has passed since the last read, so
+          the next read returns a new settled sample
+        """
+        return time.monotonic() - self.lastRead >= self.sample_interval()
+
+    def get_sample_channel(self):
+        if self.sample_status is None:
+            return None
+        return self.sample_status & STATUS_CHANNEL
+
+    def get_sample_error(self):
+        if self.sample_status is None:
+            return None
+        return bool(self.sample_status & STATUS_ERROR)
+
+    def settling_time(self):
+        """
+        Output:
+        - seconds from a SYNC pulse or restart to the first settled
+          conversion, for FILTER_0 and the power mode
+        """
+        return filter_timing(self.AD7124_reg_dict['FILTER_0'][1],
+                             (self.adc_control & ADC_CTRL_POWER_MODE) >> 6)[1]
+
+    def conversion_period(self):
+        """
+        Output:
+        - seconds between continuous mode conversions, for FILTER_0 and
+          the power mode
+        """
+        return filter_timing(self.AD7124_reg_dict['FILTER_0'][1],
+                             (self.adc_control & ADC_CTRL_POWER_MODE) >> 6)[0]
+
+    def sample_interval(self):
+        """
+        Output:
+        - shortest time between two reads that each return a new settled
+          sample: a single conversion restarted by the last read has to
+          settle, a continuous one only has to convert
+        """
+        if self.conv_mode == 'single':
+            return self.settling_time()
+        return self.conversion_period()
+
     def get_IO_CONTROL_1(self):
         return self.__adc_read_data(0x03, 3)
     
@@ -326,12 +655,27 @@ class AD7124:
         return self.__adc_read_data(0x32, 3)
 
     def get_excitation_current(self):
-        io_control_1 = self.get_IO_CONTROL_1()
+        io_control_1 = self.AD7124_reg_dict['IO_CONTROL_1'][1]
         return io_control_1 >> 11 & 0b111
 
     def get_sns_type(self):
         return self.sns_type
 
+    def get_filter_profile(self):
+        """
+        Output:
+        - FILTER_PROFILES index, None if the filter is as stored in the EEPROM
+        - profile name ('eeprom' if None)
+        - conversion period and settling time in seconds
+        - approximate RMS noise in uV, None if unknown
+        """
+        if self.filter_profile is None:
+            name, noise = 'eeprom', None
+        else:
+            name = FILTER_PROFILES[self.filter_profile]['NAME']
+            noise = FILTER_PROFILES[self.filter_profile]['NOISE_UV']
+        return self.filter_profile, name, self.conversion_period(), self.settling_time(), noise
+
     def get_sns_units(self):
         return self.sns_units
 
@@ -346,7 +690,7 @@ class AD7124:
         return coeffList
 
     def get_temperature(self):
-        if self.calib_fit != None:
+        if self.calib_fit != None and not self.resetting:
             data = self.get_DATA()
             #print(f'{self.idx+1}={data}')
             dataTmp = ((float(data) * float(self.vref)) / (float(2**24) * float(self.excit_cur))) / float(self.gain)
@@ -373,170 +717,90 @@ class AD7124:
         return temperature
 
     ### SETTERS ###
+    def set_conversion_mode(self, mode):
+        """
+        Input:
+        - mode: 'single' uses ADC_CONTROL as stored in the EEPROM,
+                'continuous' switches it to continuous conversion with
+                DATA_STATUS
+        """
+        if mode not in CONVERSION_MODES:
+            raise AD7124Error(f'Invalid conversion mode: {mode!r}. Must be one of {CONVERSION_MODES}')
+
+        adcC = self.AD7124_reg_dict['ADC_CONTROL'][1]
+        if mode == 'continuous':
+            adcC = (adcC & ~ADC_CTRL_MODE) | ADC_CTRL_DATA_STATUS
+
+        self.conv_mode = mode
+        self.adc_control = adcC
+        self.sample_status = None
+        self.data = None
+
+        if mode == 'continuous':
+            self.__reset_conversion_mode()
+
     def set_ADC_CONTROL(self, data):
         self.AD7124_reg_dict['ADC_CONTROL'][1] = data
         self.__adc_write_data(0x01, data, 2)
+        self.set_conversion_mode(self.conv_mode)
     
     def set_IO_CONTROL_1(self, data):
-        self.AD7124_reg_dict['IO_CONTROL_1'][1] = data
-        self.__adc_write_data(0x03, data, 3)
+        self.__write_register('IO_CONTROL_1', data)
     
     def set_IO_CONTROL_2(self, data):
-        self.AD7124_reg_dict['IO_CONTROL_2'][1] = data
-        self.__adc_write_data(0x04, data, 2)
+        self.__write_register('IO_CONTROL_2', data)
 
     def set_ERROR_EN(self, data):
-        self.AD7124_reg_dict['ERROR_EN'][1] = data
-        self.__adc_write_data(0x07, data, 3)
+        self.__write_register('ERROR_EN', data)
 
     def set_CHANNEL_0(self, data):
-        self.AD7124_reg_dict['CHANNEL_0'][1] = data
-        self.__adc_write_data(0x09, data, 2)
+        self.__write_register('CHANNEL_0', data)
 
     def set_CHANNEL_1(self, data):
-        self.AD7124_reg_dict['CHANNEL_1'][1] = data
-        self.__adc_write_data(0x0A, data, 2)
+        self.__write_register('CHANNEL_1', data)
 
     def set_CONFIG_0(self, data):
-        self.AD7124_reg_dict['CONFIG_0'][1] = data
-        self.__adc_write_data(0x19, data, 2)
+        self.__write_register('CONFIG_0', data)
 
     def set_CONFIG_1(self, data):
-        self.AD7124_reg_dict['CONFIG_1'][1] = data
-        self.__adc_write_data(0x1A, data, 2)
+        self.__write_register('CONFIG_1', data)
 
     def set_FILTER_0(self, data):
-        self.AD7124_reg_dict['FILTER_0'][1] = data
-        self.__adc_write_data(0x21, data, 3)
+        self.__write_register('FILTER_0', data)
     
     def set_FILTER_1(self, data):
-        self.AD7124_reg_dict['FILTER_1'][1] = data
-        self.__adc_write_data(0x22, data, 3)
+        self.__write_register('FILTER_1', data)
 
     def set_OFFSET_0(self, data):
-        self.AD7124_reg_dict['OFFSET_0'][1] = data
-        self.__adc_write_data(0x29, data, 3)
+        self.__write_register('OFFSET_0', data)
 
     def set_OFFSET_1(self, data):
-        self.AD7124_reg_dict['OFFSET_1'][1] = data
-        self.__adc_write_data(0x2A, data, 3)
+        self.__write_register('OFFSET_1', data)
 
     def set_GAIN_0(self, data):
-        self.AD7124_reg_dict['GAIN_0'][1] = data
-        self.__adc_write_data(0x31, data, 3)
+        self.__write_register('GAIN_0', data)
 
     def set_GAIN_1(self, data):
-        self.AD7124_reg_dict['GAIN_1'][1] = data
-        self.__adc_write_data(0x32, data, 3)
+        self.__write_register('GAIN_1', data)
 
     def set_excitation_current(self, val):
-        io_control_1 = self.get_IO_CONTROL_1()
-        
-        if val == 0:
-            io_control_1 &=~ (1<<11)
-            io_control_1 &=~ (1<<12)
-            io_control_1 &=~ (1<<13)
-        elif val == 1:
-            io_control_1 |= (1<<11)
-            io_control_1 &=~ (1<<12)
-            io_control_1 &=~ (1<<13)
-        elif val == 2:
-            io_control_1 &=~ (1<<11)
-            io_control_1 |= (1<<12)
-            io_control_1 &=~ (1<<13)
-        elif val == 3:
-            io_control_1 |= (1<<11)
-            io_control_1 |= (1<<12)
-            io_control_1 &=~ (1<<13)
-        elif val == 4:
-            io_control_1 &=~ (1<<11)
-            io_control_1 &=~ (1<<12)
-            io_control_1 |= (1<<13)
-        elif val == 5:
-            io_control_1 |= (1<<11)
-            io_control_1 &=~ (1<<12)
-            io_control_1 |= (1<<13)
-        elif val == 6 or val == 7:
-            io_control_1 |= (1<<11)
-            io_control_1 |= (1<<12)
-            io_control_1 |= (1<<13)
-        
+        io_control_1 = io_control_1_bits(self.AD7124_reg_dict['IO_CONTROL_1'][1], excit=val)
         self.set_IO_CONTROL_1(io_control_1)
 
     def set_pga(self, val):
-        config_0 = self.get_CONFIG_0()
-        
-        if val == 1:
-            config_0 &=~ (1<<0)
-            config_0 &=~ (1<<1)
-            config_0 &=~ (1<<2)
-        elif val == 2:
-            config_0 |= (1<<0)
-            config_0 &=~ (1<<1)
-            config_0 &=~ (1<<2)
-        elif val == 4:
-            config_0 &=~ (1<<0)
-            config_0 |= (1<<1)
-            config_0 &=~ (1<<2)
-        elif val == 8:
-            config_0 |= (1<<0)
-            config_0 |= (1<<1)
-            config_0 &=~ (1<<2)
-        elif val == 16:
-            config_0 &=~ (1<<0)
-            config_0 &=~ (1<<1)
-            config_0 |= (1<<2)
-        elif val == 32:
-            config_0 |= (1<<0)
-            config_0 &=~ (1<<1)
-            config_0 |= (1<<2)
-        elif val == 64:
-            config_0 &=~ (1<<0)
-            config_0 |= (1<<1)
-            config_0 |= (1<<2)
-        elif val == 128:
-            config_0 |= (1<<0)
-            config_0 |= (1<<1)
-            config_0 |= (1<<2)
-        
+        config_0 = config_0_bits(self.AD7124_reg_dict['CONFIG_0'][1], pga=val)
         self.set_CONFIG_0(config_0)
 
     def set_refin(self, val):
-        config_0 = self.get_CONFIG_0()
-        
-        if val == 1:
-            config_0 &=~ (1<<3)
-            config_0 &=~ (1<<4)
-        elif val == 2:
-            config_0 |= (1<<3)
-            config_0 &=~ (1<<4)
-        elif val == 3:
-            config_0 &=~ (1<<3)
-            config_0 |= (1<<4)
-        elif val == 4:
-            config_0 |= (1<<3)
-            config_0 |= (1<<4)
-        
+        config_0 = config_0_bits(self.AD7124_reg_dict['CONFIG_0'][1], refin=val)
         self.set_CONFIG_0(config_0)
 
     def set_refV(self, val):
-        io_control_1 = self.get_IO_CONTROL_1()
-        
-        if val == 'hi':
-            io_control_1 &=~ (1<<22)
-        elif val == 'lo':
-            io_control_1 |= (1<<22)
-
+        io_control_1 = io_control_1_bits(self.AD7124_reg_dict['IO_CONTROL_1'][1], refV=val)
         self.set_IO_CONTROL_1(io_control_1)
 
     def set_2_4_wire(self, val):
-        io_control_1 = self.get_IO_CONTROL_1()
-        
-        if val == 2:
-            io_control_1 &=~ (1<<15)
-        elif val == 4:
-            io_control_1 |= (1<<15)
-
+        io_control_1 = io_control_1_bits(self.AD7124_reg_dict['IO_CONTROL_1'][1], wires=val)
         self.set_IO_CONTROL_1(io_control_1)
 
     def set_sns_type(self, sns=None):
@@ -544,104 +808,51 @@ class AD7124:
             self.sns_type = sns
 
         self.AD7124_reg_dict['SNS_TYPE'][1] = self.sns_type
-
-        if self.sns_type == 1:
-            # PT-100 2-Wire
-            self.set_excitation_current(3)  # 3=250uA
-            self.set_pga(16)  # 16=16x Gain
-            self.set_refin(1)  # 1=REFIN1(+)/REFIN1(-)
-            self.set_refV('lo')  # 'lo'=small resistor
-            self.set_2_4_wire(2)
-            self.vref = 0.98
-            self.excit_cur = 0.000250
-            self.gain = 16
-            calCoeffs = self.cal_dict['PT100']
-            self.calib_fit = polyFit(coeffs=calCoeffs)
-            self.calMode = 0
-            self.AD7124_reg_dict['CAL_MODE'][1] = 0
-        
-        elif self.sns_type == 2:
-            # PT-100 4-Wire
-            self.set_excitation_current(3)  # 3=250uA
-            self.set_pga(16)  # 16=16x Gain
-            self.set_refin(1)  # 1=REFIN1(+)/REFIN1(-)
-            self.set_refV('lo')  # 'lo'=small resistor
-            self.set_2_4_wire(4)
-            self.vref = 0.98
-            self.excit_cur = 0.000250
-            self.gain = 16
-            calCoeffs = self.cal_dict['PT100']
-            self.calib_fit = polyFit(coeffs=calCoeffs)
-            self.calMode = 0
-            self.AD7124_reg_dict['CAL_MODE'][1] = 0
-
-        elif self.sns_type == 3:
-            # PT-1000 2-Wire
-            self.set_excitation_current(3)  # 3=250uA
-            self.set_pga(2)  # 2=2x Gain
-            self.set_refin(1)  # 1=REFIN1(+)/REFIN1(-)
-            self.set_refV('lo')  # 'lo'=small resistor
-            self.set_2_4_wire(2)
-            self.vref = 0.98
-            self.excit_cur = 0.000250
-            self.gain = 2
-            calCoeffs = self.cal_dict['PT1000']
-            self.calib_fit = polyFit(coeffs=calCoeffs)
-            self.calMode = 0
-            self.AD7124_reg_dict['CAL_MODE'][1] = 0
-
-        elif self.sns_type == 4:
-            # PT-1000 4-Wire
-            self.set_excitation_current(3)  # 3=250uA
-            self.set_pga(2)  # 2=2x Gain
-            self.set_refin(1)  # 1=REFIN1(+)/REFIN1(-)
-            self.set_refV('lo')  # 'lo'=small resistor
-            self.set_2_4_wire(4)
-            self.vref = 0.98
-            self.excit_cur = 0.000250
-            self.gain = 2
-            calCoeffs = self.cal_dict['PT1000']
-            self.calib_fit = polyFit(coeffs=calCoeffs)
-            self.calMode = 0
-            self.AD7124_reg_dict['CAL_MODE'][1] = 0
-        
-        elif self.sns_type == 5:
-            # DIODE 2-Wire
-            self.set_excitation_current(1)  # 1=50uA
-            self.set_pga(1)  # 1=1x Gain
-            self.set_refin(3)  # 3=internal reference
-            self.set_refV('lo')  # 'lo'=small resistor
-            self.set_2_4_wire(2)
-            self.vref = 2.5
-            self.excit_cur = 1.0  # measuring voltage, so don't divide by excitation current
-            self.gain = 1
-            calCoeffs = self.cal_dict['DIODE']
-            self.calib_fit = polyFit(coeffs=calCoeffs)
-            self.calMode = 0
-            self.AD7124_reg_dict['CAL_MODE'][1] = 0
-
-        elif self.sns_type == 6:
-            # DIODE 4-Wire
-            self.set_excitation_current(1)  # 1=50uA
-            self.set_pga(1)  # 1=1x Gain
-            self.set_refin(3)  # 3=internal reference
-            self.set_refV('lo')  # 'lo'=small resistor
-            self.set_2_4_wire(4)
-            self.vref = 2.5
-            self.excit_cur = 1.0  # measuring voltage, so don't divide by excitation current
-            self.gain = 1
-            calCoeffs = self.cal_dict['DIODE']
-            self.calib_fit = polyFit(coeffs=calCoeffs)
-            self.calMode = 0
-            self.AD7124_reg_dict['CAL_MODE'][1] = 0
-        
+        profile = SNS_PROFILES.get(self.sns_type)
+
+        if profile is not None:
+            # Both registers are worked out in full, then written at most
+            # once each
+            io_control_1, config_0 = sns_registers(profile,
+                                                   self.AD7124_reg_dict['IO_CONTROL_1'][1],
+                                                   self.AD7124_reg_dict['CONFIG_0'][1])
+            self.set_IO_CONTROL_1(io_control_1)
+            self.set_CONFIG_0(config_0)
+
+            self.vref = profile['VREF']
+            self.excit_cur = profile['EXCIT_CUR']
+            self.gain = profile['PGA']
+            self.calib_fit = polyFit(coeffs=self.cal_dict[profile['CAL']])
         else:
             self.vref = 0
             self.excit_cur = 0
             self.gain = 0
             self.calib_fit = None
-            self.calMode = 0
-            self.AD7124_reg_dict['CAL_MODE'][1] = 0
+
+        self.calMode = 0
+        self.AD7124_reg_dict['CAL_MODE'][1] = 0
+
+    def set_filter_profile(self, profile):
+        """
+        Set FILTER_0 and the power mode from a filter profile.
+
+        Input:
+        - profile: FILTER_PROFILES index
+        """
+        if profile not in range(len(FILTER_PROFILES)):
+            raise AD7124Error(f'Invalid filter profile: {profile!r}. Must be 0-{len(FILTER_PROFILES)-1}.')
+
+        filter_0, adcC = filter_registers(FILTER_PROFILES[profile], self.AD7124_reg_dict['ADC_CONTROL'][1])
+        self.set_FILTER_0(filter_0)
+
+        self.filter_profile = profile
+        self.AD7124_reg_dict['ADC_FILT'][1] = profile
+
+        if adcC != self.AD7124_reg_dict['ADC_CONTROL'][1]:
+            # written now in continuous mode, with the next restart in
+            # single mode
+            self.AD7124_reg_dict['ADC_CONTROL'][1] = adcC
+            self.set_conversion_mode(self.conv_mode)
 
     def set_sns_units(self, units):
         if units == 0 or units == 1 or units == 2:
@@ -657,7 +868,7 @@ class AD7124:
             else:
                 raise ValueError(f"Unknown Sensor Units:{units} 0=K, 1=C, 2=F")
 
-            self.tlm['sns_temp_'+str(self.idx+1)] = sns_units
+            self.tlm['sns_units_'+str(self.idx+1)] = sns_units
         else:
             raise AD7124Error("Invalid sensor unit type. Must be 0, 1, 2.")
 
@@ -96,6 +96,18 @@ cmd_set_dict = {
                 'P2_MIN': 0,
                 'P2_MAX': 1000000,
                 'DESC': 'PID Derivative D Factor'},
+        'dac_pid_rate': {'P#': 2,
+                'P1_MIN': 1,
+                'P1_MAX': 2,
+                'P2_MIN': 0,
+                'P2_MAX': 50,
+                'DESC': 'PID Loop Rate (Hz), 0=every heater update'},
+        'dac_trip_clr': {'P#': 1,
+                'P1_MIN': 1,
+                'P1_MAX': 2,
+                'P2_MIN': None,
+                'P2_MAX': None,
+                'DESC': 'Clear a DAC heater interlock trip'},
         'hipwr_lcs': {'P#': 2,
                 'P1_MIN': 1,
                 'P1_MAX': 2,
@@ -138,6 +150,12 @@ cmd_set_dict = {
                 'P2_MIN': -460,
                 'P2_MAX': 500,
                 'DESC': 'Set Min Temperature Threshold'},
+        'hipwr_trip_clr': {'P#': 1,
+                'P1_MIN': 1,
+                'P1_MAX': 2,
+                'P2_MIN': None,
+                'P2_MAX': None,
+                'DESC': 'Clear a hi-power heater interlock trip'},
         'sns_type': {'P#': 2,
                 'P1_MIN': 1,
                 'P1_MAX': 12,
@@ -172,14 +190,26 @@ cmd_set_dict = {
                 'P1_MIN': 1,
                 'P1_MAX': 12,
                 'P2_MIN': 0,
-                'P2_MAX': 4,
-                'DESC': 'ADC Filter Setting'},
+                'P2_MAX': 5,
+                'DESC': 'ADC Filter Profile (0=sinc4 9SPS, 1=sinc4 50SPS, 2=sinc3 50SPS, 3=fast 50SPS, 4=post 25SPS, 5=low power 10SPS)'},
         'excit': {'P#': 2,
                 'P1_MIN': 1,
                 'P1_MAX': 12,
                 'P2_MIN': 0,
                 'P2_MAX': 7,
-                'DESC': 'Store Excit uA(0=None, 1=50, 2=100, 3=250, 4=500, 5=750, 6,7=1000'}
+                'DESC': 'Store Excit uA(0=None, 1=50, 2=100, 3=250, 4=500, 5=750, 6,7=1000'},
+        'subscribe': {'P#': 2,
+                'P1_MIN': None,
+                'P1_MAX': None,
+                'P2_MIN': 0.05,
+                'P2_MAX': 3600,
+                'DESC': 'Push telemetry fields (all, or space separated prefixes) every P2 seconds'},
+        'unsubscribe': {'P#': 0,
+                'P1_MIN': None,
+                'P1_MAX': None,
+                'P2_MIN': None,
+                'P2_MAX': None,
+                'DESC': 'Stop pushing telemetry to this connection'}
 }
 
 cmd_get_dict = {
@@ -267,6 +297,18 @@ cmd_get_dict = {
                 'RET_MIN': 0,
                 'RET_MAX': 100,
                 'DESC': 'Read PID Derivative D Factor'},
+        'dac_pid_rate': {'P#': 1,
+                'P1_MIN': 1,
+                'P1_MAX': 2,
+                'RET_MIN': 0,
+                'RET_MAX': 50,
+                'DESC': 'Read PID Loop Rate (Hz), 0=every heater update'},
+        'dac_trip': {'P#': 1,
+                'P1_MIN': 1,
+                'P1_MAX': 2,
+                'RET_MIN': None,
+                'RET_MAX': None,
+                'DESC': 'Get the DAC heater interlock trip reason, empty if not tripped'},
         'hipwr_lcs': {'P#': 1,
                 'P1_MIN': 1,
                 'P1_MAX': 2,
@@ -309,6 +351,12 @@ cmd_get_dict = {
                 'RET_MIN': -460,
                 'RET_MAX': 500,
                 'DESC': 'Get minimum threshold temperature'},
+        'hipwr_trip': {'P#': 1,
+                'P1_MIN': 1,
+                'P1_MAX': 2,
+                'RET_MIN': None,
+                'RET_MAX': None,
+                'DESC': 'Get the hi-power heater interlock trip reason, empty if not tripped'},
         'hipwr_current': {'P#': 1,
                 'P1_MIN': 1,
                 'P1_MAX': 2,
@@ -355,8 +403,8 @@ cmd_get_dict = {
                 'P1_MIN': 1,
                 'P1_MAX': 12,
                 'RET_MIN': 0,
-                'RET_MAX': 4,
-                'DESC': 'ADC Filter Setting'},
+                'RET_MAX': 5,
+                'DESC': 'ADC Filter Profile, its conversion period, settling time and noise'},
         'excit': {'P#': 1,
                 'P1_MIN': 1,
                 'P1_MAX': 12,
@@ -368,5 +416,38 @@ cmd_get_dict = {
                 'P1_MAX': None,
                 'RET_MIN': None,
                 'RET_MAX': None,
-                'DESC': 'Get the environment: temperature, pressure, humidity, or all'}
+                'DESC': 'Get the environment: temperature, pressure, humidity, or all'},
+        'tlm': {'P#': 2,
+                'P#_MIN': 0,
+                'P1_MIN': None,
+                'P1_MAX': None,
+                'P2_MIN': None,
+                'P2_MAX': None,
+                'RET_MIN': None,
+                'RET_MAX': None,
+                'DESC': 'Get a snapshot of all telemetry: [field prefix][,csv|json]'},
+        'tlm_since': {'P#': 1,
+                'P1_MIN': 0,
+                'P1_MAX': None,
+                'RET_MIN': None,
+                'RET_MAX': None,
+                'DESC': 'Get the telemetry fields changed since a tlm_version'},
+        'gpio_stats': {'P#': 0,
+                'P1_MIN': None,
+                'P1_MAX': None,
+                'RET_MIN': None,
+                'RET_MAX': None,
+                'DESC': 'Get the number of GPIO pin writes issued and skipped by the pin cache'},
+        'dac_stats': {'P#': 0,
+                'P1_MIN': None,
+                'P1_MAX': None,
+                'RET_MIN': None,
+                'RET_MAX': None,
+                'DESC': 'Get the number of DAC channel writes issued, skipped because the channel already held its code, and SPI writes sent'},
+        'adc_verify': {'P#': 1,
+                'P1_MIN': 1,
+                'P1_MAX': 12,
+                'RET_MIN': None,
+                'RET_MAX': None,
+                'DESC': 'Read an ADC back and compare it with the register mirror (OK, or POR and/or the registers that differ)'}
 }
\ No newline at end of file
@@ -4,9 +4,13 @@
 # aidan.gray@idg.jhu.edu
 #
 # Class for a DAC module. This board consists of four (4) DACs. 
+#
+# New channel codes are written to the DAC buffers and only reach the
+# outputs on an nLDAC pulse. nLDAC is shared by every DAC8775, so the
+# heater loop stages the codes of all DACs first and latches them
+# together with one pulse. A code only counts as being at the output once
+# a pulse has latched it, so a write that is never latched is retried.
 
-from AD7124 import AD7124Error
-import RPi.GPIO as GPIO
 import logging
 import numpy as np
 import struct
@@ -18,6 +22,19 @@ DSDO_BIT = 2**4
 class DACError(ValueError):
     pass
 
+def latch(io, dacList):
+    """
+    Latch the buffered codes of every DAC with one nLDAC pulse and record
+    them as the output codes.
+
+    Input:
+    - io:      GPIO_config.io
+    - dacList: every DAC on the shared nLDAC line
+    """
+    io.dac_load()
+    for dac in dacList:
+        dac.latched()
+
 class DAC():
 
     def __init__(self, idx, io, eeprom, tlm):
@@ -32,6 +49,16 @@ class DAC():
         self.max_current = 0
         self.power = 0
 
+        # Codes in the channel buffers and codes latched to the outputs,
+        # None while unknown. A buffer that already holds its code is not
+        # written again, and the outputs only take the buffered codes once
+        # latched() is called after a successful nLDAC pulse.
+        self.buffered = [None, None, None, None]
+        self.codes = [None, None, None, None]
+        self.issued = 0   # channel writes sent
+        self.skipped = 0  # channel writes left out
+        self.transactions = 0
+
         self.DAC_reg_dict = {
                             'MODE':         [0x00, int.from_bytes(self.eeprom.DACmem[self.idx][0:2], byteorder='big', signed=False), 2],
                             'SNS_NUM':      [0x00, int.from_bytes(self.eeprom.DACmem[self.idx][2:4], byteorder='big', signed=False), 2],
@@ -44,15 +71,12 @@ class DAC():
                             'MAX_TEMP':     [0x00, int.from_bytes(self.eeprom.DACmem[self.idx][28:32], byteorder='big', signed=True), 4],
                             'MIN_TEMP':     [0x00, int.from_bytes(self.eeprom.DACmem[self.idx][32:36], byteorder='big', signed=True), 4],
                             'FIXED_PERCENT':[0x00, int.from_bytes(self.eeprom.DACmem[self.idx][36:40], byteorder='big', signed=False), 4],
-                            'CONTROL_VAR':  [0x00, int.from_bytes(self.eeprom.DACmem[self.idx][40:44], byteorder='big', signed=False), 4]
+                            'CONTROL_VAR':  [0x00, int.from_bytes(self.eeprom.DACmem[self.idx][40:44], byteorder='big', signed=False), 4],
+                            'PID_RATE':     [0x00, int.from_bytes(self.eeprom.DACmem[self.idx][44:48], byteorder='big', signed=False), 4]
                             }
 
         # GPIO Pins
-        self.mosi = self.io.pin_map['SPI1_MOSI']
-        self.miso = self.io.pin_map['SPI1_MISO']
-        self.sclk = self.io.pin_map['SPI1_SCLK']
-        self.ssa0 = self.io.pin_map['nDAC_SSA0']
-        self.ssa1 = self.io.pin_map['nDAC_SSA1']
+        self.spi = self.io.spi1
         self.mss = self.io.pin_map['nDAC_MSS']
 
         self.dac_write_data(0x06, 15)  # Select all Buck-Boost Converters
@@ -62,14 +86,13 @@ class DAC():
 
             self.dac_write_data(0x04, 4102)  # Write the DAC Config Registers
             self.dac_write_data(0x07, 1601)  # Write the BB Config Registers
+        self.selected = None  # channels selected for data writes, None while unknown
 
         # Heater Parameters
         self.__set_sns_num(self.DAC_reg_dict['SNS_NUM'][1])                                         # Sensor (AD7124) number (1-12)
         self.__set_kp(self.int_to_float(self.DAC_reg_dict['KP'][1], sign=False))                    # proportional term
         self.__set_ki(self.int_to_float(self.DAC_reg_dict['KI'][1], sign=False))                    # integral term
         self.__set_kd(self.int_to_float(self.DAC_reg_dict['KD'][1], sign=False))                    # derivative term
-        self.__set_it(0)                                                                            # total integral term
-        self.__set_etPrev(0)                                                                        # the previous error value
         self.__set_setPoint(self.int_to_float(self.DAC_reg_dict['SETPOINT'][1], sign=True))         # setpoint
         self.__set_htr_res(self.int_to_float(self.DAC_reg_dict['HTR_RES'][1], sign=False))          # Heater resistance
         self.__set_hysteresis(self.int_to_float(self.DAC_reg_dict['HYSTERESIS'][1], sign=False))    # Allowable range for HIPWR
@@ -79,6 +102,7 @@ class DAC():
         self.__set_fixed_percent(self.int_to_float(self.DAC_reg_dict['FIXED_PERCENT'][1], sign=False))  # Fixed Percent value (0.0 -> 1.0)
         self.__set_mode(self.DAC_reg_dict['MODE'][1])                                               # 0=DISABLED, 1=Fixed%, 2=PID, or 3=Set Current
         self.__set_controlVar(self.int_to_float(self.DAC_reg_dict['CONTROL_VAR'][1], sign=False))   # control variable
+        self.__set_pid_rate(self.int_to_float(self.DAC_reg_dict['PID_RATE'][1], sign=False))        # PID loop rate (Hz), 0=every heater update
 
     """
     DAC Functions: read/write/etc
@@ -88,22 +112,7 @@ class DAC():
         """
         Set the SSA1 and SSA0 pins for this DAC
         """
-
-        if self.idx == 0:
-            GPIO.output(self.ssa1, 0)  # set SSA1
-            GPIO.output(self.ssa0, 0)  # set SSA0 to DAC0
-        elif self.idx == 1:
-            GPIO.output(self.ssa1, 0)  # set SSA1
-            GPIO.output(self.ssa0, 1)  # set SSA0 to DAC1
-        elif self.idx == 2:
-            GPIO.output(self.ssa1, 1)  # set SSA1
-            GPIO.output(self.ssa0, 0)  # set SSA0 to DAC2
-        elif self.idx == 3:
-            GPIO.output(self.ssa1, 1)  # set SSA1
-            GPIO.output(self.ssa0, 1)  # set SSA0 to DAC3
-        else:
-            GPIO.output(self.ssa1, 1)  # set SSA1
-            GPIO.output(self.ssa0, 1)  # set SSA0 to DAC3
+        self.io.dac_sel(self.idx)
 
     def dac_write_data(self, regAddr, data):
         """
@@ -116,45 +125,18 @@ class DAC():
 
         # 3-byte array: device address, byte 0, byte 1
         writeByteArray = regAddr.to_bytes(1, byteorder = 'big') + data.to_bytes(2, byteorder = 'big')
+        self.transactions += 1
         
-        GPIO.output(self.mss, 1)  # MSS HIGH
+        self.io.output(self.mss, 1)  # MSS HIGH
 
         self.__slave_select()
 
-        GPIO.output(self.mss, 0)  # MSS LOW
-        GPIO.output(self.sclk, 1)  # set clock high
+        self.io.output(self.mss, 0)  # MSS LOW
+        self.spi.set_clock(1)  # set clock high
 
-        for byte in writeByteArray:
-            readByte = self.__dac_write_byte(byte) 
+        self.spi.transfer(writeByteArray)
 
-        GPIO.output(self.mss, 1)  # MSS HIGH
-
-    def __dac_write_byte(self, writeByte):
-        """
-        Write a single byte to the DAC
-
-        Input:
-        - writeByte: 1 byte
-
-        Output:
-        - readByte: 1 byte
-        """
-        readByte = 0
-
-        for i in range(8):         
-            if writeByte & 2**(7-i):
-                GPIO.output(self.mosi, 1)
-            else:
-                GPIO.output(self.mosi, 0)
-            
-            GPIO.output(self.sclk, 0)  # Clock low
-            bitVal = GPIO.input(self.miso)
-            GPIO.output(self.sclk, 1)  # Clock high
-            
-            if bitVal == 1:
-                readByte = readByte | 2**(7-i)
-
-        return readByte
+        self.io.output(self.mss, 1)  # MSS HIGH
 
     def dac_read_data(self, regAddr):
         """
@@ -170,114 +152,47 @@ class DAC():
         readRegAddr = regAddr | 0x80
         self.dac_write_data(readRegAddr, 0)
 
-        GPIO.output(self.mss, 1)  # MSS HIGH
+        self.io.output(self.mss, 1)  # MSS HIGH
 
         self.__slave_select()
 
-        GPIO.output(self.sclk, 0)  # Clock low
-        GPIO.output(self.mss, 0)  # MSS LOW
-        GPIO.output(self.sclk, 1)  # Clock high
-
-        nopComm = 0
-        nopByteArray = nopComm.to_bytes(3, byteorder = 'big')
+        self.spi.set_clock(0)  # Clock low
+        self.io.output(self.mss, 0)  # MSS LOW
+        self.spi.set_clock(1)  # Clock high
 
-        returnBytes = bytearray(0)
-        for byte in nopByteArray:
-            readByte = self.__dac_write_byte(byte)
-            returnBytes.append(readByte)
+        returnBytes = self.spi.transfer(bytes(3))
         
-        GPIO.output(self.mss, 1)  # MSS HIGH
+        self.io.output(self.mss, 1)  # MSS HIGH
 
         # convert bytearray to int
         returnData = int.from_bytes(returnBytes[1:3], byteorder = 'big')
 
         return returnData
 
-    def dac_update(self, temp, units):
-        if self.__mode == 2:
-            self.pid_update(temp, units)
-        else:
-            raise DACError("Invalid mode set. Cannot update DAC.")
-
-    def fp_update(self):
+    def fp_update(self, load=True):
         self.tlm[f'dac_fp_{self.idx+1}'] = self.fixed_percent
         self.max_power = (self.max_current ** 2) * self.htr_res
         self.power = self.max_power * self.fixed_percent
         self.controlVar = self.power_to_current(self.power)
-        self.write_control_var(self.controlVar)
+        return self.write_control_var(self.controlVar, load=load)
 
-    def set_current_update(self):
-        self.write_control_var(self.controlVar)
+    def set_current_update(self, load=True):
+        return self.write_control_var(self.controlVar, load=load)
 
-    def pid_update(self, pv, units, dt=1):
+    def power_update(self, power, load=True):
         """
-        Update the PID values. The default functionality assumes PID updates
-        are occurring at 1Hz. If this frequency is changed, you must pass the 
-        delta-time into the pid_update() function after the process variable,
-        which is the measured temperature.
+        Drive the heater at a given power, e.g. the output of the PID
+        engine.
 
         Input:
-        - pv: float
-        - dt: change in time (default 1s)
-        """
-
-        # Convert to Kelvin (0=K, 1=C, 2=F)
-        if units == 0:
-            pv = pv
-        elif units == 1:
-            pv += 273.15
-        elif units == 2:
-            pv = ((pv - 32) * (5 / 9)) + 273.15
-        else:
-            raise AD7124Error("Invalid units. Cannot update DAC.")
-
-        # Convert Setpoint to Kelvin
-        spUnits = self.tlm['sns_units_'+str(self.sns_num)]
-        if spUnits == 'K':
-            setPointK = self.setPoint
-        elif spUnits == 'C':
-            setPointK = self.setPoint + 273.15
-        elif spUnits == 'F':
-            setPointK = ((self.setPoint - 32) * (5 / 9)) + 273.15
-        else:
-            print(f'spUnits={spUnits}.')
-            raise AD7124Error("Invalid units. Cannot update DAC.")
-
-        et = setPointK - pv # calculate e(t)
-        d_et = ( et - self.etPrev ) / dt  # calculate de(t)/dt
-        self.it = self.it + ( self.ki * et * dt )  # add to the integral term
-        self.etPrev = et  # set the previous error term (for next time)
-
-        # calculate the new control variable
-        p_term = self.kp * et
-        i_term = self.it
-        d_term = self.kd * d_et
-
-        # Maximum current is set by the maximum voltage and the heater's resistance
-        self.max_current = MAX_VOLTAGE / self.htr_res
-        if self.max_current > MAX_CURRENT:
-            self.max_current = MAX_CURRENT
-
-        max_i_term = self.max_current**2 * self.htr_res * 1000
-        #print(f'p_term={p_term}')
-        #print(f'i_term={i_term}')
-        
-        if i_term > max_i_term:
-            self.it = max_i_term / self.ki
-            i_term = max_i_term
-        elif i_term < 0:
-            self.it = 0
-            i_term = 0
-
-        controlVarTmp = p_term + i_term + d_term
-        controlVarTmp = controlVarTmp / 1000.0  # Watts
+        - power: Watts
+        - load:  see write_control_var
 
-        self.power = controlVarTmp
-
-        # convert control variable (power) to current
-        self.controlVar = self.power_to_current(controlVarTmp)
-
-        self.write_control_var(self.controlVar)
+        Output:
+        - True if the codes still have to be latched
+        """
+        self.controlVar = self.power_to_current(power)
+        return self.write_control_var(self.controlVar, load=load)
 
     def power_to_current(self, power):
         if power <= 0:
@@ -292,16 +207,24 @@ class DAC():
         
         return current
 
-    def write_control_var(self, cv):
+    def write_control_var(self, cv, load=True):
         """
         This method takes in a control variable value and writes it to the DAC.
         Each DAC channel can only hold 2^16 bits, so we first fill up channel A,
         then B, C, and D. Each channel is selected, then the data is loaded into the
         DAC set register address. After this is done for each channel, the "load DAC"
         GPIO pin is flipped, pushing the channel buffers into the DAC registers.
+        Only channels whose code changed are written, and LDAC is left
+        alone if the outputs already hold the codes.
 
         Input:
-        - cv: float
+        - cv:   float
+        - load: False to leave the codes staged in the channel buffers,
+                for the caller to latch with latch() together with the
+                other DACs
+
+        Output:
+        - True if the codes still have to be latched
         """
         
         if self.htr_res == 0:
@@ -331,14 +254,63 @@ class DAC():
                 channelList[i] = controlVar_t
                 controlVar_t = 0
 
-            channelSelect = DSDO_BIT | 2**(5+i)
-            self.dac_write_data(0x03, channelSelect)  # Select each channel
-            self.dac_write_data(0x05, channelList[i])  # Write to the channel
+        pending = self.stage_codes(channelList)
+
+        if pending and load:
+            # Latches the other DACs' buffers too, they are latched again
+            # with their own next pulse
+            self.io.dac_load()
+            self.latched()
+            pending = False
 
-        # Load the DAC
-        self.io.dac_ldac(1)
-        self.io.dac_ldac(0)
-        self.io.dac_ldac(1)
+        return pending
+
+    def stage_codes(self, codes):
+        """
+        Write new codes to the channel buffers without latching them.
+        Channels whose buffer already holds their code are left out, and
+        channels getting the same code (e.g. the saturated spill channels)
+        are selected together and written at once. A write that fails
+        leaves the buffer unknown, so it is written again next time.
+
+        Input:
+        - codes: code for channels A, B, C, D
+
+        Output:
+        - True if the outputs do not hold the buffered codes yet, i.e.
+          they still have to be latched
+        """
+        groups = {}
+        for i, code in enumerate(codes):
+            if code == self.buffered[i]:
+                self.skipped += 1
+            else:
+                groups.setdefault(code, []).append(i)
+
+        for code, channels in groups.items():
+            channelSelect = DSDO_BIT
+            for i in channels:
+                channelSelect |= 2**(5+i)
+
+            if channelSelect != self.selected:
+                self.selected = None
+                self.dac_write_data(0x03, channelSelect)  # Select the channels
+                self.selected = channelSelect
+
+            for i in channels:
+                self.buffered[i] = None
+            self.dac_write_data(0x05, code)  # Write to the channels
+            for i in channels:
+                self.buffered[i] = code
+            self.issued += len(channels)
+
+        return self.buffered != self.codes
+
+    def latched(self):
+        """
+        Record an nLDAC pulse: the outputs now hold the buffered codes.
+        """
+        self.codes = list(self.buffered)
 
     def float_to_int(self, f, sign=False):
         i = int.from_bytes(bytearray(struct.pack(">f", f)), byteorder='big', signed=sign)
@@ -405,12 +377,6 @@ class DAC():
         self.DAC_reg_dict['KD'][1] = self.float_to_int(var, sign=False)
         self.__kd = var
 
-    def __get_it(self):
-        return self.__it
-
-    def __set_it(self, var):
-        self.__it = var        
-
     def __get_setPoint(self):
         return self.__setPoint
 
@@ -418,12 +384,6 @@ class DAC():
         self.DAC_reg_dict['SETPOINT'][1] = self.float_to_int(var, sign=True)
         self.__setPoint = var
 
-    def __get_etPrev(self):
-        return self.__etPrev
-
-    def __set_etPrev(self, var):
-        self.__etPrev = var
-
     def __get_htr_res(self):
         return self.__htr_res
 
@@ -479,21 +439,30 @@ class DAC():
     def __get_fixed_percent(self):
         return self.__fixed_percent
 
+    def __set_pid_rate(self, var):
+        # Never written before (blank EEPROM reads as NaN) counts as 0
+        if not var >= 0 or var == float('inf'):
+            var = 0.0
+        self.DAC_reg_dict['PID_RATE'][1] = self.float_to_int(var, sign=False)
+        self.__pid_rate = var
+
+    def __get_pid_rate(self):
+        return self.__pid_rate
+
     mode = property(__get_mode, __set_mode)
     sns_num = property(__get_sns_num, __set_sns_num)
     hysteresis = property(__get_hysteresis, __set_hysteresis)
     kp = property(__get_kp, __set_kp)
     ki = property(__get_ki, __set_ki)
     kd = property(__get_kd, __set_kd)
-    it = property(__get_it, __set_it)
     setPoint = property(__get_setPoint, __set_setPoint)
-    etPrev = property(__get_etPrev, __set_etPrev)
     htr_res = property(__get_htr_res, __set_htr_res)
     controlVar = property(__get_controlVar, __set_controlVar)
     rebootMode = property(__get_rebootMode, __set_rebootMode)
     max_temp = property(__get_max_temp, __set_max_temp)
     min_temp = property(__get_min_temp, __set_min_temp)
     fixed_percent = property(__get_fixed_percent, __set_fixed_percent)
+    pid_rate = property(__get_pid_rate, __set_pid_rate)
 
     def update_eeprom_mem(self):
         DACbyteArray = bytearray()
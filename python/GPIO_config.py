@@ -8,8 +8,11 @@
 import atexit
 import logging
 import signal
+import threading
 
 import RPi.GPIO as GPIO
+from spiBus import BitBangSPI, GpiomemSPI, SpidevSPI, SPIError, SPI_TRANSPORTS, ADC_SPI_MODE, DAC_SPI_MODE, ADC_SPI_HZ, DAC_SPI_HZ
+from gpioBackend import open_backend
 
 def sigCleanup(signum, frame):
     logging.warn("caught signal %s", signum)
@@ -24,14 +27,39 @@ def cleanup():
     
     #logging.warn('reset GPIO configuration on exit.')
 
+# adc_id -> (nADC_BANK1_SEL, nADC_BANK2_SEL, nADC_BANK3_SEL, nADC_CS1, nADC_CS0)
+ADC_SEL_LEVELS = {adc_id: tuple(0 if bank == adc_id // 4 else 1 for bank in range(3)) + ((adc_id % 4) >> 1, (adc_id % 4) & 1)
+                  for adc_id in range(12)}
+ADC_DESELECT = (1, 1, 1, 1, 1)
+
+# dac_id -> (nDAC_SSA1, nDAC_SSA0)
+DAC_SEL_LEVELS = {dac_id: (dac_id >> 1, dac_id & 1) for dac_id in range(4)}
+DAC_DESELECT = (1, 1)
+
+# Sensor scan orders with the fewest select line changes: the chip
+# selects step through each bank in Gray code order (one line changes per
+# ADC) and every other scan runs backwards, so a scan starts in the bank
+# the previous one ended in.
+ADC_SCAN_ORDER = tuple(bank * 4 + mux for bank in range(3) for mux in (0, 1, 3, 2))
+ADC_SCAN_ORDERS = (ADC_SCAN_ORDER, ADC_SCAN_ORDER[::-1])
+
 
 class io():
 
-    def __init__(self, ):
+    def __init__(self, spi='bitbang', gpio='rpigpio'):
         """
         @dictionary GPIO Pin Numbers
         @Maps DAC singals to GPIO PINS.
+
+        Input:
+        - spi:  'bitbang' drives the SPI pins as GPIO, 'spidev' leaves them
+                to the hardware SPI controllers
+        - gpio: backend for the SPI and chip select pins, 'rpigpio',
+                'gpiomem' or 'gpiod' (see gpioBackend.py)
         """
+        if spi not in SPI_TRANSPORTS:
+            raise SPIError(f'Invalid SPI transport: {spi!r}. Must be one of {SPI_TRANSPORTS}')
+
         self.pin_map = {
             "SDA_0": 2,
             "SCL_0": 3,
@@ -73,20 +101,22 @@ class io():
         pin = self.pin_map['HI_PWR_EN2']
         GPIO.setup(pin, GPIO.OUT)
 
-        # Set SPI0_SCLK to output.
-        pin = self.pin_map['SPI0_SCLK']
-        GPIO.setup(pin, GPIO.OUT)
-        GPIO.output(pin, 1)  # idle high
+        # The SPI pins stay with the SPI controller for spidev
+        if spi == 'bitbang':
+            # Set SPI0_SCLK to output.
+            pin = self.pin_map['SPI0_SCLK']
+            GPIO.setup(pin, GPIO.OUT)
+            GPIO.output(pin, 1)  # idle high
 
-        # Set SPI0_MOSI to output.
-        pin = self.pin_map['SPI0_MOSI']
-        GPIO.setup(pin, GPIO.OUT)
-        GPIO.output(pin, 0)  # normally low
+            # Set SPI0_MOSI to output.
+            pin = self.pin_map['SPI0_MOSI']
+            GPIO.setup(pin, GPIO.OUT)
+            GPIO.output(pin, 0)  # normally low
 
-        # Set SPI0_MISO to input.
-        pin = self.pin_map['SPI0_MISO']
-        # GPIO.setup(pin, GPIO.IN)
-        GPIO.setup(pin, GPIO.IN, pull_up_down=GPIO.PUD_UP)
+            # Set SPI0_MISO to input.
+            pin = self.pin_map['SPI0_MISO']
+            # GPIO.setup(pin, GPIO.IN)
+            GPIO.setup(pin, GPIO.IN, pull_up_down=GPIO.PUD_UP)
 
         # Set /ADC_SC0 to output.
         pin = self.pin_map['nADC_CS0']
@@ -113,20 +143,21 @@ class io():
         GPIO.setup(pin, GPIO.OUT)
         GPIO.output(pin, 1)  # disable
 
-        # Set SPI1_SCLK to output.
-        pin = self.pin_map['SPI1_SCLK']
-        GPIO.setup(pin, GPIO.OUT)
-        GPIO.output(pin, 1)  # idle high
+        if spi == 'bitbang':
+            # Set SPI1_SCLK to output.
+            pin = self.pin_map['SPI1_SCLK']
+            GPIO.setup(pin, GPIO.OUT)
+            GPIO.output(pin, 1)  # idle high
 
-        # Set SPI1_MOSI to output.
-        pin = self.pin_map['SPI1_MOSI']
-        GPIO.setup(pin, GPIO.OUT)
-        GPIO.output(pin, 0)  # normally low
+            # Set SPI1_MOSI to output.
+            pin = self.pin_map['SPI1_MOSI']
+            GPIO.setup(pin, GPIO.OUT)
+            GPIO.output(pin, 0)  # normally low
 
-        # Set SPI1_MISO to input.
-        pin = self.pin_map['SPI1_MISO']
-        # GPIO.setup(pin, GPIO.IN)
-        GPIO.setup(pin, GPIO.IN, pull_up_down=GPIO.PUD_UP)
+            # Set SPI1_MISO to input.
+            pin = self.pin_map['SPI1_MISO']
+            # GPIO.setup(pin, GPIO.IN)
+            GPIO.setup(pin, GPIO.IN, pull_up_down=GPIO.PUD_UP)
 
         # Set /DAC_MSS to output.
         pin = self.pin_map['nDAC_MSS']
@@ -167,105 +198,133 @@ class io():
         pin = self.pin_map['nDAC_ALARM']
         GPIO.setup(pin, GPIO.IN, pull_up_down=GPIO.PUD_UP)
 
+        # Shadow of every output pin outside the SPI engines (which track
+        # their own MOSI level), None until the first write. Writes that
+        # would not change a pin are skipped. issued/skipped count pin
+        # writes, the bus threads share them so they are approximate.
+        self.levels = {self.pin_map[name]: level for name, level in (
+            ('HI_PWR_EN1', None), ('HI_PWR_EN2', None),
+            ('nADC_CS0', 1), ('nADC_CS1', 1),
+            ('nADC_BANK1_SEL', 1), ('nADC_BANK2_SEL', 1), ('nADC_BANK3_SEL', 1),
+            ('nDAC_MSS', 1), ('nDAC_SSA0', 0), ('nDAC_SSA1', 0),
+            ('nADC_SYNC', 0), ('nDAC_RESET', 1), ('nLDAC', 1), ('DAC_CLR', 0))}
+        self.issued = 0
+        self.skipped = 0
+
+        # The bus threads, the event loop and the interlock thread all
+        # drive pins, so the shadow is only read and written under a lock
+        self.lock = threading.Lock()
+
+        # Backend for the pins toggled on every transaction
+        self.gpio = open_backend(gpio)
+        self.adcSelPins = tuple(self.pin_map[name] for name in ('nADC_BANK1_SEL', 'nADC_BANK2_SEL', 'nADC_BANK3_SEL', 'nADC_CS1', 'nADC_CS0'))
+        self.dacSelPins = tuple(self.pin_map[name] for name in ('nDAC_SSA1', 'nDAC_SSA0'))
+
+        if self.gpio.name == 'gpiomem':
+            outputs = self.adcSelPins + self.dacSelPins + tuple(self.pin_map[name] for name in ('nADC_SYNC', 'nDAC_MSS'))
+            inputs = ()
+            if spi == 'bitbang':
+                outputs += tuple(self.pin_map[name] for name in ('SPI0_MOSI', 'SPI0_SCLK', 'SPI1_MOSI', 'SPI1_SCLK'))
+                inputs = tuple(self.pin_map[name] for name in ('SPI0_MISO', 'SPI1_MISO'))
+            self.gpio.check(outputs, inputs)
+
+        # Select lines, left deselected (ADC) and at DAC0 (DAC) above
+        self.adcSel = (self.adcSelPins, self.gpio.group(self.adcSelPins, [self.levels[pin] for pin in self.adcSelPins]))
+        self.dacSel = (self.dacSelPins, self.gpio.group(self.dacSelPins, [self.levels[pin] for pin in self.dacSelPins]))
+
+        # SPI transports shared by every device on each bus
+        if spi == 'spidev':
+            self.spi0 = SpidevSPI(0, 0, ADC_SPI_MODE, ADC_SPI_HZ)
+            self.spi1 = SpidevSPI(1, 0, DAC_SPI_MODE, DAC_SPI_HZ)
+        else:
+            engine = GpiomemSPI if self.gpio.name == 'gpiomem' else BitBangSPI
+            self.spi0 = engine(self.pin_map['SPI0_MOSI'], self.pin_map['SPI0_MISO'], self.pin_map['SPI0_SCLK'], mosiLevel=0, gpio=self.gpio)
+            self.spi1 = engine(self.pin_map['SPI1_MOSI'], self.pin_map['SPI1_MISO'], self.pin_map['SPI1_SCLK'], mosiLevel=0, gpio=self.gpio)
+
+    def output(self, pin, level, force=False):
+        """
+        Drive an output pin, skipping the write if it is already there.
+
+        Input:
+        - force: write the pin even if the shadow says it is at level
+        """
+        with self.lock:
+            if self.levels[pin] == level and not force:
+                self.skipped += 1
+            else:
+                self.levels[pin] = level
+                self.issued += 1
+                self.gpio.output(pin, level)
+
+    def __output_group(self, group, levels):
+        pins, setLevels = group
+        shadow = self.levels
+
+        with self.lock:
+            changed = [pin for pin, level in zip(pins, levels) if shadow[pin] != level]
+            self.skipped += len(pins) - len(changed)
+
+            if not changed:
+                return
+
+            self.issued += len(changed)
+            for pin, level in zip(pins, levels):
+                shadow[pin] = level
+
+            if self.gpio.bulk:
+                setLevels(levels)
+            else:
+                self.gpio.output_many(changed, [shadow[pin] for pin in changed])
+
     def dac_reset(self, state):
-        pin = self.pin_map['nDAC_RESET']
-        GPIO.output(pin, state)
+        self.output(self.pin_map['nDAC_RESET'], state)
 
     def dac_ldac(self, state):
-        pin = self.pin_map['nLDAC']
-        GPIO.output(pin, state)
+        self.output(self.pin_map['nLDAC'], state)
+
+    def dac_load(self):
+        """
+        Latch the buffered codes of every DAC8775 with one nLDAC pulse.
+        """
+        self.dac_ldac(1)
+        self.dac_ldac(0)
+        self.dac_ldac(1)
 
     def dac_clr(self, state):
-        pin = self.pin_map['DAC_CLR']
-        GPIO.output(pin, state)
+        self.output(self.pin_map['DAC_CLR'], state)
 
     def dac_mss_sel(self, state):
-        pin = self.pin_map['nDAC_MSS']
-        GPIO.output(pin, state)
+        self.output(self.pin_map['nDAC_MSS'], state)
 
     def dac_sel(self, dac_id):
-        ssa0 = self.pin_map['nDAC_SSA0']
-        ssa1 = self.pin_map['nDAC_SSA1']
-
-        self.dac_bank_sel(False)
-
-        if dac_id == 0:
-            GPIO.output(ssa1, 0)
-            GPIO.output(ssa0, 0)
-        elif dac_id == 1:
-            GPIO.output(ssa1, 0)
-            GPIO.output(ssa0, 1)
-        elif dac_id == 2:
-            GPIO.output(ssa1, 1)
-            GPIO.output(ssa0, 0)
-        elif dac_id == 3:
-            GPIO.output(ssa1, 1)
-            GPIO.output(ssa0, 1)
-        else:
-            GPIO.output(ssa1, 1)
-            GPIO.output(ssa0, 1)
+        self.__output_group(self.dacSel, DAC_SEL_LEVELS.get(dac_id, DAC_DESELECT))
+
+    def adc_sync(self):
+        """
+        Restart the conversions of every ADC at the same instant: all
+        chips deselected, then nADC_SYNC pulsed low.
+        """
+        pin = self.pin_map['nADC_SYNC']
+        self.adc_sel(-1)
+        self.output(pin, 1)
+        self.output(pin, 0)
+        self.output(pin, 1)
+
+    def adc_scan_order(self, scan):
+        """
+        Input:
+        - scan: scan counter
+
+        Output:
+        - ADC ids in the order to read them on this scan
+        """
+        return ADC_SCAN_ORDERS[scan & 1]
 
     # There are 12 ADCs divided into three banks of 4. To enable an
     # ADC select the bank using the bank_sel lines and then the chip
     # using the chip_sel lines.
 
     def adc_sel(self, adc_id):
-        cs0 = self.pin_map['nADC_CS0']
-        cs1 = self.pin_map['nADC_CS1']
-        bs1 = self.pin_map['nADC_BANK1_SEL']
-        bs2 = self.pin_map['nADC_BANK2_SEL']
-        bs3 = self.pin_map['nADC_BANK3_SEL']
-        adc_mux_id = adc_id % 4
-
-        # deselect all chips first
-        # GPIO.output(bs1, 1)
-        # GPIO.output(bs2, 1)
-        # GPIO.output(bs3, 1)
-
-        if adc_id in range(0, 4):
-            GPIO.output(bs1, 0)
-            GPIO.output(bs2, 1)
-            GPIO.output(bs3, 1)
-
-        elif adc_id in range(4, 8):
-            GPIO.output(bs1, 1)
-            GPIO.output(bs2, 0)
-            GPIO.output(bs3, 1)
-
-        elif adc_id in range(8, 12):
-            GPIO.output(bs1, 1)
-            GPIO.output(bs2, 1)
-            GPIO.output(bs3, 0)
-        else:
-            GPIO.output(bs1, 1)
-            GPIO.output(bs2, 1)
-            GPIO.output(bs3, 1)
-
-        # deselect chip first
-        if adc_mux_id >= 0 and adc_mux_id < 3:
-            GPIO.output(cs1, 1)
-            GPIO.output(cs0, 1)
-        else:
-            GPIO.output(cs1, 0)
-            GPIO.output(cs0, 0)
-
-        # now select the one you want
-        if adc_mux_id == 0:
-            GPIO.output(cs1, 0)
-            GPIO.output(cs0, 0)
-
-        elif adc_mux_id == 1:
-            GPIO.output(cs1, 0)
-            GPIO.output(cs0, 1)
-
-        elif adc_mux_id == 2:
-            GPIO.output(cs1, 1)
-            GPIO.output(cs0, 0)
-
-        elif adc_mux_id == 3:
-            GPIO.output(cs1, 1)
-            GPIO.output(cs0, 1)
-
-        else:
-            GPIO.output(cs1, 1)
-            GPIO.output(cs0, 1)
+        # Only the lines that change are written: one clear and one set
+        # store at most with gpiomem, the whole group in one ioctl with gpiod
+        self.__output_group(self.adcSel, ADC_SEL_LEVELS.get(adc_id, ADC_DESELECT))
@@ -10,6 +10,7 @@ import numpy as np
 # Global Dictionary to hold shared TLM values
 telemetry = {
     'id': 0,
+    'tlm_seq': 0,
     'env_temp': 0.0,
     'env_press': 0.0,
     'env_hum': 0.0,
@@ -61,6 +62,18 @@ telemetry = {
     'sns_units_10': 'K',
     'sns_units_11': 'K',
     'sns_units_12': 'K',
+    'sns_status_1': -1,
+    'sns_status_2': -1,
+    'sns_status_3': -1,
+    'sns_status_4': -1,
+    'sns_status_5': -1,
+    'sns_status_6': -1,
+    'sns_status_7': -1,
+    'sns_status_8': -1,
+    'sns_status_9': -1,
+    'sns_status_10': -1,
+    'sns_status_11': -1,
+    'sns_status_12': -1,
     'dac_fp_1': 0.0,
     'dac_fp_2': 0.0,
     'dac_power_1': 0.0,
@@ -68,7 +81,11 @@ telemetry = {
     'dac_current_1': 0.0,
     'dac_current_2': 0.0,
     'hipwr_current_1': 0.0,
-    'hipwr_current_2': 0.0
+    'hipwr_current_2': 0.0,
+    'dac_trip_1': '',
+    'dac_trip_2': '',
+    'hipwr_trip_1': '',
+    'hipwr_trip_2': ''
 }
 
 # Polynomial Coefficients for various sensor calibrations
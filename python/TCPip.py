@@ -6,20 +6,31 @@
 # The TCP Server loop. It runs in parallel with the Command Handler and
 # Transmit loops. This loop accepts multiple simultaneous connections
 # and passes incoming data to the Command Queue, which is picked up by the
-# Command Handler.
+# Command Handler. Gets that only read cached telemetry are answered right
+# here from tlm, so they never wait behind a scan, and telemetry
+# subscriptions are handled by the TLM Publisher. A connection still
+# waiting on the Command Handler gets its replies in order: its gets go
+# through the Command Queue as well, and a subscription waits for the
+# replies it follows.
 
 import logging
 import asyncio
+import functools
 import sys
 from asyncio.exceptions import IncompleteReadError
+from cmdHandler import fast_get
+from tlmPublisher import TLMPublisher
 
 class TCPServer():
-    def __init__(self, hostname, port):
+    def __init__(self, hostname, port, tlm=None, maxCmds=64):
         self.logger = logging.getLogger('smb')
-        self.qCmd = asyncio.Queue()
+        self.qCmd = asyncio.Queue(maxsize=maxCmds)  # bounded, a full queue stops reading from clients
         self.qXmit = asyncio.Queue()
         self.hostname = hostname
         self.port = port
+        self.tlm = tlm  # telemetry for the read-only fast path (None disables it)
+        self.publisher = TLMPublisher(tlm, self.qXmit) if tlm is not None else None
+        self.pending = {}  # writer -> [lines waiting on the Command Handler, event set when none]
     
     async def start(self):
         server = await asyncio.start_server(
@@ -55,7 +66,21 @@ class TCPServer():
                         asyncio.create_task(self.enqueue_xmit((writer, 'closing connection...\n')))
                         await asyncio.sleep(0.001)
                     else:
-                        asyncio.create_task(self.enqueue_cmd((writer, message)))
+                        retData = None
+                        if self.tlm is not None:
+                            if writer in self.pending and self.publisher.is_command(message):
+                                # Only the server can handle it, after the replies it follows
+                                await self.pending[writer][1].wait()
+
+                            if writer not in self.pending:
+                                retData = self.publisher.parse_command(writer, message)
+                                if retData is None:
+                                    retData = fast_get(self.tlm, message)
+
+                        if retData is not None:
+                            await self.enqueue_xmit((writer, retData+'\n'))
+                        else:
+                            await self.enqueue_cmd((writer, message))
                         await writer.drain()
 
             except IncompleteReadError as e3:
@@ -68,12 +93,38 @@ class TCPServer():
                 self.logger.error(f'Unexpected error: {e2}')
                 await writer.drain()
 
+        if self.publisher is not None:
+            self.publisher.unsubscribe(writer)
+        self.pending.pop(writer, None)
+
         if not writer.is_closing():
             await writer.drain()
             writer.close()
 
     async def enqueue_cmd(self, message):
-        await self.qCmd.put(message)
+        """
+        Input:
+        - message: (writer, command line). The consumer calls the
+                   answered() callback added here once the reply is on
+                   the Transmit Queue.
+        """
+        writer = message[0]
+        entry = self.pending.get(writer)
+        if entry is None:
+            entry = self.pending[writer] = [0, asyncio.Event()]
+        entry[0] += 1
+
+        await self.qCmd.put((writer, message[1], functools.partial(self.answered, writer)))
+
+    def answered(self, writer):
+        entry = self.pending.get(writer)
+        if entry is None:
+            return
+
+        entry[0] -= 1
+        if entry[0] <= 0:
+            del self.pending[writer]
+            entry[1].set()
 
     async def enqueue_xmit(self, message):
         await self.qXmit.put(message)
\ No newline at end of file
@@ -5,7 +5,8 @@
 #
 # The UDP Broadcast Loop. The Command Handler puts messages on the qUDP queue,
 # which are then broadcast on the given ip (which is set in main.py and should
-# end in 255, ie. 192.168.1.255).
+# end in 255, ie. 192.168.1.255). The loop waits on the queue, so it costs
+# nothing while there is nothing to send.
 
 import asyncio
 import logging
@@ -16,9 +17,8 @@ Address = Tuple[str, int]
 
 class BroadcastProtocol(asyncio.DatagramProtocol):
 
-    def __init__(self, qUDP, target: Address, *, loop: asyncio.AbstractEventLoop = None):
+    def __init__(self, target: Address, *, loop: asyncio.AbstractEventLoop = None):
         self.logger = logging.getLogger('smb')
-        self.qUDP = qUDP
         self.target = target
         self.loop = asyncio.get_event_loop() if loop is None else loop
 
@@ -27,18 +27,14 @@ class BroadcastProtocol(asyncio.DatagramProtocol):
         sock = transport.get_extra_info("socket")  # type: socket.socket
         sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
         sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
-        self.broadcast()
 
     def datagram_received(self, data: Union[bytes, Text], addr: Address):
         #self.logger.info(f'data received: {data} {addr}')
         pass
 
-    def broadcast(self):
-        if not self.qUDP.empty():
-            msg = self.qUDP.get()  
-            #self.logger.info(f'sending {msg} to {self.target}')
-            self.transport.sendto(msg.encode(), self.target)
-        self.loop.call_soon(self.broadcast)
+    def broadcast(self, msg):
+        #self.logger.info(f'sending {msg} to {self.target}')
+        self.transport.sendto(msg.encode(), self.target)
 
 class UDPcast:
     def __init__(self, hostname, port, qUDP):
@@ -49,6 +45,10 @@ class UDPcast:
     async def start(self):
         loop = asyncio.get_event_loop()
         udpTask = loop.create_datagram_endpoint(
-                lambda: BroadcastProtocol(self.qUDP, (self.hostname, self.port), loop=loop), 
+                lambda: BroadcastProtocol((self.hostname, self.port), loop=loop), 
                 local_addr=('0.0.0.0', self.port))
-        await udpTask
\ No newline at end of file
+        transport, protocol = await udpTask
+
+        while True:
+            msg = await self.qUDP.get()
+            protocol.broadcast(msg)
\ No newline at end of file
@@ -0,0 +1,46 @@
+# busWorker.py
+# 10/17/2026
+# Aidan Gray
+# aidan.gray@idg.jhu.edu
+#
+# One worker thread per physical bus (SPI0/ADC bank, SPI1/DAC, I2C-1).
+# Blocking driver calls are put on the bus's request queue and run in
+# order on that bus's thread, so the asyncio loop never waits on pin
+# toggling or time.sleep() padded I2C transfers. Since each bus has a
+# single thread, requests to the same bus never interleave, while
+# requests to different buses run concurrently.
+
+import asyncio
+import contextvars
+import functools
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+class BusWorker:
+    def __init__(self, name):
+        self.logger = logging.getLogger('smb')
+        self.name = name
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=name)
+
+    async def run(self, func, *args, **kwargs):
+        """
+        Queue func(*args, **kwargs) on this bus and wait for the result.
+        Exceptions raised by func are re-raised in the caller. func runs
+        in a copy of the caller's context, so its telemetry writes count
+        as the calling task's.
+        """
+        loop = asyncio.get_running_loop()
+        ctx = contextvars.copy_context()
+        return await loop.run_in_executor(self.executor, functools.partial(ctx.run, func, *args, **kwargs))
+
+    def submit(self, func, *args, **kwargs):
+        """
+        Queue func(*args, **kwargs) on this bus without waiting for it.
+
+        Output:
+        - concurrent.futures.Future
+        """
+        return self.executor.submit(func, *args, **kwargs)
+
+    def shutdown(self, wait=True):
+        self.executor.shutdown(wait=wait)
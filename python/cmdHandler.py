@@ -4,25 +4,246 @@
 # aidan.gray@idg.jhu.edu
 #
 # Command Handler loop. Runs in parallel with the TCP Server and
-# Transmit loops. It constantly monitors the Command Queue and 
-# acts upon new commands in the order they are received. It also
-# populates the Telemetry dictionary.
+# Transmit loops. It waits on the Command Queue and acts upon new
+# commands in the order they are received. It also runs the periodic
+# sensor, heater, environment and current tasks that populate the
+# Telemetry dictionary, and starts the heater interlock thread.
 
 import logging
 import asyncio
-import time
-import queue
+import functools
+import math
+import re
 import sys
+import time
 from datetime import datetime
+from scheduler import Scheduler
+from busWorker import BusWorker
+from pidEngine import PIDEngine, to_kelvin
+from interlock import Interlock
+from DAC8775 import latch
+from tlmSnapshot import TLMWriter, SnapshotError, read_snapshot, format_tlm
 from CMD_DICT import cmd_set_dict, cmd_get_dict
 from LEG_CMD_DICT import leg_action_dict, leg_query_dict
 
+# Get commands that only read cached telemetry. These can be answered
+# without waiting on the Command Queue.
+TLM_GET_CMDS = ('id', 'sns_temp', 'sns_res', 'sns_volts', 'env', 'dac_current', 'dac_fp', 'hipwr_current',
+                'dac_trip', 'hipwr_trip', 'tlm')
+
+ARG_COUNT_MSGS = {0: 'command failure: This command accepts no args',
+                  1: 'command failure: This command requires 1 arg',
+                  2: 'command failure: This command requires 2 args'}
+SET_RANGE_MSGS = ('command failure: arg 1 out of range', 'command failure: arg 2 out of range')
+GET_RANGE_MSGS = ('command failure: args out of range',)
+
+class CmdArgError(ValueError):
+    pass
+
+def compile_validator(cmd_dict, nArgs, rangeMsgs):
+    """
+    Build the parameter check for one CMD_DICT entry, so the limits are
+    looked up once at start up instead of on every command.
+
+    Input:
+    - cmd_dict:  entry from cmd_set_dict or cmd_get_dict. An optional
+                 'P#_MIN' allows fewer than 'P#' args.
+    - nArgs:     number of parameters the handler takes
+    - rangeMsgs: out of range message for each parameter
+
+    Output:
+    - validate(params), which returns a tuple of nArgs parameters padded
+      with None. Parameters with limits are converted to float once,
+      parameters without limits are passed through as strings. Raises
+      CmdArgError for a wrong count or out of range value and ValueError
+      for a value that is not a number.
+    """
+    pnum = cmd_dict['P#']
+    pnumMin = cmd_dict.get('P#_MIN', pnum)
+    if pnum not in ARG_COUNT_MSGS or pnum > nArgs or pnumMin > pnum:
+        raise CmdArgError('command dictionary failure: Command requires too many args')
+
+    countMsg = ARG_COUNT_MSGS[pnum]
+    checks = []
+
+    for n in range(pnum):
+        pmin = cmd_dict[f'P{n+1}_MIN']
+        pmax = cmd_dict[f'P{n+1}_MAX']
+
+        if pmin is None and pmax is None:
+            checks.append(str)
+        else:
+            checks.append(_range_check(-math.inf if pmin is None else pmin,
+                                       math.inf if pmax is None else pmax,
+                                       rangeMsgs[n]))
+
+    # Unrolled by arg count, this runs for every command
+    if pnumMin != pnum:
+        countMsg = f'command failure: This command accepts {pnumMin} to {pnum} args'
+        def validate(params):
+            if not pnumMin <= len(params) <= pnum:
+                raise CmdArgError(countMsg)
+            return tuple([check(p) for p, check in zip(params, checks)]) + (None,) * (nArgs - len(params))
+
+    elif pnum == 0:
+        noArgs = (None,) * nArgs
+        def validate(params):
+            if params:
+                raise CmdArgError(countMsg)
+            return noArgs
+
+    elif pnum == 1:
+        check1, = checks
+        pad = (None,) * (nArgs - 1)
+        def validate(params):
+            if len(params) != 1:
+                raise CmdArgError(countMsg)
+            return (check1(params[0]),) + pad
+
+    else:
+        check1, check2 = checks
+        def validate(params):
+            if len(params) != 2:
+                raise CmdArgError(countMsg)
+            return check1(params[0]), check2(params[1])
+
+    return validate
+
+def _range_check(pmin, pmax, msg):
+    def check(p):
+        val = float(p)
+        if pmin <= val <= pmax:
+            return val
+        raise CmdArgError(msg)
+    return check
+
+# Several commands can be sent on one line separated by ';'. Only a ';'
+# followed by a start character splits the line, since sns_cal and
+# sns_cal_coeffs use ';' inside their last arg.
+CMD_SEP = ';'
+CMD_SPLIT = re.compile(r';(?=\s*[$~?])')
+
+def split_commands(rawCmd):
+    """
+    Split a request line into its commands.
+
+    Output:
+    - list of command strings, stripped of whitespace
+    """
+    return [cmd.strip() for cmd in CMD_SPLIT.split(rawCmd.strip())]
+
+# Used by fast_get so the TCP Server applies the same checks as the
+# Command Handler
+TLM_GET_VALIDATORS = {cmd: compile_validator(cmd_get_dict[cmd], max(1, cmd_get_dict[cmd]['P#']), GET_RANGE_MSGS)
+                      for cmd in TLM_GET_CMDS}
+
+def tlm_get(tlm, cmd, p1, p2=None):
+    """
+    Format the response for one of the TLM_GET_CMDS from the telemetry
+    dictionary. p1 and p2 must already be range checked. For 'tlm' the
+    response is None while a scan is updating the telemetry.
+    """
+    if cmd == 'tlm':
+        data = read_snapshot(tlm)
+        if data is None:
+            return None
+        try:
+            retData = format_tlm(data, p1, p2)
+        except SnapshotError as e:
+            retData = f'BAD,command failure: {e}'
+
+    elif cmd == 'id':
+        board_id = tlm['id']
+        retData = f'id={board_id!r}'
+
+    elif cmd == 'sns_temp':
+        sns = str(int(p1))
+        temp = tlm['sns_temp_'+sns]
+        sns_units = tlm['sns_units_'+sns]
+        retData = f'sns_temp_{sns}={temp!r}{sns_units}'
+
+    elif cmd == 'sns_res':
+        sns = str(int(p1))
+        res = tlm['sns_res_'+sns]
+        retData = f'sns_res_{sns}={res!r}'
+
+    elif cmd == 'sns_volts':
+        sns = str(int(p1))
+        volts = tlm['sns_volts_'+sns]
+        retData = f'sns_volts_{sns}={volts!r}'
+
+    elif cmd == 'dac_current':
+        retData = f'dac_current_{int(p1)}='+str(tlm[f'dac_current_{int(p1)}'])
+
+    elif cmd == 'dac_fp':
+        retData = f'dac_fp_{int(p1)}='+str(tlm[f'dac_fp_{int(p1)}'])
+
+    elif cmd == 'hipwr_current':
+        retData = f'hipwr_current_{int(p1)}='+str("{:.2f}".format(tlm[f'hipwr_current_{int(p1)}']))+'mA'
+
+    elif cmd in ('dac_trip', 'hipwr_trip'):
+        retData = f'{cmd}_{int(p1)}='+tlm[f'{cmd}_{int(p1)}']
+
+    elif cmd == 'env':
+        if p1 == 'temp':
+            retData = 'temp='+str(tlm['env_temp'])+'C'
+        elif p1 == 'press':
+            retData = 'press='+str(tlm['env_press'])+'Pa'
+        elif p1 == 'hum':
+            retData = 'hum='+str(tlm['env_hum'])+'%'
+        elif p1 == 'all':
+            retData = 'temp='+str(tlm['env_temp'])+'C,press='+str(tlm['env_press'])+'Pa,hum='+str(tlm['env_hum'])+'%'
+        else:
+            retData = f'BAD,command failure: unknown arg {p1!r}'
+
+    else:
+        retData = f'BAD,command failure: unknown command {cmd!r}'
+
+    return retData
+
+def fast_get(tlm, rawCmd):
+    """
+    Answer a read-only telemetry get directly from tlm.
+
+    Output:
+    - the response string, or None if the line has to go through the
+      Command Queue (any command that is not a telemetry get, or anything
+      that would need an error response)
+    """
+    retList = []
+
+    for cmdStr in split_commands(rawCmd):
+        if not cmdStr.startswith('$get,'):
+            return None
+
+        cmdStrList = cmdStr[5:].split(',')
+        validate = TLM_GET_VALIDATORS.get(cmdStrList[0])
+        if validate is None:
+            return None
+
+        try:
+            params = validate(cmdStrList[1:])
+        except ValueError:
+            return None
+
+        retData = tlm_get(tlm, cmdStrList[0], *params)
+        if retData is None or 'BAD' in retData:
+            return None
+
+        retList.append('OK,'+retData)
+
+    return CMD_SEP.join(retList)
+
+SCAN_MODES = ('sequential', 'sync')
+
 class CMDLoop:
-    def __init__(self, qCmd, qXmit, eeprom, tlm, cal, io, bme280, ads1015, hi_pwr_htrs, dacList, adcList):
+    def __init__(self, qCmd, qXmit, eeprom, tlm, cal, io, bme280, ads1015, hi_pwr_htrs, dacList, adcList,
+                 sensorPeriod=1.0, heaterPeriod=None, envPeriod=1.0, currentPeriod=0.1, scanMode='sequential',
+                 interlockPeriod=0.1, maxRiseRate=0.0, interlockTimeout=1.0, published=None):
         self.logger = logging.getLogger('smb')
         self.qCmd = qCmd
         self.qXmit = qXmit
-        self.qUDP = queue.Queue()
+        self.qUDP = asyncio.Queue()
         self.eeprom = eeprom
         self.tlm = tlm
         self.cal = cal
@@ -32,145 +253,375 @@ class CMDLoop:
         self.hi_pwr_htrs = hi_pwr_htrs
         self.dacList = dacList
         self.adcList = adcList
+        self.tlmWriter = TLMWriter(tlm, published)  # readers get tlmWriter.published
+        self.scanCount = 0
+        self.scanMode = scanMode
+        self.sensorPeriod = sensorPeriod
+
+        # Heaters are updated once per sensor scan unless told otherwise
+        if heaterPeriod is None:
+            heaterPeriod = sensorPeriod
+        self.heaterPeriod = heaterPeriod
+        self.pid = PIDEngine(len(dacList))  # one loop per DAC, run in dac_mode 2
+
+        # One worker thread per physical bus
+        self.spi0 = BusWorker('spi0')  # AD7124 bank
+        self.spi1 = BusWorker('spi1')  # DAC8775
+        self.i2c = BusWorker('i2c1')   # EEPROM, ADS1015, BME280
+
+        # Runs on its own thread so the command handler cannot delay it
+        self.interlock = Interlock(io, dacList, hi_pwr_htrs, adcList, self.spi0, self.spi1, tlm,
+                                   period=interlockPeriod, maxRate=maxRiseRate, timeout=interlockTimeout)
+
+        self.scheduler = Scheduler()
+        self.scheduler.add('sensor', sensorPeriod, functools.partial(self.tlm_update, self.sensor_scan))
+        self.scheduler.add('heater', heaterPeriod, functools.partial(self.tlm_update, self.heater_update))
+        self.scheduler.add('pid', heaterPeriod, functools.partial(self.tlm_update, self.pid_update))
+        self.scheduler.add('env', envPeriod, functools.partial(self.tlm_update, self.env_update))
+        self.scheduler.add('current', currentPeriod, functools.partial(self.tlm_update, self.current_update))
+        self.update_sensor_period()
+        self.update_pid_period()
+
+        # Dispatch tables: command name -> (validator, handler)
+        self.set_table = {}
+        for cmd, cmd_dict in cmd_set_dict.items():
+            self.set_table[cmd] = (compile_validator(cmd_dict, 2, SET_RANGE_MSGS), getattr(self, 'set_'+cmd))
+
+        self.get_table = {}
+        for cmd, cmd_dict in cmd_get_dict.items():
+            if cmd in TLM_GET_CMDS and cmd != 'tlm':
+                handler = functools.partial(self.get_cached, cmd)
+            else:
+                handler = getattr(self, 'get_'+cmd)
+            self.get_table[cmd] = (compile_validator(cmd_dict, max(1, cmd_dict['P#']), GET_RANGE_MSGS), handler)
 
     async def start(self):
-        lastTime = 0
+        self.interlock.start()
+        await asyncio.gather(self.scheduler.start(), self.cmd_loop())
+
+    async def cmd_loop(self):
+        ### Check the Command Queue ###
         while True:
-            newTime = time.perf_counter()
-            if lastTime == 0:
-                tempTime = newTime - 1
-
-            ### Get BME280 environment data ###
-            self.tlm['env_temp'] = self.bme280.get_temperature()
-            self.tlm['env_press'] = self.bme280.get_pressure()
-            self.tlm['env_hum'] = self.bme280.get_humidity()
-
-            ### Heater Loop ###
-            # check if a conversion is occurring
-            if self.ads1015.conversion_status() == 1:
-                lastConvert = self.ads1015.last_convert()
-                lastCurrent = self.ads1015.conversion_read()
+            msg = await self.qCmd.get()
+            writer = msg[0]
+            cmd = msg[1]
+
+            retData = await self.parse_raw_command(cmd)
+            await self.enqueue_xmit((writer, retData+'\n'))
+
+            # Lets the TCP Server answer this connection's gets itself again
+            if len(msg) > 2:
+                msg[2]()
+
+    async def tlm_update(self, func):
+        # The fields func writes are published together when it returns
+        with self.tlmWriter.updating():
+            await func()
+
+    async def env_update(self):
+        await self.i2c.run(self.read_env)
+
+    def read_env(self):
+        ### Get BME280 environment data ###
+        self.tlm['env_temp'] = self.bme280.get_temperature()
+        self.tlm['env_press'] = self.bme280.get_pressure()
+        self.tlm['env_hum'] = self.bme280.get_humidity()
+
+    async def current_update(self):
+        await self.i2c.run(self.read_current)
+
+    def read_current(self):
+        ### Heater Current ###
+        # check if a conversion is occurring
+        if self.ads1015.conversion_status() == 1:
+            lastConvert = self.ads1015.last_convert()
+            lastCurrent = self.ads1015.conversion_read()
+            
+            # check which conversion happened last
+            if lastConvert == 0:
+                self.tlm['hipwr_current_1'] = lastCurrent
+                self.ads1015.convert_3()
+
+            elif lastConvert == 3:
+                self.tlm['hipwr_current_2'] = lastCurrent
+                self.ads1015.convert_0()
+
+    async def sensor_scan(self):
+        ### Temperature Sensor ###
+        now = datetime.now()
+
+        # The order alternates between scans to keep select line changes
+        # down.
+        self.scanCount += 1
+        order = [n for n in self.io.adc_scan_order(self.scanCount) if n < len(self.adcList)]
+
+        if self.scanMode == 'sync':
+            temps = await self.spi0.run(self.read_synced, order)
+        else:
+            temps = None
+
+        for n in order:
+            if temps is None:
+                # Each channel is a separate request so commands for the
+                # bus can be served in between channels.
+                temp = round(await self.spi0.run(self.adcList[n].get_temperature), 3)
+            else:
+                temp = round(temps[n], 3)
+
+            sns_unitsTmp = self.adcList[n].sns_units
+
+            if sns_unitsTmp == 0:
+                sns_units = 'K'
+            elif sns_unitsTmp == 1:
+                sns_units = 'C'
+            elif sns_unitsTmp == 2:
+                sns_units = 'F'
+            else:
+                raise ValueError(f"Unknown Sensor Units:{sns_unitsTmp} 0=K, 1=C, 2=F")
+            
+            m = f'{n+1:02d}'
+            if temp != -999:
+                self.enqueue_udp(f'{now}, temp_{m}={temp}{sns_units}')
+            self.tlm['sns_temp_'+str(n+1)] = temp
+
+    def read_synced(self, order):
+        """
+        Start the conversions of every ADC with one SYNC pulse, wait for
+        them to settle and read them back to back. This is one bus request,
+        a command in between would restart the conversions.
+
+        Input:
+        - order: ADC indices in reading order
+
+        Output:
+        - {index: temperature}
+        """
+        self.io.adc_sync()
+        t0 = time.monotonic()
+        temps = {}
+
+        # Each ADC is read once its own filter has settled, the fastest
+        # first. Equal filters keep the order they were given.
+        for n in sorted(order, key=lambda n: self.adcList[n].settling_time()):
+            delay = t0 + self.adcList[n].settling_time() - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            temps[n] = self.adcList[n].get_temperature()
+
+        return temps
+
+    def update_sensor_period(self):
+        """
+        Stretch the sensor scan period if the ADC filters are too slow to
+        deliver a new sample from every channel each scan, and shrink it
+        back to the requested period when they are not.
+        """
+        if self.scanMode == 'sync':
+            minPeriod = max((adc.settling_time() for adc in self.adcList), default=0)
+        else:
+            minPeriod = max((adc.sample_interval() for adc in self.adcList), default=0)
+
+        period = max(self.sensorPeriod, minPeriod)
+        if period != self.scheduler.get_period('sensor'):
+            if period > self.sensorPeriod:
+                self.logger.info(f'sensor period stretched to {period:.3f}s for the ADC filters')
+            self.scheduler.set_period('sensor', period)
+
+    async def heater_update(self):
+        now = datetime.now()
+
+        # Update DAC Heaters. The new codes are staged in every DAC and
+        # latched together below, so the heaters change at the same time.
+        updates = []
+        for dac in self.dacList:
+            # Ensure mode and sensor number are specified. A tripped
+            # heater is held off by the interlock until it is cleared.
+            if dac.sns_num != 0 and dac.mode != 0 and dac.htr_res != 0 and not self.interlock.is_tripped(dac):
+                temp = self.tlm['sns_temp_'+str(dac.sns_num)]
+                sns_unitsTmp = self.adcList[dac.sns_num-1].get_sns_units()
+                if sns_unitsTmp == 0:
+                    sns_units = 'K'
+                elif sns_unitsTmp == 1:
+                    sns_units = 'C'
+                elif sns_unitsTmp == 2:
+                    sns_units = 'F'
+                else:
+                    raise ValueError(f"Unknown Sensor Units:{sns_unitsTmp} 0=K, 1=C, 2=F")
+
+                setpoint = dac.setPoint
+                try:
+                    #power = round(self.tlm[f'dac_power_{dac.idx+1}'], 5)
+                    current = round(self.tlm[f'dac_current_{dac.idx+1}'], 5)
+
+                except Exception as e:
+                    print(f'error: {e}')
+                    #power = 0
+                    current = 0
+                
+                self.enqueue_udp(f'{now}, DAC_{dac.idx}: temp={temp}{sns_units}, setpoint={setpoint}{sns_units}, current={current}A')
+                
+                # PID control (mode 2) runs in pid_update at its own rate
+                if temp < dac.max_temp and temp > dac.min_temp:
+                    if dac.mode == 1:
+                        updates.append((dac, dac.fp_update, ()))
+                    elif dac.mode == 3:
+                        updates.append((dac, dac.set_current_update, ()))
+                else:
+                    dac.controlVar = 0.0
+
+        if updates:
+            await self.spi1.run(self.drive_dacs, updates)
+
+        # Update Hi-Power Heaters
+        for htr in self.hi_pwr_htrs:
+            if htr.sns_num != 0 and htr.mode != 0 and not self.interlock.is_tripped(htr):
+                temp = self.tlm['sns_temp_'+str(htr.sns_num)]
+                sns_unitsTmp = self.adcList[htr.sns_num-1].get_sns_units()
+                if sns_unitsTmp == 0:
+                    sns_units = 'K'
+                elif sns_unitsTmp == 1:
+                    sns_units = 'C'
+                elif sns_unitsTmp == 2:
+                    sns_units = 'F'
+                else:
+                    raise ValueError(f"Unknown Sensor Units:{sns_unitsTmp} 0=K, 1=C, 2=F")
                 
-                # check which conversion happened last
-                if lastConvert == 0:
-                    self.tlm['hipwr_current_1'] = lastCurrent
-                    self.ads1015.convert_3()
-
-                elif lastConvert == 3:
-                    self.tlm['hipwr_current_2'] = lastCurrent
-                    self.ads1015.convert_0()
-
-            ### Temperature Sensor ###
-            # Update temperature values every 1 second
-            if newTime - tempTime >= 1:
-                now = datetime.now()
-                hp_cur1 = self.tlm['hipwr_current_1']
-                hp_cur2 = self.tlm['hipwr_current_2']
-
-                for n in range(len(self.adcList)):
-                    temp = round(self.adcList[n].get_temperature(), 3)
-                    
-                    sns_unitsTmp = self.adcList[n].sns_units
-
-                    if sns_unitsTmp == 0:
-                        sns_units = 'K'
-                    elif sns_unitsTmp == 1:
-                        sns_units = 'C'
-                    elif sns_unitsTmp == 2:
-                        sns_units = 'F'
-                    else:
-                        raise ValueError(f"Unknown Sensor Units:{sns_unitsTmp} 0=K, 1=C, 2=F")
-                    
-                    m = f'{n+1:02d}'
-                    if temp != -999:
-                        self.enqueue_udp(f'{now}, temp_{m}={temp}{sns_units}')
-                    self.tlm['sns_temp_'+str(n+1)] = temp
+                setpoint = htr.setPoint
+
+                try:
+                    current = round(self.tlm[f'hipwr_current_{htr.idx+1}'], 5)
+
+                except Exception as e:
+                    print(f'error: {e}')
+                    current = 0
+
+                self.enqueue_udp(f'HIPWR_{htr.idx+1}: temp={temp}{sns_units}, setpoint={setpoint}{sns_units}, current={current}A')
                 
-                # Update DAC Heaters
-                for dac in self.dacList:
-                    # Ensure mode and sensor number are specified
-                    if dac.sns_num != 0 and dac.mode != 0 and dac.htr_res != 0:
-                        temp = self.tlm['sns_temp_'+str(dac.sns_num)]
-                        sns_unitsTmp = self.adcList[dac.sns_num-1].get_sns_units()
-                        if sns_unitsTmp == 0:
-                            sns_units = 'K'
-                        elif sns_unitsTmp == 1:
-                            sns_units = 'C'
-                        elif sns_unitsTmp == 2:
-                            sns_units = 'F'
-                        else:
-                            raise ValueError(f"Unknown Sensor Units:{sns_unitsTmp} 0=K, 1=C, 2=F")
-
-                        setpoint = dac.setPoint
-                        try:
-                            #power = round(self.tlm[f'dac_power_{dac.idx+1}'], 5)
-                            current = round(self.tlm[f'dac_current_{dac.idx+1}'], 5)
-
-                        except Exception as e:
-                            print(f'error: {e}')
-                            #power = 0
-                            current = 0
-                        
-                        self.enqueue_udp(f'{now}, DAC_{dac.idx}: temp={temp}{sns_units}, setpoint={setpoint}{sns_units}, current={current}A')
-                        
-                        if temp < dac.max_temp and temp > dac.min_temp:
-                            if dac.mode == 1:
-                                dac.fp_update()
-                            elif dac.mode == 2:
-                                dac.dac_update(temp, sns_unitsTmp)
-                            elif dac.mode == 3:
-                                dac.set_current_update()
-                        else:
-                            dac.controlVar = 0.0
-
-                # Update Hi-Power Heaters
-                for htr in self.hi_pwr_htrs:
-                    if htr.sns_num != 0 and htr.mode != 0:
-                        temp = self.tlm['sns_temp_'+str(htr.sns_num)]
-                        sns_unitsTmp = self.adcList[htr.sns_num-1].get_sns_units()
-                        if sns_unitsTmp == 0:
-                            sns_units = 'K'
-                        elif sns_unitsTmp == 1:
-                            sns_units = 'C'
-                        elif sns_unitsTmp == 2:
-                            sns_units = 'F'
-                        else:
-                            raise ValueError(f"Unknown Sensor Units:{sns_unitsTmp} 0=K, 1=C, 2=F")
-                        
-                        setpoint = htr.setPoint
-
-                        try:
-                            current = round(self.tlm[f'hipwr_current_{htr.idx+1}'], 5)
-
-                        except Exception as e:
-                            print(f'error: {e}')
-                            current = 0
-
-                        self.enqueue_udp(f'HIPWR_{htr.idx+1}: temp={temp}{sns_units}, setpoint={setpoint}{sns_units}, current={current}A')
-                        
-                        if temp < htr.max_temp and temp > htr.min_temp:
-                            if htr.mode == 2:
-                                htr.update_htr(temp, sns_units)
-                        else:
-                            htr.power_off()
-
-                tempTime = time.perf_counter()
-
-            ### Check the Command Queue ###
-            if not self.qCmd.empty():
-                msg = await self.qCmd.get()
-                writer = msg[0]
-                cmd = msg[1]
-
-                retData = await self.parse_raw_command(cmd)
-                await self.enqueue_xmit((writer, retData+'\n'))
-
-            lastTime = newTime
-            await asyncio.sleep(0.000001)
+                if temp < htr.max_temp and temp > htr.min_temp:
+                    if htr.mode == 2:
+                        # The interlock may have tripped it since the check above
+                        self.interlock.unless_tripped(htr, htr.update_htr, temp, sns_units)
+                else:
+                    htr.power_off()
+
+    def pid_period(self, dac):
+        """
+        Output:
+        - seconds between PID steps for the DAC's loop, no shorter than
+          its control sensor takes to deliver a new settled sample
+        """
+        if dac.pid_rate > 0:
+            period = 1 / dac.pid_rate
+        else:
+            period = self.heaterPeriod
+
+        if dac.sns_num != 0:
+            period = max(period, self.adcList[dac.sns_num-1].sample_interval())
+        return period
+
+    def update_pid_period(self):
+        for dac in self.dacList:
+            if dac.pid_rate > 0 and self.pid_period(dac) > 1 / dac.pid_rate:
+                self.logger.info(f'DAC {dac.idx+1} PID rate limited to {1 / self.pid_period(dac):.3f}Hz by its sensor filter')
+
+        # The pid task runs as often as the fastest loop needs
+        period = min((self.pid_period(dac) for dac in self.dacList), default=self.heaterPeriod)
+        if period != self.scheduler.get_period('pid'):
+            self.scheduler.set_period('pid', period)
+
+    async def pid_update(self):
+        """
+        Step the PID loops of the DACs in mode 2 whose period has passed,
+        all in one engine step, and latch the new heater powers together.
+        A loop running faster than the sensor scan reads its control
+        sensor itself once a new sample is ready, otherwise it uses the
+        last scanned temperature.
+        """
+        now = time.perf_counter()
+        due = self.pid.due(now, slack=self.scheduler.get_period('pid') / 2)
+        pv = [0.0] * len(self.dacList)
+        mask = [False] * len(self.dacList)
+
+        for i, dac in enumerate(self.dacList):
+            if dac.mode != 2 or dac.sns_num == 0 or dac.htr_res == 0 or self.interlock.is_tripped(dac):
+                self.pid.stop(i)
+                continue
+
+            adc = self.adcList[dac.sns_num-1]
+            period = self.pid_period(dac)
+            self.pid.configure(i, dac.kp, dac.ki, dac.kd, to_kelvin(dac.setPoint, adc.sns_units),
+                               dac.max_current**2 * dac.htr_res * 1000, period)
+
+            if self.pid.active[i] and not due[i]:
+                continue
+
+            if period < self.scheduler.get_period('sensor') and adc.sample_ready():
+                temp = round(await self.spi0.run(adc.get_temperature), 3)
+                self.tlm['sns_temp_'+str(dac.sns_num)] = temp
+            else:
+                temp = self.tlm['sns_temp_'+str(dac.sns_num)]
+
+            if temp == -999 or not (dac.min_temp < temp < dac.max_temp):
+                # Restarted bumplessly once the temperature is back in range
+                dac.controlVar = 0.0
+                self.pid.stop(i)
+                continue
+
+            pvK = to_kelvin(temp, adc.sns_units)
+            if not self.pid.active[i]:
+                # Carry on from the power the heater is at now
+                self.pid.start(i, pvK, dac.power * 1000, now)
+                continue
+
+            pv[i] = pvK
+            mask[i] = True
+
+        if not any(mask):
+            return
+
+        output = self.pid.step(pv, mask, time.perf_counter())
+
+        updates = [(dac, dac.power_update, (output[i] / 1000,)) for i, dac in enumerate(self.dacList) if mask[i]]
+        await self.spi1.run(self.drive_dacs, updates)
+
+    def drive_dacs(self, updates, guard=True):
+        """
+        Runs on the SPI1 thread. Stage the new codes and latch them with
+        one nLDAC pulse. It is one bus request, so the other heater task
+        cannot latch codes that are only half staged here.
+
+        Input:
+        - updates: list of (DAC, update method, args), each method called
+                   with load=False
+        - guard:   stage through the interlock, which leaves out a DAC
+                   tripped since the task checked it. False to write
+                   every DAC, e.g. to turn them all off.
+        """
+        pending = []
+        for dac, func, args in updates:
+            stage = lambda: pending.append(func(*args, load=False))
+            if guard:
+                self.interlock.unless_tripped(dac, stage)
+            else:
+                stage()
+
+        if any(pending):
+            latch(self.io, self.dacList)
 
     async def parse_raw_command(self, rawCmd):
-        cmdStr = rawCmd.strip()  # remove whitespace at the end
-        
+        """
+        Execute every command in the request line, in order.
+
+        Output:
+        - the responses joined with ';', each starting with OK or BAD
+        """
+        retList = []
+        for cmdStr in split_commands(rawCmd):
+            retList.append(await self.parse_command(cmdStr))
+
+        return CMD_SEP.join(retList)
+
+    async def parse_command(self, cmdStr):
         if len(cmdStr) != 0:
             if cmdStr[0] == '~' or cmdStr[0] == '?':
                 retData = await self.legacy_command_parser(cmdStr)
@@ -203,528 +654,379 @@ class CMDLoop:
         return retData
 
     async def parse_set_command(self, cmdStr):
-        if cmdStr[0] in cmd_set_dict:
-            cmd_dict = cmd_set_dict[cmdStr[0]]
-
-            # Check if cmd parameters meet cmd_dict requirements
-            if cmd_dict['P#'] == 0:
-                if len(cmdStr) == 1:
-                    retData = await self.execute_set_command(cmd_dict, cmdStr[0], [None, None])
-                    
-                else:
-                    retData = 'BAD,command failure: This command accepts no args'
-                    self.logger.error(retData)
+        entry = self.set_table.get(cmdStr[0])
 
-            elif cmd_dict['P#'] == 1:
-                if len(cmdStr) == 2:
-                    retData = await self.execute_set_command(cmd_dict, cmdStr[0], [cmdStr[1], None])
+        if entry is None:
+            retData = 'BAD,command failure: cmd arg invalid'
+            self.logger.error(retData)
+            return retData
 
-                else:
-                    retData = 'BAD,command failure: This command requires 1 arg'
-                    self.logger.error(retData)
+        validate, handler = entry
 
-            elif cmd_dict['P#'] == 2:
-                if len(cmdStr) == 3:
-                    retData = await self.execute_set_command(cmd_dict, cmdStr[0], cmdStr[1:3])
+        try:
+            p1, p2 = validate(cmdStr[1:])
+            retData = await handler(p1, p2)
 
-                else:
-                    retData = 'BAD,command failure: This command requires 2 args'
-                    self.logger.error(retData)
-            else:
-                    retData = 'BAD,command dictionary failure: Command requires too many args'
-                    self.logger.error(retData)
-        else:
-            retData = 'BAD,command failure: cmd arg invalid'
+        except CmdArgError as e:
+            retData = f'BAD,{e}'
             self.logger.error(retData)
-        
+
+        except (TypeError, ValueError) as e:
+            retData = f'BAD,command failure: expected args float or int = {e}'
+            self.logger.error(retData)
+
         return retData
 
     async def parse_get_command(self, cmdStr):
-        if cmdStr[0] in cmd_get_dict:
-            cmd_dict = cmd_get_dict[cmdStr[0]]
-            
-            # Check if cmd parameters meet cmd_dict requirements
-            if cmd_dict['P#'] == 0:
-                if len(cmdStr) == 1:
-                    retData = await self.execute_get_command(cmd_dict, cmdStr[0], [None])
+        entry = self.get_table.get(cmdStr[0])
 
-                else:
-                    retData = 'BAD,command failure: This command accepts no args'
-                    self.logger.error(retData)
+        if entry is None:
+            retData = 'BAD,command failure: cmd arg invalid'
+            self.logger.error(retData)
+            return retData
 
-            elif cmd_dict['P#'] == 1:
-                if len(cmdStr) == 2:
-                    retData = await self.execute_get_command(cmd_dict, cmdStr[0], cmdStr[1:2])
+        validate, handler = entry
 
-                else:
-                    retData = 'BAD,command failure: This command requires 1 arg'
-                    self.logger.error(retData)
-
-            else:
-                    retData = 'BAD,command dictionary failure: Command requires too many args'
-                    self.logger.error(retData)
+        try:
+            retData = await handler(*validate(cmdStr[1:]))
 
-        else:
-            retData = 'BAD,command failure: cmd arg invalid'
+        except CmdArgError as e:
+            retData = f'BAD,{e}'
             self.logger.error(retData)
 
+        except Exception as e1:
+            retData = 'BAD,command failure: expected args float or int'
+            self.logger.error(f'{retData}')
+
         return retData
 
-    async def execute_set_command(self, cmd_dict, cmd, params):
-        p1 = params[0]
-        p2 = params[1]
-        pnum = cmd_dict['P#']
-        p1min = cmd_dict['P1_MIN']
-        p1max = cmd_dict['P1_MAX']
-        p2min = cmd_dict['P2_MIN']
-        p2max = cmd_dict['P2_MAX']
-        output = 'OK'
+    ### SET COMMANDS ###
+    # One handler per cmd_set_dict entry, named set_<command>. Arguments
+    # arrive already range checked (floats, or strings when the command
+    # has no limits).
 
-        try:
-            # Check p1
-            if p1min == None and p1max == None:
-                pass
-            elif p1min == None and float(p1) <= p1max:
-                p1 = float(p1)
-            elif p1max == None and float(p1) >= p1min:
-                p1 = float(p1)
-            elif float(p1) >= p1min and float(p1) <= p1max:
-                p1 = float(p1)
-            else:
-                retData = 'BAD,command failure: arg 1 out of range'
-                self.logger.error(retData)
-                return retData
-
-            # Check p2
-            if p2min == None and p2max == None:
-                pass
-            elif p2min == None and float(p2) <= p2max:
-                p2 = float(p2)
-            elif p2max == None and float(p2) >= p2min:
-                p2 = float(p2)
-            elif float(p2) >= p2min and float(p2) <= p2max:
-                p2 = float(p2)
-            else:
-                retData = 'BAD,command failure: arg 2 out of range'
-                self.logger.error(retData)
-                return retData
+    async def set_id(self, p1, p2):
+        await self.board_id(int(p1))
+        return 'OK'
 
-            # Handle each command case
-            
-            if cmd == 'id':
-                await self.board_id(int(p1))
-                retData = 'OK'
-            
-            elif cmd == 'reset':
-                self.eeprom.reset_eeprom()
-                retData = 'OK, please restart Sensor Monitor Board.'
-            
-            elif cmd == 'update_eeprom':
-                for dac in self.dacList:
-                    dac.update_eeprom_mem()
-                
-                for adc in self.adcList:
-                    adc.update_eeprom_mem()
+    async def set_reset(self, p1, p2):
+        await self.i2c.run(self.eeprom.reset_eeprom)
+        return 'OK, please restart Sensor Monitor Board.'
 
-                self.ads1015.update_eeprom_mem()
-                self.bme280.update_eeprom_mem()
+    async def set_update_eeprom(self, p1, p2):
+        for dac in self.dacList:
+            dac.update_eeprom_mem()
 
-                for htr in self.hi_pwr_htrs:
-                    htr.update_eeprom_mem()
+        for adc in self.adcList:
+            adc.update_eeprom_mem()
 
-                # for htr in self.pid_htrs:
-                #     htr.update_eeprom_mem()x
-                
-                self.eeprom.fill_eeprom()
-                retData = 'OK'
-            
-            elif cmd == 'stop_program':
-                # Turn off all DACs
-                for dac in self.dacList:
-                    dac.write_control_var(0)
+        self.ads1015.update_eeprom_mem()
+        self.bme280.update_eeprom_mem()
 
-                # Turn off all hi-power heaters
-                for htr in self.hi_pwr_htrs:
-                    htr.power_off()
+        for htr in self.hi_pwr_htrs:
+            htr.update_eeprom_mem()
 
-                sys.exit()
+        # for htr in self.pid_htrs:
+        #     htr.update_eeprom_mem()x
 
-            elif cmd == 'dac_lcs':
-                intP1 = int(p1 - 1)
-                self.dacList[intP1].sns_num = int(p2)
-                retData = 'OK'
+        await self.i2c.run(self.eeprom.fill_eeprom)
+        return 'OK'
 
-            elif cmd == 'dac_mode':
-                intP1 = int(p1 - 1)
-                self.dacList[intP1].mode = int(p2)
-                retData = 'OK'
-            
-            elif cmd == 'dac_res':
-                intP1 = int(p1 - 1)
-                self.dacList[intP1].htr_res = p2
-                retData = 'OK'
-
-            elif cmd == 'dac_current':
-                intP1 = int(p1 - 1)
-                self.dacList[intP1].controlVar = float(p2)
-                retData = 'OK'
-            
-            elif cmd == 'dac_fp':
-                intP1 = int(p1 - 1)
-                self.dacList[intP1].fixed_percent = float(p2)
-                retData = 'OK'
-
-            elif cmd == 'dac_setpoint':
-                intP1 = int(p1 - 1)
-                self.dacList[intP1].setPoint = float(p2)
-                retData = 'OK'
-
-            elif cmd == 'dac_max_temp':
-                intP1 = int(p1 - 1)
-                self.dacList[intP1].max_temp = float(p2)
-                retData = 'OK'
-            
-            elif cmd == 'dac_min_temp':
-                intP1 = int(p1 - 1)
-                self.dacList[intP1].min_temp = float(p2)
-                retData = 'OK'
-
-            elif cmd == 'dac_p':
-                intP1 = int(p1 - 1)
-                self.dacList[intP1].kp = p2
-                retData = 'OK'
-            
-            elif cmd == 'dac_i':
-                intP1 = int(p1 - 1)
-                self.dacList[intP1].ki = p2
-                retData = 'OK'
-
-            elif cmd == 'dac_d':
-                intP1 = int(p1 - 1)
-                self.dacList[intP1].kd = p2
-                retData = 'OK'
-
-            elif cmd == 'hipwr_lcs':
-                self.hi_pwr_htrs[int(p1)-1].sns_num = int(p2)
-                retData = 'OK'
-
-            elif cmd == 'hipwr_mode':
-                self.hi_pwr_htrs[int(p1)-1].mode = int(p2)
-                retData = 'OK'
-
-            elif cmd == 'hipwr_setpoint':
-                intP1 = int(p1 - 1)
-                self.hi_pwr_htrs[intP1].setPoint = float(p2)
-                retData = 'OK'
-
-            elif cmd == 'hipwr_state':
-                if int(p2) == 0:
-                    self.hi_pwr_htrs[int(p1)-1].power_off()
-                    retData = 'OK'
-                elif int(p2) == 1:
-                    self.hi_pwr_htrs[int(p1)-1].power_on()
-                    retData = 'OK'
-                else: retData = 'BAD, must be 0 or 1'
-
-            elif cmd == 'hipwr_hysteresis':
-                intP1 = int(p1 - 1)
-                self.hi_pwr_htrs[intP1].hysteresis = float(p2)
-                retData = 'OK'
-
-            elif cmd == 'hipwr_max_temp':
-                intP1 = int(p1 - 1)
-                self.hi_pwr_htrs[intP1].max_temp = float(p2)
-                retData = 'OK'
-            
-            elif cmd == 'hipwr_min_temp':
-                intP1 = int(p1 - 1)
-                self.hi_pwr_htrs[intP1].min_temp = float(p2)
-                retData = 'OK'
-
-            elif cmd == 'sns_type':
-                sns = int(p1 - 1)
-                sns_type = int(p2)
-                self.adcList[sns].set_sns_type(sns_type)
-                retData = 'OK'
-
-            elif cmd == 'sns_units':
-                retData = 'OK'
-                sns = int(p1 - 1)
-                if p2 == 'K':
-                    units = 0
-                    self.adcList[sns].set_sns_units(units)
-                elif p2 == 'C':
-                    units = 1
-                    self.adcList[sns].set_sns_units(units)
-                elif p2 == 'F':
-                    units = 2
-                    self.adcList[sns].set_sns_units(units)
-                else:
-                    retData = 'BAD: Units must be K, C, F.'
-            
-            elif cmd == 'sns_cal':
-                sns = int(p1 - 1)
-                tmpCalData = p2.split(';')
-                calData = []
-
-                for point in tmpCalData:
-                    newPt = point.split(' ')
-                    newPt[0] = float(newPt[0])
-                    newPt[1] = float(newPt[1])
-                    calData.append(newPt)
-
-                self.adcList[sns].set_calibration(calData)
-                retData = 'OK'
-
-            elif cmd == 'sns_cal_coeffs':
-                sns = int(p1 - 1)
-                calCoeffs = p2.split(';')
-                retData = self.adcList[sns].set_calibration_coeffs(calCoeffs)
-
-            elif cmd == 'reset_adc':
-                sns = int(p1 - 1)
-                retData = self.adcList[sns].reset()
-
-            elif cmd == 'adc_filt':
-                pass
-            
-            elif cmd == 'excit':
-                intP1 = int(p1 - 1)
-                self.adcList[intP1].set_excitation_current(p2)
-                retData = 'OK'
-                
-            else:
-                retData = f'BAD,command failure: unknown command {cmd!r}'
-                self.logger.error(retData)
-                return retData
+    async def set_stop_program(self, p1, p2):
+        self.interlock.stop()
 
-            return retData
-        
-        except (TypeError, ValueError) as e:
-            retData = f'BAD,command failure: expected args float or int = {e}'
-            self.logger.error(retData)
-            return retData
-        
-    async def execute_get_command(self, cmd_dict, cmd, params):
-        p1 = params[0]
-        pnum = cmd_dict['P#']
-        p1min = cmd_dict['P1_MIN']
-        p1max = cmd_dict['P1_MAX']
-        retmin = cmd_dict['RET_MIN']
-        retmax = cmd_dict['RET_MAX']
+        # Turn off all DACs
+        await self.spi1.run(self.drive_dacs, [(dac, dac.write_control_var, (0,)) for dac in self.dacList], guard=False)
 
-        try:
-            # Check p1
-            if p1min == None and p1max == None:
-                pass
-            elif p1min == None and float(p1) <= p1max:
-                p1 = float(p1)
-            elif p1max == None and float(p1) >= p1min:
-                p1 = float(p1)
-            elif float(p1) >= p1min and float(p1) <= p1max:
-                p1 = float(p1)
-            else:
-                retData = 'BAD,command failure: args out of range'
-                self.logger.error(retData)
-                return retData
+        # Turn off all hi-power heaters
+        for htr in self.hi_pwr_htrs:
+            htr.power_off()
 
-            # Handle each command case
-            
-            if cmd == 'id':
-                board_id = self.tlm['id']
-                retData = f'id={board_id!r}'
-            
-            elif cmd == 'sw_rev':
-                pass
-
-            elif cmd == 'eeprom':
-                self.eeprom.printout_eeprom()
-                retData = 'printing eeprom memory map to logger.'
-
-            elif cmd == 'dac_lcs':
-                intP1 = int(p1 - 1)
-                sns_num = self.dacList[intP1].sns_num
-                retData = f'dac_lcs_{int(p1)}={sns_num!r}'
-
-            elif cmd == 'dac_mode':
-                intP1 = int(p1 - 1)
-                mode = self.dacList[intP1].mode
-                retData = f'dac_mode_{int(p1)}={mode!r}'
-
-            elif cmd == 'dac_res':
-                intP1 = int(p1 - 1)
-                dac_res = self.dacList[intP1].htr_res
-                retData = f'dac_res_{int(p1)}={dac_res!r}'
-
-            elif cmd == 'dac_current':
-                if p1 == 1:
-                    retData = 'dac_current_1='+str(self.tlm['dac_current_1'])
-                elif p1 == 2:
-                    retData = 'dac_current_2='+str(self.tlm['dac_current_2'])
-                else:
-                    retData = f'BAD,command failure: unknown arg {p1!r}'
+        sys.exit()
 
-            elif cmd == 'dac_fp':
-                if p1 == 1:
-                    retData = 'dac_fp_1='+str(self.tlm['dac_fp_1'])
-                elif p1 == 2:
-                    retData = 'dac_fp_2='+str(self.tlm['dac_fp_2'])
-                else:
-                    retData = f'BAD,command failure: unknown arg {p1!r}'
+    async def set_dac_lcs(self, p1, p2):
+        self.dacList[int(p1 - 1)].sns_num = int(p2)
+        self.update_pid_period()
+        return 'OK'
 
-            elif cmd == 'dac_setpoint':
-                intP1 = int(p1 - 1)
-                setpoint = self.dacList[intP1].setPoint
-                retData = f'dac_setpoint_{int(p1)}={setpoint!r}'
+    async def set_dac_mode(self, p1, p2):
+        await self.spi1.run(setattr, self.dacList[int(p1 - 1)], 'mode', int(p2))
+        return 'OK'
 
-            elif cmd == 'dac_max_temp':
-                intP1 = int(p1 - 1)
-                dac_max_temp = self.dacList[intP1].max_temp
-                retData = f'dac_max_temp_{int(p1)}={dac_max_temp!r}'
-            
-            elif cmd == 'dac_min_temp':
-                intP1 = int(p1 - 1)
-                dac_min_temp = self.dacList[intP1].min_temp
-                retData = f'dac_min_temp_{int(p1)}={dac_min_temp!r}'
-
-            elif cmd == 'dac_p':
-                intP1 = int(p1 - 1)
-                pid_p = self.dacList[intP1].kp
-                retData = f'pid_p_{int(p1)}={pid_p!r}'
-
-            elif cmd == 'dac_i':
-                intP1 = int(p1 - 1)
-                pid_i = self.dacList[intP1].ki
-                retData = f'pid_i_{int(p1)}={pid_i!r}'
-
-            elif cmd == 'dac_d':
-                intP1 = int(p1 - 1)
-                pid_d = self.dacList[intP1].kd
-                retData = f'pid_d_{int(p1)}={pid_d!r}'
-
-            elif cmd == 'hipwr_lcs':
-                intP1 = int(p1 - 1)
-                sns_num = self.hi_pwr_htrs[intP1].sns_num
-                retData = f'hi_pwr_lcs_{int(p1)}={sns_num!r}'
-
-            elif cmd == 'hipwr_mode':
-                mode = self.hi_pwr_htrs[int(p1)-1].mode
-                retData = f'hipwr_mode_{int(p1)}={mode!r}'
-
-            elif cmd == 'hipwr_setpoint':
-                intP1 = int(p1 - 1)
-                setpoint = self.hi_pwr_htrs[intP1].setPoint
-                retData = f'hipwr_setpoint_{int(p1)}={setpoint!r}'
-
-            elif cmd == 'hipwr_state':
-                state = self.hi_pwr_htrs[int(p1-1)].status()
-                retData = f'hipwr_state_{int(p1)}={state!r}'
-
-            elif cmd == 'hipwr_hysteresis':
-                intP1 = int(p1 - 1)
-                hysteresis = self.hi_pwr_htrs[intP1].hysteresis
-                retData = f'hipwr_hysteresis_{int(p1)}={hysteresis!r}'
-
-            elif cmd == 'hipwr_max_temp':
-                intP1 = int(p1 - 1)
-                hipwr_max_temp = self.hi_pwr_htrs[intP1].max_temp
-                retData = f'hipwr_max_temp_{int(p1)}={hipwr_max_temp!r}'
-            
-            elif cmd == 'hipwr_min_temp':
-                intP1 = int(p1 - 1)
-                hipwr_min_temp = self.hi_pwr_htrs[intP1].min_temp
-                retData = f'hipwr_min_temp_{int(p1)}={hipwr_min_temp!r}'
-
-            elif cmd == 'hipwr_current':
-                if p1 == 1:
-                    retData = 'hipwr_current_1='+str("{:.2f}".format(self.tlm['hipwr_current_1']))+'mA'
-                elif p1 == 2:
-                    retData = 'hipwr_current_2='+str("{:.2f}".format(self.tlm['hipwr_current_2']))+'mA'
-                else:
-                    retData = f'BAD,command failure: unknown arg {p1!r}'
-
-            elif cmd == 'sns_type':
-                sns = int(p1 - 1)
-                sns_type = self.adcList[sns].sns_type
-                retData = f'sns_type_{int(p1)}={sns_type}'
-
-            elif cmd == 'sns_units':
-                sns = int(p1 - 1)
-                sns_units = self.adcList[sns].sns_units
-                if sns_units == 0:
-                    units = 'K'
-                elif sns_units == 1:
-                    units = 'C'
-                elif sns_units == 2:
-                    units = 'F'
-                retData = f'sns_units_{int(p1)}={units}'
-
-            elif cmd == 'sns_cal_coeffs':
-                sns = int(p1 - 1)
-                calCoeffs = self.adcList[sns].get_calibration_coeffs()
-                retData = f'sns_cal_coeffs{int(p1)}={calCoeffs}'
-
-            elif cmd == 'sns_temp':
-                sns = str(p1)
-                sns = sns.split('.')[0]
-                snsName = 'sns_temp_'+sns
-                temp = self.tlm[snsName]
-                sns_units = self.adcList[int(p1)-1].sns_units
-                if sns_units == 0:
-                    sns_units = 'K'
-                elif sns_units == 1:
-                    sns_units = 'C'
-                elif sns_units == 2:
-                    sns_units = 'F'
-                else:
-                    raise ValueError(f"Unknown Sensor Units:{sns_units} 0=K, 1=C, 2=F")
-                retData = f'sns_temp_{sns}={temp!r}{sns_units}'
-
-            elif cmd == 'sns_res':
-                sns = str(p1)
-                sns = sns.split('.')[0]
-                snsName = 'sns_res_'+sns
-                res = self.tlm[snsName]
-                retData = f'sns_res_{sns}={res!r}'
-
-            elif cmd == 'sns_volts':
-                sns = str(p1)
-                sns = sns.split('.')[0]
-                snsName = 'sns_volts_'+sns
-                volts = self.tlm[snsName]
-                retData = f'sns_volts_{sns}={volts!r}'
-
-            elif cmd == 'adc_filt':
-                pass
-
-            elif cmd == 'excit':
-                intP1 = int(p1 - 1)
-                retData = f'excit={self.adcList[intP1].get_excitation_current()}'
-            
-            # Get BME280 data
-            elif cmd == 'env':
-                if p1 == 'temp':
-                    retData = 'temp='+str(self.tlm['env_temp'])+'C'
-                elif p1 == 'press':
-                    retData = 'press='+str(self.tlm['env_press'])+'Pa'
-                elif p1 == 'hum':
-                    retData = 'hum='+str(self.tlm['env_hum'])+'%'
-                elif p1 == 'all':
-                    retData = 'temp='+str(self.tlm['env_temp'])+'C,press='+str(self.tlm['env_press'])+'Pa,hum='+str(self.tlm['env_hum'])+'%'
-                else:
-                    retData = f'BAD,command failure: unknown arg {p1!r}'
-            
-            else:
-                retData = f'BAD,command failure: unknown command {cmd!r}'
-                self.logger.error(retData)
-                return retData
+    async def set_dac_res(self, p1, p2):
+        self.dacList[int(p1 - 1)].htr_res = p2
+        return 'OK'
 
-            return retData
+    async def set_dac_current(self, p1, p2):
+        self.dacList[int(p1 - 1)].controlVar = float(p2)
+        return 'OK'
 
-        except Exception as e1:
-            retData = 'BAD,command failure: expected args float or int'
-            self.logger.error(f'{retData}')
-            return retData
+    async def set_dac_fp(self, p1, p2):
+        self.dacList[int(p1 - 1)].fixed_percent = float(p2)
+        return 'OK'
+
+    async def set_dac_setpoint(self, p1, p2):
+        self.dacList[int(p1 - 1)].setPoint = float(p2)
+        return 'OK'
+
+    async def set_dac_max_temp(self, p1, p2):
+        self.dacList[int(p1 - 1)].max_temp = float(p2)
+        return 'OK'
+
+    async def set_dac_min_temp(self, p1, p2):
+        self.dacList[int(p1 - 1)].min_temp = float(p2)
+        return 'OK'
+
+    async def set_dac_p(self, p1, p2):
+        self.dacList[int(p1 - 1)].kp = p2
+        return 'OK'
+
+    async def set_dac_i(self, p1, p2):
+        self.dacList[int(p1 - 1)].ki = p2
+        return 'OK'
+
+    async def set_dac_d(self, p1, p2):
+        self.dacList[int(p1 - 1)].kd = p2
+        return 'OK'
+
+    async def set_dac_pid_rate(self, p1, p2):
+        self.dacList[int(p1 - 1)].pid_rate = float(p2)
+        self.update_pid_period()
+        return 'OK'
+
+    async def set_dac_trip_clr(self, p1, p2):
+        self.interlock.clear(self.dacList[int(p1 - 1)])
+        return 'OK'
+
+    async def set_hipwr_lcs(self, p1, p2):
+        self.hi_pwr_htrs[int(p1)-1].sns_num = int(p2)
+        return 'OK'
+
+    async def set_hipwr_mode(self, p1, p2):
+        self.hi_pwr_htrs[int(p1)-1].mode = int(p2)
+        return 'OK'
+
+    async def set_hipwr_setpoint(self, p1, p2):
+        self.hi_pwr_htrs[int(p1 - 1)].setPoint = float(p2)
+        return 'OK'
+
+    async def set_hipwr_state(self, p1, p2):
+        if int(p2) == 0:
+            self.hi_pwr_htrs[int(p1)-1].power_off()
+            return 'OK'
+        elif int(p2) == 1:
+            htr = self.hi_pwr_htrs[int(p1)-1]
+            if not self.interlock.unless_tripped(htr, htr.power_on):
+                return f'BAD,command failure: interlock tripped ({self.interlock.reason(htr)}), clear it first'
+            return 'OK'
+        else:
+            return 'BAD, must be 0 or 1'
+
+    async def set_hipwr_hysteresis(self, p1, p2):
+        self.hi_pwr_htrs[int(p1 - 1)].hysteresis = float(p2)
+        return 'OK'
+
+    async def set_hipwr_max_temp(self, p1, p2):
+        self.hi_pwr_htrs[int(p1 - 1)].max_temp = float(p2)
+        return 'OK'
+
+    async def set_hipwr_min_temp(self, p1, p2):
+        self.hi_pwr_htrs[int(p1 - 1)].min_temp = float(p2)
+        return 'OK'
+
+    async def set_hipwr_trip_clr(self, p1, p2):
+        self.interlock.clear(self.hi_pwr_htrs[int(p1 - 1)])
+        return 'OK'
+
+    async def set_sns_type(self, p1, p2):
+        await self.spi0.run(self.adcList[int(p1 - 1)].set_sns_type, int(p2))
+        return 'OK'
+
+    async def set_sns_units(self, p1, p2):
+        sns = int(p1 - 1)
+        if p2 == 'K':
+            self.adcList[sns].set_sns_units(0)
+        elif p2 == 'C':
+            self.adcList[sns].set_sns_units(1)
+        elif p2 == 'F':
+            self.adcList[sns].set_sns_units(2)
+        else:
+            return 'BAD: Units must be K, C, F.'
+        return 'OK'
+
+    async def set_sns_cal(self, p1, p2):
+        sns = int(p1 - 1)
+        tmpCalData = p2.split(';')
+        calData = []
+
+        for point in tmpCalData:
+            newPt = point.split(' ')
+            newPt[0] = float(newPt[0])
+            newPt[1] = float(newPt[1])
+            calData.append(newPt)
+
+        self.adcList[sns].set_calibration(calData)
+        return 'OK'
+
+    async def set_sns_cal_coeffs(self, p1, p2):
+        calCoeffs = p2.split(';')
+        return self.adcList[int(p1 - 1)].set_calibration_coeffs(calCoeffs)
+
+    async def set_reset_adc(self, p1, p2):
+        return await self.adcList[int(p1 - 1)].reset(self.spi0)
+
+    async def set_adc_filt(self, p1, p2):
+        await self.spi0.run(self.adcList[int(p1 - 1)].set_filter_profile, int(p2))
+        self.update_sensor_period()
+        self.update_pid_period()
+        return 'OK'
+
+    async def set_subscribe(self, p1, p2):
+        # Handled by the TCP Server, which knows the connection
+        return 'BAD,command failure: subscribe must be sent on its own line'
+
+    async def set_unsubscribe(self, p1, p2):
+        return 'BAD,command failure: unsubscribe must be sent on its own line'
+
+    async def set_excit(self, p1, p2):
+        await self.spi0.run(self.adcList[int(p1 - 1)].set_excitation_current, p2)
+        return 'OK'
+
+    ### GET COMMANDS ###
+    # One handler per cmd_get_dict entry, named get_<command>. The
+    # telemetry reads are shared with the TCP Server's fast path.
+
+    async def get_cached(self, cmd, p1):
+        return tlm_get(self.tlmWriter.published, cmd, p1)
+
+    async def get_tlm(self, p1, p2):
+        data = await self.tlmWriter.snapshot()
+        try:
+            return 'OK,'+format_tlm(data, p1, p2)
+        except SnapshotError as e:
+            return f'BAD,command failure: {e}'
+
+    async def get_tlm_since(self, p1):
+        version, changed = self.tlmWriter.since(int(p1))
+        retData = f'OK,tlm_version={version}'
+        if changed:
+            retData += ','+','.join([f'{key}={val}' for key, val in changed.items()])
+        return retData
+
+    async def get_gpio_stats(self, p1):
+        return f'gpio_issued={self.io.issued},gpio_skipped={self.io.skipped}'
+
+    async def get_dac_stats(self, p1):
+        return ','.join(f'dac_issued_{dac.idx+1}={dac.issued},dac_skipped_{dac.idx+1}={dac.skipped},'
+                        f'dac_spi_{dac.idx+1}={dac.transactions}'
+                        for dac in self.dacList)
+
+    async def get_sw_rev(self, p1):
+        return 'BAD,command failure: sw_rev is not implemented'
+
+    async def get_eeprom(self, p1):
+        self.eeprom.printout_eeprom()
+        return 'printing eeprom memory map to logger.'
+
+    async def get_dac_lcs(self, p1):
+        sns_num = self.dacList[int(p1 - 1)].sns_num
+        return f'dac_lcs_{int(p1)}={sns_num!r}'
+
+    async def get_dac_mode(self, p1):
+        mode = self.dacList[int(p1 - 1)].mode
+        return f'dac_mode_{int(p1)}={mode!r}'
+
+    async def get_dac_res(self, p1):
+        dac_res = self.dacList[int(p1 - 1)].htr_res
+        return f'dac_res_{int(p1)}={dac_res!r}'
+
+    async def get_dac_setpoint(self, p1):
+        setpoint = self.dacList[int(p1 - 1)].setPoint
+        return f'dac_setpoint_{int(p1)}={setpoint!r}'
+
+    async def get_dac_max_temp(self, p1):
+        dac_max_temp = self.dacList[int(p1 - 1)].max_temp
+        return f'dac_max_temp_{int(p1)}={dac_max_temp!r}'
+
+    async def get_dac_min_temp(self, p1):
+        dac_min_temp = self.dacList[int(p1 - 1)].min_temp
+        return f'dac_min_temp_{int(p1)}={dac_min_temp!r}'
+
+    async def get_dac_p(self, p1):
+        pid_p = self.dacList[int(p1 - 1)].kp
+        return f'pid_p_{int(p1)}={pid_p!r}'
+
+    async def get_dac_i(self, p1):
+        pid_i = self.dacList[int(p1 - 1)].ki
+        return f'pid_i_{int(p1)}={pid_i!r}'
+
+    async def get_dac_d(self, p1):
+        pid_d = self.dacList[int(p1 - 1)].kd
+        return f'pid_d_{int(p1)}={pid_d!r}'
+
+    async def get_dac_pid_rate(self, p1):
+        pid_rate = self.dacList[int(p1 - 1)].pid_rate
+        return f'pid_rate_{int(p1)}={pid_rate!r}'
+
+    async def get_hipwr_lcs(self, p1):
+        sns_num = self.hi_pwr_htrs[int(p1 - 1)].sns_num
+        return f'hi_pwr_lcs_{int(p1)}={sns_num!r}'
+
+    async def get_hipwr_mode(self, p1):
+        mode = self.hi_pwr_htrs[int(p1)-1].mode
+        return f'hipwr_mode_{int(p1)}={mode!r}'
+
+    async def get_hipwr_setpoint(self, p1):
+        setpoint = self.hi_pwr_htrs[int(p1 - 1)].setPoint
+        return f'hipwr_setpoint_{int(p1)}={setpoint!r}'
+
+    async def get_hipwr_state(self, p1):
+        state = self.hi_pwr_htrs[int(p1-1)].status()
+        return f'hipwr_state_{int(p1)}={state!r}'
+
+    async def get_hipwr_hysteresis(self, p1):
+        hysteresis = self.hi_pwr_htrs[int(p1 - 1)].hysteresis
+        return f'hipwr_hysteresis_{int(p1)}={hysteresis!r}'
+
+    async def get_hipwr_max_temp(self, p1):
+        hipwr_max_temp = self.hi_pwr_htrs[int(p1 - 1)].max_temp
+        return f'hipwr_max_temp_{int(p1)}={hipwr_max_temp!r}'
+
+    async def get_hipwr_min_temp(self, p1):
+        hipwr_min_temp = self.hi_pwr_htrs[int(p1 - 1)].min_temp
+        return f'hipwr_min_temp_{int(p1)}={hipwr_min_temp!r}'
+
+    async def get_sns_type(self, p1):
+        sns_type = self.adcList[int(p1 - 1)].sns_type
+        return f'sns_type_{int(p1)}={sns_type}'
+
+    async def get_sns_units(self, p1):
+        sns_units = self.adcList[int(p1 - 1)].sns_units
+        if sns_units == 0:
+            units = 'K'
+        elif sns_units == 1:
+            units = 'C'
+        elif sns_units == 2:
+            units = 'F'
+        return f'sns_units_{int(p1)}={units}'
+
+    async def get_sns_cal_coeffs(self, p1):
+        calCoeffs = self.adcList[int(p1 - 1)].get_calibration_coeffs()
+        return f'sns_cal_coeffs{int(p1)}={calCoeffs}'
+
+    async def get_adc_filt(self, p1):
+        n = int(p1)
+        profile, name, period, settling, noise = self.adcList[n - 1].get_filter_profile()
+        return (f'adc_filt_{n}={profile},adc_filt_name_{n}={name},adc_period_ms_{n}={period*1000:.1f},'
+                f'adc_settle_ms_{n}={settling*1000:.1f},adc_noise_uv_{n}={noise}')
+
+    async def get_excit(self, p1):
+        excit = self.adcList[int(p1 - 1)].get_excitation_current()
+        return f'excit={excit}'
+
+    async def get_adc_verify(self, p1):
+        problems = await self.spi0.run(self.adcList[int(p1 - 1)].verify)
+        return f'adc_verify_{int(p1)}=' + ('|'.join(problems) or 'OK')
 
     async def board_id(self, id):
         self.tlm['id'] = id
@@ -740,4 +1042,4 @@ class CMDLoop:
         await self.qXmit.put(msg)
 
     def enqueue_udp(self, msg):
-        self.qUDP.put(msg)
\ No newline at end of file
+        self.qUDP.put_nowait(msg)
\ No newline at end of file
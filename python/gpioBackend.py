@@ -0,0 +1,220 @@
+# gpioBackend.py
+# 10/17/2026
+# Aidan Gray
+# aidan.gray@idg.jhu.edu
+#
+# GPIO output/input backends for the pins that are toggled per
+# transaction (SPI clock and data, chip selects). Pin direction and pull
+# ups are always set up through RPi.GPIO by GPIO_config, a backend only
+# reads and drives levels.
+#
+# 'rpigpio' calls RPi.GPIO.output/input. 'gpiomem' maps the GPIO register
+# block through /dev/gpiomem and stores bit masks straight into the
+# GPSET0/GPCLR0 registers, skipping RPi.GPIO's argument checks and
+# channel lookup. Any number of pins can be set (or cleared) with one
+# store. Only bank 0 (GPIO 0-31) is supported, which covers the board.
+#
+# 'gpiod' requests each group of select lines (ADC bank/chip select, DAC
+# slave address) from the GPIO character device as one bulk line request,
+# so a whole group changes with a single ioctl instead of one call per
+# line. Single pins stay on RPi.GPIO, an ioctl per SCLK edge would be
+# slower than what it replaces. It needs the libgpiod v1 bindings
+# (python3-libgpiod on Raspberry Pi OS bullseye).
+
+import functools
+import logging
+import mmap
+import RPi.GPIO as GPIO
+
+GPIO_BACKENDS = ('rpigpio', 'gpiomem', 'gpiod')
+
+GPIOMEM_PATH = '/dev/gpiomem'
+BLOCK_SIZE = 4096
+
+GPIOD_CHIP = 'gpiochip0'
+CONSUMER = 'smb'
+
+# BCM2835/BCM2711 GPIO register word offsets
+GPFSEL0 = 0x00 // 4
+GPSET0 = 0x1C // 4
+GPCLR0 = 0x28 // 4
+GPLEV0 = 0x34 // 4
+
+FSEL_INPUT = 0b000
+FSEL_OUTPUT = 0b001
+
+class GPIOBackendError(IOError):
+    pass
+
+def open_backend(name, device=None):
+    """
+    Input:
+    - name:   one of GPIO_BACKENDS
+    - device: register block to map for 'gpiomem', GPIO chip for 'gpiod'
+
+    Output:
+    - backend
+    """
+    if name == 'rpigpio':
+        return RPiGPIO()
+    elif name == 'gpiomem':
+        return Gpiomem(device or GPIOMEM_PATH)
+    elif name == 'gpiod':
+        return Gpiod(device or GPIOD_CHIP)
+    else:
+        raise GPIOBackendError(f'Invalid GPIO backend: {name!r}. Must be one of {GPIO_BACKENDS}')
+
+class GPIOBackend:
+    bulk = False  # True if a group has to be written as a whole
+
+    def group(self, pins, levels):
+        """
+        Lines that are always driven together, e.g. the ADC select lines.
+
+        Input:
+        - pins:   BCM pin numbers
+        - levels: levels the pins are already at
+
+        Output:
+        - function taking the new levels of pins
+        """
+        return functools.partial(self.output_many, tuple(pins))
+
+    def close(self):
+        pass
+
+class RPiGPIO(GPIOBackend):
+    def __init__(self):
+        self.name = 'rpigpio'
+        self.output = GPIO.output
+        self.input = GPIO.input
+
+    def output_many(self, pins, levels):
+        """
+        Input:
+        - pins:   BCM pin numbers
+        - levels: 0/1 for each pin, written in order
+        """
+        output = self.output
+        for pin, level in zip(pins, levels):
+            output(pin, level)
+
+class Gpiomem(GPIOBackend):
+    def __init__(self, path=GPIOMEM_PATH):
+        """
+        Input:
+        - path: /dev/gpiomem, or any file of at least BLOCK_SIZE bytes
+                that stands in for the register block
+        """
+        self.logger = logging.getLogger('smb')
+        self.name = 'gpiomem'
+
+        try:
+            with open(path, 'r+b') as f:
+                self.mem = mmap.mmap(f.fileno(), BLOCK_SIZE)
+        except (OSError, ValueError) as e:
+            raise GPIOBackendError(f'Failed to map {path}: {e}')
+
+        # 32 bit registers, the Pi is little endian like every host this
+        # is tested on, so the native format is fine
+        self.regs = memoryview(self.mem).cast('I')
+
+    def output(self, pin, level):
+        self.regs[GPSET0 if level else GPCLR0] = 1 << pin
+
+    def input(self, pin):
+        return (self.regs[GPLEV0] >> pin) & 1
+
+    def output_many(self, pins, levels):
+        """
+        Drive several pins with at most two stores, the pins going low
+        first.
+
+        Input:
+        - pins:   BCM pin numbers
+        - levels: 0/1 for each pin
+        """
+        setMask = 0
+        clrMask = 0
+        for pin, level in zip(pins, levels):
+            if level:
+                setMask |= 1 << pin
+            else:
+                clrMask |= 1 << pin
+
+        if clrMask:
+            self.regs[GPCLR0] = clrMask
+        if setMask:
+            self.regs[GPSET0] = setMask
+
+    def function(self, pin):
+        """
+        Output:
+        - the pin's 3 bit function select (FSEL_INPUT, FSEL_OUTPUT, ALTn)
+        """
+        return (self.regs[GPFSEL0 + pin // 10] >> ((pin % 10) * 3)) & 0b111
+
+    def check(self, outputs=(), inputs=()):
+        """
+        Make sure the pins were set up as expected before driving them
+        through the registers.
+        """
+        for pins, fsel, kind in ((outputs, FSEL_OUTPUT, 'output'), (inputs, FSEL_INPUT, 'input')):
+            for pin in pins:
+                if pin > 31:
+                    raise GPIOBackendError(f'GPIO{pin} is not in bank 0')
+                if self.function(pin) != fsel:
+                    raise GPIOBackendError(f'GPIO{pin} is not configured as an {kind}')
+
+    def close(self):
+        self.regs.release()
+        self.mem.close()
+
+class Gpiod(RPiGPIO):
+    bulk = True
+
+    def __init__(self, chip=GPIOD_CHIP):
+        """
+        Input:
+        - chip: GPIO chip name or path
+        """
+        try:
+            import gpiod
+        except ImportError:
+            raise GPIOBackendError('The gpiod backend needs the libgpiod Python bindings (apt install python3-libgpiod).')
+
+        if not hasattr(gpiod, 'LINE_REQ_DIR_OUT'):
+            raise GPIOBackendError('The gpiod backend needs the libgpiod v1 Python bindings.')
+
+        super().__init__()
+        self.logger = logging.getLogger('smb')
+        self.name = 'gpiod'
+        self.gpiod = gpiod
+        self.requests = []
+
+        try:
+            self.chip = gpiod.Chip(chip)
+        except OSError as e:
+            raise GPIOBackendError(f'Failed to open {chip}: {e}')
+
+    def group(self, pins, levels):
+        lines = self.chip.get_lines(list(pins))
+
+        try:
+            lines.request(consumer=CONSUMER, type=self.gpiod.LINE_REQ_DIR_OUT, default_vals=list(levels))
+        except OSError as e:
+            raise GPIOBackendError(f'Failed to request GPIO lines {tuple(pins)}: {e}')
+
+        self.requests.append(lines)
+        setValues = lines.set_values
+
+        def set_levels(levels):
+            setValues(list(levels))
+
+        return set_levels
+
+    def close(self):
+        for lines in self.requests:
+            lines.release()
+        self.requests.clear()
+        self.chip.close()
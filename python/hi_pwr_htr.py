@@ -35,7 +35,7 @@ class hi_pwr_htr():
             self.hi_pwr_en_pin = self.io.pin_map['HI_PWR_EN2']
         
         GPIO.setup(self.hi_pwr_en_pin, GPIO.OUT)
-        GPIO.output(self.hi_pwr_en_pin, 0)
+        self.io.output(self.hi_pwr_en_pin, 0)
 
         # Heater Parameters
         self.__set_mode(self.hi_pwr_htr_reg_dict['MODE'][0])  # 0=Disabled, 1=Enabled, 2=HYSTERESIS
@@ -55,10 +55,10 @@ class hi_pwr_htr():
         return f
 
     def power_on(self):
-        GPIO.output(self.hi_pwr_en_pin, 1)
+        self.io.output(self.hi_pwr_en_pin, 1)
 
-    def power_off(self):
-        GPIO.output(self.hi_pwr_en_pin, 0)
+    def power_off(self, force=False):
+        self.io.output(self.hi_pwr_en_pin, 0, force=force)
 
     def status(self):
         status = GPIO.input(self.hi_pwr_en_pin)
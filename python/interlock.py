@@ -0,0 +1,267 @@
+# interlock.py
+# 10/17/2026
+# Aidan Gray
+# aidan.gray@idg.jhu.edu
+#
+# Over-temperature interlock for the DAC and hi-power heaters. It runs on
+# its own thread, not on the asyncio loop, so a slow command or sensor
+# scan cannot hold it up. Every period it re-reads only the control
+# sensors of the enabled heaters and checks them against the heater's
+# min/max temperature and, if set, a maximum rate of rise. The period is
+# stretched to the slowest of those sensors' sample interval, since a
+# reading any sooner would only repeat the last sample.
+#
+# A trip cuts the heater (DAC code 0 and LDAC on the SPI1 thread, enable
+# pin low for a hi-power heater) and latches: the heater stays off until
+# the trip is cleared by command. The reason is written to the
+# 'dac_trip_N'/'hipwr_trip_N' telemetry fields, '' while not tripped.
+#
+# Sensor reads go through the SPI0 queue, so a read can wait behind one
+# other bus request. If no reading arrives within the timeout the
+# heaters are cut as well, which bounds the latency to period + timeout.
+
+import concurrent.futures
+import logging
+import threading
+import time
+from collections import deque
+from pidEngine import to_kelvin
+from DAC8775 import latch
+
+RATE_WINDOW = 1.0  # seconds of readings the rate of rise is taken over
+
+class InterlockError(ValueError):
+    pass
+
+class Interlock:
+    def __init__(self, io, dacList, hi_pwr_htrs, adcList, spi0, spi1, tlm, period=0.1, maxRate=0.0, timeout=1.0):
+        """
+        Input:
+        - spi0/spi1: BusWorkers of the ADC and DAC buses
+        - period:    seconds between checks
+        - maxRate:   largest rate of rise, K/s. 0 disables the check.
+        - timeout:   seconds to wait for a sensor reading before cutting
+        """
+        if period <= 0 or timeout <= 0:
+            raise InterlockError(f'Invalid interlock period/timeout: {period!r}/{timeout!r}. Must be > 0.')
+        if maxRate < 0:
+            raise InterlockError(f'Invalid rate of rise limit: {maxRate!r}. Must be >= 0.')
+
+        self.logger = logging.getLogger('smb')
+        self.io = io
+        self.adcList = adcList
+        self.spi0 = spi0
+        self.spi1 = spi1
+        self.tlm = tlm
+        self.period = period
+        self.checkPeriod = period  # period stretched for the sensor filters
+        self.maxRate = maxRate
+        self.timeout = timeout
+
+        self.dacList = dacList
+        self.heaters = [(f'dac_trip_{dac.idx+1}', dac) for dac in dacList]
+        self.heaters += [(f'hipwr_trip_{htr.idx+1}', htr) for htr in hi_pwr_htrs]
+        for key, htr in self.heaters:
+            self.tlm[key] = ''
+
+        self.lock = threading.Lock()
+        self.trips = {}         # heater -> reason
+        self.history = {}       # sensor number -> deque of (time, K)
+        self.pending = None     # sensor read waiting on SPI0
+        self.submitted = 0.0
+        self.cutting = None     # DAC cut waiting on SPI1
+        self.stopEvent = threading.Event()
+        self.thread = threading.Thread(target=self.__run, name='interlock', daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stopEvent.set()
+        self.thread.join()
+
+    def is_tripped(self, htr):
+        return htr in self.trips
+
+    def reason(self, htr):
+        return self.trips.get(htr, '')
+
+    def unless_tripped(self, htr, func, *args):
+        """
+        Call func(*args) if htr is not tripped. A trip cannot be recorded
+        while func runs, so a heater is never switched on after its trip.
+
+        Output:
+        - True if func was called
+        """
+        with self.lock:
+            if htr in self.trips:
+                return False
+            func(*args)
+            return True
+
+    def clear(self, htr):
+        """
+        Release a tripped heater. If the fault is still there it trips
+        again on the next check.
+        """
+        with self.lock:
+            self.trips.pop(htr, None)
+            for key, heater in self.heaters:
+                if heater is htr:
+                    self.tlm[key] = ''
+
+    def enabled(self, htr):
+        if htr in self.dacList:
+            return htr.mode != 0 and htr.sns_num != 0 and htr.htr_res != 0
+        return htr.mode != 0 and htr.sns_num != 0
+
+    def __run(self):
+        nextTime = time.perf_counter()
+
+        while True:
+            try:
+                self.check()
+            except Exception as e:
+                self.logger.error(f'interlock check failed: {e!r}')
+                for key, htr in self.heaters:
+                    if self.enabled(htr):
+                        self.trip(key, htr, 'interlock error')
+
+            nextTime += self.checkPeriod
+            delay = nextTime - time.perf_counter()
+            if delay < 0:
+                nextTime = time.perf_counter()
+                delay = 0
+
+            if self.stopEvent.wait(delay):
+                return
+
+    def check(self):
+        # Tripped heaters are cut again every check, in case the heater
+        # task switched one back on before it saw the trip
+        with self.lock:
+            tripped = list(self.trips)
+        self.cut(tripped)
+
+        watched = [(key, htr) for key, htr in self.heaters if self.enabled(htr) and htr not in self.trips]
+        if not watched:
+            self.history.clear()
+            self.update_period([])
+            return
+
+        sensors = sorted({htr.sns_num for key, htr in watched})
+        self.update_period(sensors)
+
+        if self.pending is None:
+            self.pending = self.spi0.submit(self.read_sensors, sensors)
+            self.submitted = time.perf_counter()
+
+        try:
+            temps = self.pending.result(timeout=self.checkPeriod)
+        except concurrent.futures.TimeoutError:
+            # Still queued behind another SPI0 request
+            if time.perf_counter() - self.submitted > self.timeout:
+                for key, htr in watched:
+                    self.trip(key, htr, 'no sensor reading')
+            return
+        finally:
+            if self.pending.done():
+                self.pending = None
+
+        now = time.perf_counter()
+        for sns in list(self.history):
+            if sns not in temps:
+                self.history.pop(sns)
+
+        rates = {}
+        for sns, temp in temps.items():
+            if temp == -999:
+                self.history.pop(sns, None)
+                continue
+
+            history = self.history.setdefault(sns, deque())
+            history.append((now, to_kelvin(temp, self.adcList[sns-1].sns_units)))
+            while len(history) > 2 and now - history[1][0] >= RATE_WINDOW:
+                history.popleft()
+
+            (t0, k0), (t1, k1) = history[0], history[-1]
+            if t1 > t0:
+                rates[sns] = (k1 - k0) / (t1 - t0)
+
+        for key, htr in watched:
+            if htr.sns_num not in temps:
+                # Enabled, cleared or moved to another sensor after the
+                # read was queued, it is checked on the next one
+                continue
+
+            temp = temps[htr.sns_num]
+            rate = rates.get(htr.sns_num, 0.0)
+
+            if temp == -999:
+                self.trip(key, htr, 'sensor error')
+            elif temp >= htr.max_temp:
+                self.trip(key, htr, f'max_temp {temp:.3f}')
+            elif temp <= htr.min_temp:
+                self.trip(key, htr, f'min_temp {temp:.3f}')
+            elif self.maxRate > 0 and rate > self.maxRate:
+                self.trip(key, htr, f'rise {rate:.3f}K/s')
+
+    def update_period(self, sensors):
+        """
+        Stretch the check period to the slowest sample_interval() of the
+        watched sensors, and shrink it back to the requested period when
+        they are faster.
+
+        Input:
+        - sensors: sensor numbers (1-12)
+        """
+        period = max([self.period] + [self.adcList[sns-1].sample_interval() for sns in sensors])
+        if period != self.checkPeriod:
+            if period > self.period:
+                self.logger.info(f'interlock period stretched to {period:.3f}s for the ADC filters')
+            self.checkPeriod = period
+
+    def read_sensors(self, sensors):
+        """
+        Runs on the SPI0 thread.
+
+        Input:
+        - sensors: sensor numbers (1-12)
+
+        Output:
+        - {sensor number: temperature}
+        """
+        return {sns: round(self.adcList[sns-1].get_temperature(), 3) for sns in sensors}
+
+    def trip(self, key, htr, reason):
+        with self.lock:
+            if htr in self.trips:
+                return
+            self.trips[htr] = reason
+            self.tlm[key] = reason
+
+        self.cut([htr])
+        self.logger.warning(f'interlock tripped {key}: {reason}')
+
+    def cut(self, heaters):
+        for htr in heaters:
+            if htr not in self.dacList:
+                # Always written, the pin shadow may not match the pin
+                htr.power_off(force=True)
+
+        # A cut still waiting in the SPI1 queue will pick these up when
+        # it runs, so only one is queued at a time
+        queued = self.cutting is not None and not (self.cutting.running() or self.cutting.done())
+        if not queued and any([htr in self.dacList for htr in heaters]):
+            self.cutting = self.spi1.submit(self.cut_dacs)
+
+    def cut_dacs(self):
+        """
+        Runs on the SPI1 thread. Zero every tripped DAC and latch them.
+        """
+        with self.lock:
+            dacs = [htr for htr in self.trips if htr in self.dacList]
+
+        if any([dac.write_control_var(0, load=False) for dac in dacs]):
+            latch(self.io, self.dacList)
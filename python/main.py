@@ -11,39 +11,57 @@ import sys
 import asyncio
 import argparse
 import shlex
+import multiprocessing
 import netifaces
 
 import GPIO_config
+from spiBus import SPI_TRANSPORTS
+from gpioBackend import GPIO_BACKENDS
 import Gbl
 from EEPROM import EEPROM
 from DAC8775 import DAC
 from TCPip import TCPServer
-from cmdHandler import CMDLoop
-from transmitter import Transmitter
+from cmdHandler import CMDLoop, SCAN_MODES
+from transmitter import Transmitter, SLOW_CLIENT_POLICIES
 from BME280 import BME280
 from ADS1015 import ADS1015
 from pid_htr import pid_htr
 from hi_pwr_htr import hi_pwr_htr
-from AD7124 import AD7124
+from AD7124 import AD7124, CONVERSION_MODES
 from UDPcast import UDPcast
+from shmIPC import TelemetryBlock, CmdRing, HardwareBridge, NetworkBridge
+from tlmSnapshot import TelemetryDict
 
 def custom_except_hook(loop, context):
     if repr(context['exception']) == 'SystemExit()':
         print('Exiting Program...')
 
-async def runSMB(opts):
+def start_logging(opts):
     logging.basicConfig(datefmt = "%Y-%m-%d %H:%M:%S",
                         format = "%(asctime)s.%(msecs)03dZ %(name)-10s %(levelno)s %(filename)s:%(lineno)d %(message)s")
     
     logger = logging.getLogger('smb')
     logger.setLevel(opts.logLevel)
     logger.info('starting logging')
+    return logger
 
+def get_addresses(logger):
+    ip_address = netifaces.ifaddresses('eth0')[netifaces.AF_INET][0]['addr']
+    udp_address = netifaces.ifaddresses('eth0')[netifaces.AF_INET][0]['broadcast']
+    logger.info(f'IP:  {ip_address}')
+    logger.info(f'UDP: {udp_address}')
+    return ip_address, udp_address
+
+def setup_hardware(opts, tlm, published, qCmd, qXmit):
+    """
+    Bring up the EEPROM, GPIO, sensors and heaters and return the Command
+    Handler that owns them. The drivers write tlm, the Command Handler
+    publishes it to published for the readers.
+    """
     eeprom = EEPROM(reset=False)  # Read in EEPROM data
 
-    tlm = Gbl.telemetry  # Telemetry dictionary
     cal = Gbl.sensor_cal # Sensor Calibration dictionary
-    io = GPIO_config.io()  # GPIO pin configuration
+    io = GPIO_config.io(spi=opts.spi, gpio=opts.gpio)  # GPIO pin configuration
 
     tlm['id'] = int.from_bytes(eeprom.BoardIDmem, byteorder='big')
 
@@ -58,22 +76,106 @@ async def runSMB(opts):
     for i in range(2):
         dacList.append(DAC(i, io, eeprom, tlm))
 
+    # A synchronized scan reads whatever the ADCs converted after the SYNC
+    # pulse, which needs continuous conversion
+    adcMode = 'continuous' if opts.scanMode == 'sync' else opts.adcMode
+
     adcList = []
     for i in range(12):
-        adcList.append(AD7124(i, io, eeprom, tlm, cal))
-    
-    ip_address = netifaces.ifaddresses('eth0')[netifaces.AF_INET][0]['addr']
-    udp_address = netifaces.ifaddresses('eth0')[netifaces.AF_INET][0]['broadcast']
-    logger.info(f'IP:  {ip_address}')
-    logger.info(f'UDP: {udp_address}')
+        adcList.append(AD7124(i, io, eeprom, tlm, cal, convMode=adcMode))
+
+    cmdHandler = CMDLoop(qCmd, qXmit, eeprom, tlm, cal, io, bme280, ads1015, hi_pwr_htrs, dacList, adcList,
+                         sensorPeriod=opts.sensorPeriod, heaterPeriod=opts.heaterPeriod,
+                         envPeriod=opts.envPeriod, currentPeriod=opts.currentPeriod, scanMode=opts.scanMode,
+                         interlockPeriod=opts.interlockPeriod, maxRiseRate=opts.maxRiseRate,
+                         interlockTimeout=opts.interlockTimeout, published=published)
+    return cmdHandler
+
+async def runSMB(opts):
+    logger = start_logging(opts)
+
+    tlm = TelemetryDict(Gbl.telemetry)  # written by the drivers
+    published = Gbl.telemetry           # Telemetry dictionary the readers use
+    ip_address, udp_address = get_addresses(logger)
 
-    tcpServer = TCPServer(ip_address, 1024)
-    cmdHandler = CMDLoop(tcpServer.qCmd, tcpServer.qXmit, eeprom, tlm, cal, io, bme280, ads1015, hi_pwr_htrs, dacList, adcList)
-    transmitter = Transmitter(tcpServer.qXmit)
+    tcpServer = TCPServer(ip_address, 1024, published, opts.maxCmds)
+    cmdHandler = setup_hardware(opts, tlm, published, tcpServer.qCmd, tcpServer.qXmit)
+    transmitter = Transmitter(tcpServer.qXmit, opts.maxPending, opts.slowClient)
     udpServer = UDPcast(udp_address, 8888, cmdHandler.qUDP)
 
     await asyncio.gather(tcpServer.start(), cmdHandler.start(), transmitter.start(), udpServer.start())
 
+async def runHardware(opts, tlm, rings):
+    """
+    Hardware process for --split: GPIO, ADCs, DACs, heaters and the
+    control loop. Telemetry is published into shared memory.
+    """
+    start_logging(opts)
+
+    qCmd = asyncio.Queue()
+    qXmit = asyncio.Queue()
+    cmdHandler = setup_hardware(opts, TelemetryDict(Gbl.telemetry), tlm, qCmd, qXmit)
+    bridge = HardwareBridge(*rings, qCmd, qXmit, cmdHandler.qUDP)
+
+    await asyncio.gather(cmdHandler.start(), bridge.start())
+
+async def runNetwork(opts, tlm, rings, hwProc):
+    """
+    Network process for --split: TCP Server, Transmitter and UDP broadcast.
+    """
+    logger = start_logging(opts)
+    ip_address, udp_address = get_addresses(logger)
+
+    tcpServer = TCPServer(ip_address, 1024, tlm, opts.maxCmds)
+    transmitter = Transmitter(tcpServer.qXmit, opts.maxPending, opts.slowClient)
+    qUDP = asyncio.Queue()
+    udpServer = UDPcast(udp_address, 8888, qUDP)
+    bridge = NetworkBridge(*rings, tcpServer.qCmd, tcpServer.qXmit, qUDP)
+
+    async def watch_hardware():
+        while hwProc.is_alive():
+            await asyncio.sleep(0.5)
+        logger.error(f'hardware process exited with code {hwProc.exitcode}')
+        raise SystemExit()
+
+    await asyncio.gather(tcpServer.start(), transmitter.start(), udpServer.start(), bridge.start(), watch_hardware())
+
+def hardware_main(opts, tlm, rings):
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    loop.set_exception_handler(custom_except_hook)
+    try:
+        loop.run_until_complete(runHardware(opts, tlm, rings))
+    except KeyboardInterrupt:
+        pass
+
+def split_main(opts):
+    # fork so the child inherits the shared memory mappings directly
+    ctx = multiprocessing.get_context('fork')
+
+    tlm = TelemetryBlock(Gbl.telemetry, create=True)
+    rings = (CmdRing(create=True),                  # commands: network -> hardware
+             CmdRing(slotSize=16384, create=True),  # responses: hardware -> network
+             CmdRing(slots=256, create=True))       # UDP messages: hardware -> network
+
+    hwProc = ctx.Process(target=hardware_main, args=(opts, tlm, rings), name='smb-hardware', daemon=True)
+    hwProc.start()
+
+    loop = asyncio.get_event_loop()
+    loop.set_exception_handler(custom_except_hook)
+    try:
+        loop.run_until_complete(runNetwork(opts, tlm, rings, hwProc))
+    except KeyboardInterrupt:
+        print('Exiting Program...')
+    finally:
+        if hwProc.is_alive():
+            hwProc.terminate()  # SIGTERM lets the hardware process clean up its GPIO
+            hwProc.join(5)
+
+        for shm in (tlm,) + rings:
+            shm.close()
+            shm.unlink()
+
 def main(argv=None):
     if argv is None:
         argv = sys.argv[1:]
@@ -85,8 +187,42 @@ def main(argv=None):
                         help='logging threshold. 10=debug, 20=info, 30=warn')
     parser.add_argument('--sensorPeriod', type=float, default=1.0,
                         help='how often to sample the sensors')
+    parser.add_argument('--heaterPeriod', type=float, default=None,
+                        help='how often to update the heaters (default: sensorPeriod)')
+    parser.add_argument('--envPeriod', type=float, default=1.0,
+                        help='how often to read the BME280 environment sensor')
+    parser.add_argument('--currentPeriod', type=float, default=0.1,
+                        help='how often to sample the hi-power heater currents')
+    parser.add_argument('--interlockPeriod', type=float, default=0.1,
+                        help='how often the interlock re-reads the heater control sensors, '
+                             'stretched to the sample interval of their ADC filters')
+    parser.add_argument('--maxRiseRate', type=float, default=0.0,
+                        help='trip a heater whose control sensor rises faster than this (K/s, 0=off)')
+    parser.add_argument('--interlockTimeout', type=float, default=1.0,
+                        help='trip the heaters if the interlock gets no sensor reading for this long (s)')
+    parser.add_argument('--maxCmds', type=int, default=64,
+                        help='commands waiting for the Command Handler before the server stops reading from clients')
+    parser.add_argument('--maxPending', type=int, default=256,
+                        help='responses waiting to be sent to one client before it counts as too slow')
+    parser.add_argument('--slowClient', type=str, default='drop', choices=SLOW_CLIENT_POLICIES,
+                        help='what to do with a client that falls behind: drop its oldest messages, or disconnect it')
+    parser.add_argument('--spi', type=str, default='bitbang', choices=SPI_TRANSPORTS,
+                        help='move ADC/DAC bytes by bit-banging the GPIO pins or with the hardware SPI controllers')
+    parser.add_argument('--gpio', type=str, default='rpigpio', choices=GPIO_BACKENDS,
+                        help='drive the SPI and chip select pins through RPi.GPIO, straight through the /dev/gpiomem registers, '
+                             'or with the select line groups as libgpiod bulk line requests')
+    parser.add_argument('--adcMode', type=str, default='single', choices=CONVERSION_MODES,
+                        help='restart a single conversion after every ADC read, or let the ADCs convert continuously')
+    parser.add_argument('--scanMode', type=str, default='sequential', choices=SCAN_MODES,
+                        help='read the ADCs one conversion after another, or start all 12 together with nADC_SYNC (implies --adcMode continuous)')
+    parser.add_argument('--split', action='store_true',
+                        help='run the hardware/control loop and the network servers in separate processes')
 
     opts = parser.parse_args(argv)
+    if opts.split:
+        split_main(opts)
+        return
+
     loop = asyncio.get_event_loop()
     loop.set_exception_handler(custom_except_hook)
     try:
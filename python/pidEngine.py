@@ -0,0 +1,160 @@
+# pidEngine.py
+# 10/17/2026
+# Aidan Gray
+# aidan.gray@idg.jhu.edu
+#
+# PID loops for the DAC heaters. Every loop is a slot in a set of numpy
+# arrays and the loops that are due are stepped together. Each loop has
+# its own period and uses the time that really passed since its last
+# step, measured with time.perf_counter.
+#
+# Output is heater power in mW and the process variable is in K, so the
+# gains keep the units of the old DAC8775.pid_update. The integral term
+# is stored already multiplied by ki, so changing ki does not bump the
+# output. Anti-windup is by conditional integration: while the output is
+# saturated, errors that would push it further are not integrated. The
+# derivative acts on the measurement, so setpoint changes do not kick.
+
+import time
+import numpy as np
+
+class PIDEngineError(ValueError):
+    pass
+
+def to_kelvin(value, units):
+    """
+    Input:
+    - value: temperature
+    - units: 0=K, 1=C, 2=F
+
+    Output:
+    - temperature in K
+    """
+    if units == 0:
+        return value
+    elif units == 1:
+        return value + 273.15
+    elif units == 2:
+        return ((value - 32) * (5 / 9)) + 273.15
+    else:
+        raise PIDEngineError(f'Invalid units: {units!r}. Must be 0=K, 1=C, 2=F.')
+
+class PIDEngine:
+    def __init__(self, n):
+        """
+        Input:
+        - n: number of loops
+        """
+        self.kp = np.zeros(n)
+        self.ki = np.zeros(n)
+        self.kd = np.zeros(n)
+        self.setpoint = np.zeros(n)       # K
+        self.outMax = np.zeros(n)         # mW
+        self.period = np.zeros(n)         # s
+        self.integral = np.zeros(n)       # mW
+        self.output = np.zeros(n)         # mW
+        self.prevPv = np.zeros(n)
+        self.lastTime = np.zeros(n)
+        self.active = np.zeros(n, dtype=bool)
+
+    def __len__(self):
+        return len(self.active)
+
+    def configure(self, i, kp, ki, kd, setpoint, outMax, period):
+        """
+        Set the gains and limits of a loop. They can change while it runs.
+
+        Input:
+        - i:        loop index
+        - kp/ki/kd: gains (mW/K, mW/K/s, mW*s/K)
+        - setpoint: K
+        - outMax:   largest output, mW
+        - period:   seconds between steps
+        """
+        if period <= 0:
+            raise PIDEngineError(f'Invalid period for loop {i}: {period!r}. Must be > 0.')
+
+        self.kp[i] = kp
+        self.ki[i] = ki
+        self.kd[i] = kd
+        self.setpoint[i] = setpoint
+        self.outMax[i] = outMax
+        self.period[i] = period
+
+    def start(self, i, pv, output, now=None):
+        """
+        Start a loop from whatever the heater is doing, so the first step
+        carries on from output instead of jumping (bumpless transfer).
+
+        Input:
+        - i:      loop index
+        - pv:     current process variable, K
+        - output: current heater power, mW
+        """
+        if now is None:
+            now = time.perf_counter()
+
+        output = min(max(output, 0.0), self.outMax[i])
+        self.integral[i] = output - self.kp[i] * (self.setpoint[i] - pv)
+        self.output[i] = output
+        self.prevPv[i] = pv
+        self.lastTime[i] = now
+        self.active[i] = True
+
+    def stop(self, i):
+        self.active[i] = False
+
+    def due(self, now=None, slack=0.0):
+        """
+        Input:
+        - slack: how early a step may be taken, e.g. half the period of
+                 the caller's own schedule
+
+        Output:
+        - boolean mask of the running loops whose period has passed
+        """
+        if now is None:
+            now = time.perf_counter()
+        return self.active & (now - self.lastTime >= self.period - slack)
+
+    def step(self, pv, mask, now=None):
+        """
+        Step the loops in mask together.
+
+        Input:
+        - pv:   process variable of every loop, K (only masked ones are used)
+        - mask: boolean mask of the loops to step, e.g. from due()
+
+        Output:
+        - output of every loop, mW
+        """
+        if now is None:
+            now = time.perf_counter()
+
+        mask = np.asarray(mask, dtype=bool) & self.active
+        if not mask.any():
+            return self.output
+
+        pv = np.where(mask, np.asarray(pv, dtype=float), self.prevPv)
+        dt = np.where(mask, now - self.lastTime, 0.0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            dPv = np.where(dt > 0, (pv - self.prevPv) / dt, 0.0)
+
+        error = self.setpoint - pv
+        pTerm = self.kp * error
+        dTerm = -self.kd * dPv
+        integral = self.integral + self.ki * error * dt
+
+        # Hold the integral where integrating would drive a saturated
+        # output further into saturation
+        trial = pTerm + integral + dTerm
+        windup = ((trial > self.outMax) & (error > 0)) | ((trial < 0) & (error < 0))
+        integral = np.where(windup, self.integral, integral)
+
+        output = np.clip(pTerm + integral + dTerm, 0.0, self.outMax)
+
+        self.integral = np.where(mask, integral, self.integral)
+        self.output = np.where(mask, output, self.output)
+        self.prevPv = pv
+        self.lastTime = np.where(mask, now, self.lastTime)
+        return self.output
@@ -0,0 +1,73 @@
+# scheduler.py
+# 10/17/2026
+# Aidan Gray
+# aidan.gray@idg.jhu.edu
+#
+# Periodic task scheduler. Each job is a plain function or coroutine
+# function that is called once per period. Jobs are scheduled against
+# absolute deadlines so they do not drift, and the loop sleeps between
+# deadlines instead of polling.
+
+import asyncio
+import inspect
+import logging
+import time
+
+class SchedulerError(ValueError):
+    pass
+
+class Scheduler:
+    def __init__(self):
+        self.logger = logging.getLogger('smb')
+        self.jobs = {}
+
+    def add(self, name, period, func):
+        """
+        Register a periodic job.
+
+        Input:
+        - name:   str
+        - period: float (seconds)
+        - func:   callable or coroutine function
+        """
+        if name in self.jobs:
+            raise SchedulerError(f'Job {name!r} already exists.')
+
+        self.jobs[name] = [None, func]
+        self.set_period(name, period)
+
+    def set_period(self, name, period):
+        if period is None or period <= 0:
+            raise SchedulerError(f'Invalid period for {name!r}: {period!r}. Must be > 0.')
+        self.jobs[name][0] = float(period)
+
+    def get_period(self, name):
+        return self.jobs[name][0]
+
+    async def start(self):
+        await asyncio.gather(*[self.__run(name) for name in self.jobs])
+
+    async def __run(self, name):
+        nextTime = time.perf_counter()
+
+        while True:
+            func = self.jobs[name][1]
+
+            try:
+                ret = func()
+                if inspect.isawaitable(ret):
+                    await ret
+
+            except Exception as e:
+                self.logger.error(f'{name} task failed: {e!r}')
+
+            # Period is re-read every cycle so it can be changed at run time
+            nextTime += self.jobs[name][0]
+            delay = nextTime - time.perf_counter()
+
+            if delay < 0:
+                # Overran the period, skip the missed deadlines
+                nextTime = time.perf_counter()
+                delay = 0
+
+            await asyncio.sleep(delay)
@@ -0,0 +1,288 @@
+# shmIPC.py
+# 10/17/2026
+# Aidan Gray
+# aidan.gray@idg.jhu.edu
+#
+# Shared memory plumbing for running the board as two processes: one that
+# owns the GPIO, ADCs, DACs, heaters and control loop, and one that runs
+# the TCP server, transmitter and UDP broadcast.
+#
+# TelemetryBlock is a fixed layout shared memory copy of Gbl.telemetry
+# that behaves like the dictionary. The hardware process publishes its
+# telemetry into it (see tlmSnapshot.py). CmdRing is a lock-free
+# single-producer/single-consumer ring buffer. The producer only ever
+# writes the head index and the consumer only ever writes the tail index,
+# each with one aligned 32-bit store after the slot is filled in or
+# copied out. Neither end ever waits on the other, so a process that dies
+# cannot hang the one left running.
+#
+# Python has no memory fence, and on ARM the consumer could see a new
+# head before the slot it covers. Each slot therefore carries the ring
+# position it was written for and a CRC32 of its payload. A slot whose
+# header or payload does not match yet is treated as not there and read
+# again on the next poll. The consumer only hands a slot back once the
+# check has passed, so its reads are done before the producer can reuse
+# it.
+
+import asyncio
+import logging
+import struct
+import zlib
+from collections.abc import MutableMapping
+from multiprocessing import shared_memory
+
+STR_LEN = 32        # bytes reserved for each string telemetry value
+POLL_MIN = 0.001    # seconds between ring polls while busy
+POLL_MAX = 0.020    # seconds between ring polls while idle
+MSG_HDR = struct.Struct('<IIII')  # ring position, connection id, payload length, CRC32
+
+class IPCError(IOError):
+    pass
+
+class TelemetryBlock(MutableMapping):
+    """
+    Shared memory telemetry laid out like the template dictionary. The type
+    of each slot comes from the template's default value: int -> int64,
+    float -> float64, str -> STR_LEN bytes.
+    """
+    def __init__(self, template, name=None, create=False):
+        self.layout = {}
+        offset = 0
+
+        for key, val in template.items():
+            if isinstance(val, bool) or isinstance(val, int):
+                fmt = struct.Struct('<q')
+            elif isinstance(val, float):
+                fmt = struct.Struct('<d')
+            elif isinstance(val, str):
+                fmt = struct.Struct(f'<{STR_LEN}s')
+            else:
+                raise IPCError(f'Unsupported telemetry type for {key!r}: {type(val)}')
+
+            self.layout[key] = (offset, fmt)
+            offset += fmt.size
+
+        self.size = offset
+        self.shm = shared_memory.SharedMemory(name=name, create=create, size=self.size)
+        self.name = self.shm.name
+
+        if create:
+            for key, val in template.items():
+                self[key] = val
+
+    def __getitem__(self, key):
+        offset, fmt = self.layout[key]
+        val = fmt.unpack_from(self.shm.buf, offset)[0]
+        if isinstance(val, bytes):
+            val = val.rstrip(b'\x00').decode()
+        return val
+
+    def __setitem__(self, key, val):
+        offset, fmt = self.layout[key]
+        if isinstance(val, str):
+            val = val.encode()[:STR_LEN]
+        fmt.pack_into(self.shm.buf, offset, val)
+
+    def __delitem__(self, key):
+        raise IPCError('Telemetry fields cannot be removed.')
+
+    def __iter__(self):
+        return iter(self.layout)
+
+    def __len__(self):
+        return len(self.layout)
+
+    def close(self):
+        self.shm.close()
+
+    def unlink(self):
+        self.shm.unlink()
+
+class CmdRing:
+    """
+    Single-producer/single-consumer message ring. Each slot holds a
+    connection id and a utf-8 message.
+    """
+    def __init__(self, slots=64, slotSize=4096, name=None, create=False):
+        if slots <= 0 or slots & (slots - 1):
+            raise IPCError('Ring slot count must be a power of 2.')
+
+        self.slots = slots
+        self.slotSize = slotSize
+        self.shm = shared_memory.SharedMemory(name=name, create=create, size=8 + slots*slotSize)
+        self.name = self.shm.name
+        self.idx = self.shm.buf[0:8].cast('I')  # [head, tail], 32-bit aligned stores
+
+        if create:
+            self.idx[0] = 0
+            self.idx[1] = 0
+            # As if every slot was written one lap ago
+            for n in range(slots):
+                MSG_HDR.pack_into(self.shm.buf, 8 + n*slotSize, (n - slots) & 0xFFFFFFFF, 0, 0, 0)
+
+    def put_nowait(self, connId, msg):
+        """
+        Output:
+        - True if the message was queued, False if the ring is full
+        """
+        payload = msg.encode()
+        if len(payload) > self.slotSize - MSG_HDR.size:
+            raise IPCError(f'Message of {len(payload)} bytes does not fit in a {self.slotSize} byte slot.')
+
+        head = self.idx[0]
+        if (head - self.idx[1]) & 0xFFFFFFFF >= self.slots:
+            return False
+
+        offset = 8 + (head % self.slots) * self.slotSize
+        self.shm.buf[offset+MSG_HDR.size:offset+MSG_HDR.size+len(payload)] = payload
+        MSG_HDR.pack_into(self.shm.buf, offset, head, connId, len(payload), zlib.crc32(payload))
+
+        # Publish the slot only after it is filled in
+        self.idx[0] = (head + 1) & 0xFFFFFFFF
+        return True
+
+    def get_nowait(self):
+        """
+        Output:
+        - (connId, msg), or None if the ring is empty
+        """
+        tail = self.idx[1]
+        if tail == self.idx[0]:
+            return None
+
+        offset = 8 + (tail % self.slots) * self.slotSize
+        pos, connId, length, crc = MSG_HDR.unpack_from(self.shm.buf, offset)
+        if pos != tail or length > self.slotSize - MSG_HDR.size:
+            return None  # header not visible yet
+
+        payload = bytes(self.shm.buf[offset+MSG_HDR.size:offset+MSG_HDR.size+length])
+        if zlib.crc32(payload) != crc:
+            return None  # payload not visible yet
+
+        # Hand the slot back only after it has been copied out and checked
+        self.idx[1] = (tail + 1) & 0xFFFFFFFF
+        return connId, payload.decode()
+
+    async def put(self, connId, msg):
+        delay = POLL_MIN
+        while not self.put_nowait(connId, msg):
+            await asyncio.sleep(delay)
+            delay = min(delay*2, POLL_MAX)
+
+    async def get(self):
+        delay = POLL_MIN
+        while True:
+            item = self.get_nowait()
+            if item is not None:
+                return item
+            await asyncio.sleep(delay)
+            delay = min(delay*2, POLL_MAX)
+
+    def close(self):
+        self.idx.release()
+        self.shm.close()
+
+    def unlink(self):
+        self.shm.unlink()
+
+class HardwareBridge:
+    """
+    Runs in the hardware process. Feeds commands from the ring to the
+    Command Handler and sends its responses and UDP messages back.
+    """
+    def __init__(self, cmdRing, xmitRing, udpRing, qCmd, qXmit, qUDP):
+        self.logger = logging.getLogger('smb')
+        self.cmdRing = cmdRing
+        self.xmitRing = xmitRing
+        self.udpRing = udpRing
+        self.qCmd = qCmd
+        self.qXmit = qXmit
+        self.qUDP = qUDP
+
+    async def start(self):
+        await asyncio.gather(self.cmd_loop(), self.xmit_loop(), self.udp_loop())
+
+    async def cmd_loop(self):
+        while True:
+            connId, msg = await self.cmdRing.get()
+            await self.qCmd.put((connId, msg))
+
+    async def xmit_loop(self):
+        while True:
+            connId, msg = await self.qXmit.get()
+            try:
+                await self.xmitRing.put(connId, msg)
+            except IPCError as e:
+                self.logger.error(f'{e}')
+                await self.xmitRing.put(connId, 'BAD,response too long\n')
+
+    async def udp_loop(self):
+        while True:
+            msg = await self.qUDP.get()
+            try:
+                await self.udpRing.put(0, msg)
+            except IPCError as e:
+                self.logger.error(f'{e}')
+
+class NetworkBridge:
+    """
+    Runs in the network process. Tags commands from the TCP Server with a
+    connection id, passes them to the hardware process, and routes the
+    responses back to the right client.
+    """
+    def __init__(self, cmdRing, xmitRing, udpRing, qCmd, qXmit, qUDP):
+        self.logger = logging.getLogger('smb')
+        self.cmdRing = cmdRing
+        self.xmitRing = xmitRing
+        self.udpRing = udpRing
+        self.qCmd = qCmd
+        self.qXmit = qXmit
+        self.qUDP = qUDP
+        self.conns = {}  # connection id -> (writer, answered callback or None)
+        self.ids = {}    # writer -> connection id
+        self.nextId = 1
+
+    async def start(self):
+        await asyncio.gather(self.cmd_loop(), self.xmit_loop(), self.udp_loop())
+
+    async def cmd_loop(self):
+        while True:
+            item = await self.qCmd.get()
+            writer = item[0]
+            msg = item[1]
+            answered = item[2] if len(item) > 2 else None
+
+            # Forget connections that have gone away
+            for connId in [c for c, (w, a) in self.conns.items() if w.is_closing()]:
+                del self.ids[self.conns.pop(connId)[0]]
+
+            # One id per connection, for as long as it is open
+            connId = self.ids.get(writer)
+            if connId is None:
+                connId = self.nextId
+                self.nextId = (self.nextId % 0xFFFFFFFF) + 1
+                self.ids[writer] = connId
+                self.conns[connId] = (writer, answered)
+
+            try:
+                await self.cmdRing.put(connId, msg)
+            except IPCError as e:
+                self.logger.error(f'{e}')
+                await self.qXmit.put((writer, 'BAD,command too long\n'))
+                if answered is not None:
+                    answered()
+
+    async def xmit_loop(self):
+        while True:
+            connId, msg = await self.xmitRing.get()
+            conn = self.conns.get(connId)
+            if conn is not None:
+                writer, answered = conn
+                await self.qXmit.put((writer, msg))
+                if answered is not None:
+                    answered()
+
+    async def udp_loop(self):
+        while True:
+            connId, msg = await self.udpRing.get()
+            await self.qUDP.put(msg)
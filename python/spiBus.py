@@ -0,0 +1,267 @@
+# spiBus.py
+# 10/17/2026
+# Aidan Gray
+# aidan.gray@idg.jhu.edu
+#
+# SPI transports shared by the AD7124 (SPI0) and DAC8775 (SPI1) drivers.
+# Both move bytes only, chip selection stays on the GPIO mux (io.adc_sel,
+# nADC_SYNC, nDAC_MSS, nDAC_SSA0/1) and is done by the drivers.
+#
+# BitBangSPI drives the pins from Python. Bytes are shifted MSB first with
+# the clock idling high. The bit pattern of every byte value is computed
+# once at import, so the inner loops only index a table, and MOSI is only
+# written when the next bit differs from the level already on the pin.
+# There is no delay between edges. A single GPIO call takes longer than
+# any of the AD7124/DAC8775 setup and hold times, so padding the
+# transactions with time.sleep() only added a syscall per transfer.
+#
+# GpiomemSPI is the same engine writing the GPSET0/GPCLR0 registers of
+# the gpiomem backend directly (see gpioBackend.py). On the ADC writes
+# the falling clock edge and a falling MOSI go out in one store. The
+# stores are still several bytecodes apart, which on the Pi is longer
+# than the AD7124's 100ns minimum SCLK high and low times.
+#
+# SpidevSPI hands the bytes to the kernel's hardware SPI driver instead.
+# The chip select line the driver owns is not used, so the overlays have
+# to put it on a pin the board does not use, e.g. in config.txt:
+#
+#   dtoverlay=spi0-1cs,cs0_pin=8
+#   dtoverlay=spi1-1cs,cs0_pin=15
+
+import logging
+import RPi.GPIO as GPIO
+
+from gpioBackend import GPSET0, GPCLR0, GPLEV0
+
+SPI_TRANSPORTS = ('bitbang', 'spidev')
+ADC_SPI_MODE = 3          # AD7124: clock idles high, data latched on the rising edge
+DAC_SPI_MODE = 2          # DAC8775: clock idles high, data latched on the falling edge
+ADC_SPI_HZ = 4000000      # AD7124 allows up to 5MHz
+DAC_SPI_HZ = 10000000     # DAC8775 allows up to 25MHz
+
+# BYTE_BITS[b] = bits of b, MSB first
+BYTE_BITS = tuple(tuple((b >> (7-i)) & 1 for i in range(8)) for b in range(256))
+
+class SPIError(IOError):
+    pass
+
+class BitBangSPI:
+    def __init__(self, mosi, miso, sclk, mosiLevel=None, gpio=GPIO):
+        """
+        Input:
+        - mosi, miso, sclk: BCM pin numbers, already set up by GPIO_config
+        - mosiLevel:        level MOSI was left at, None if unknown
+        - gpio:             anything with output(pin, level) and input(pin),
+                            RPi.GPIO or a gpioBackend backend
+        """
+        self.mosi = mosi
+        self.miso = miso
+        self.sclk = sclk
+        self.mosiLevel = mosiLevel
+        self.gpio = gpio
+
+    def write(self, data):
+        """
+        Shift data out, ignoring MISO. Each bit is set up while SCLK is
+        low and latched on the rising edge (AD7124).
+
+        Input:
+        - data: bytes
+        """
+        output = self.gpio.output
+        mosi = self.mosi
+        sclk = self.sclk
+        level = self.mosiLevel
+
+        for byte in data:
+            for bit in BYTE_BITS[byte]:
+                output(sclk, 0)
+                if bit != level:
+                    output(mosi, bit)
+                    level = bit
+                output(sclk, 1)
+
+        self.mosiLevel = level
+
+    def read(self, size):
+        """
+        Clock in size bytes with MOSI left where it is. MISO is sampled
+        while SCLK is low (AD7124).
+
+        Output:
+        - bytes
+        """
+        output = self.gpio.output
+        read = self.gpio.input
+        miso = self.miso
+        sclk = self.sclk
+        readBytes = bytearray(size)
+
+        for n in range(size):
+            byte = 0
+            for i in range(8):
+                output(sclk, 0)
+                byte = (byte << 1) | read(miso)
+                output(sclk, 1)
+            readBytes[n] = byte
+
+        return bytes(readBytes)
+
+    def transfer(self, data):
+        """
+        Full duplex: each bit is put on MOSI before the falling edge and
+        MISO is sampled while SCLK is low (DAC8775).
+
+        Input:
+        - data: bytes
+
+        Output:
+        - bytes read, same length as data
+        """
+        output = self.gpio.output
+        read = self.gpio.input
+        mosi = self.mosi
+        miso = self.miso
+        sclk = self.sclk
+        level = self.mosiLevel
+        readBytes = bytearray(len(data))
+
+        for n, byte in enumerate(data):
+            readByte = 0
+            for bit in BYTE_BITS[byte]:
+                if bit != level:
+                    output(mosi, bit)
+                    level = bit
+                output(sclk, 0)
+                readByte = (readByte << 1) | read(miso)
+                output(sclk, 1)
+            readBytes[n] = readByte
+
+        self.mosiLevel = level
+        return bytes(readBytes)
+
+    def set_clock(self, level):
+        self.gpio.output(self.sclk, level)
+
+class GpiomemSPI(BitBangSPI):
+    def __init__(self, mosi, miso, sclk, mosiLevel=None, gpio=None):
+        """
+        Input:
+        - gpio: gpioBackend.Gpiomem, the pins must be in bank 0
+        """
+        super().__init__(mosi, miso, sclk, mosiLevel, gpio)
+        self.regs = gpio.regs
+        self.mosiMask = 1 << mosi
+        self.sclkMask = 1 << sclk
+
+    def write(self, data):
+        regs = self.regs
+        mosiMask = self.mosiMask
+        sclkMask = self.sclkMask
+        bothMask = mosiMask | sclkMask
+        level = self.mosiLevel
+
+        for byte in data:
+            for bit in BYTE_BITS[byte]:
+                if bit == level:
+                    regs[GPCLR0] = sclkMask
+                elif bit:
+                    regs[GPCLR0] = sclkMask
+                    regs[GPSET0] = mosiMask
+                    level = 1
+                else:
+                    regs[GPCLR0] = bothMask  # SCLK and MOSI low together
+                    level = 0
+                regs[GPSET0] = sclkMask
+
+        self.mosiLevel = level
+
+    def read(self, size):
+        regs = self.regs
+        miso = self.miso
+        sclkMask = self.sclkMask
+        readBytes = bytearray(size)
+
+        for n in range(size):
+            byte = 0
+            for i in range(8):
+                regs[GPCLR0] = sclkMask
+                byte = (byte << 1) | ((regs[GPLEV0] >> miso) & 1)
+                regs[GPSET0] = sclkMask
+            readBytes[n] = byte
+
+        return bytes(readBytes)
+
+    def transfer(self, data):
+        # MOSI has to settle before the falling edge here, so it always
+        # gets its own store
+        regs = self.regs
+        miso = self.miso
+        mosiMask = self.mosiMask
+        sclkMask = self.sclkMask
+        level = self.mosiLevel
+        readBytes = bytearray(len(data))
+
+        for n, byte in enumerate(data):
+            readByte = 0
+            for bit in BYTE_BITS[byte]:
+                if bit != level:
+                    regs[GPSET0 if bit else GPCLR0] = mosiMask
+                    level = bit
+                regs[GPCLR0] = sclkMask
+                readByte = (readByte << 1) | ((regs[GPLEV0] >> miso) & 1)
+                regs[GPSET0] = sclkMask
+            readBytes[n] = readByte
+
+        self.mosiLevel = level
+        return bytes(readBytes)
+
+    def set_clock(self, level):
+        self.regs[GPSET0 if level else GPCLR0] = self.sclkMask
+
+class SpidevSPI:
+    def __init__(self, bus, device, mode, speed):
+        """
+        Input:
+        - bus, device: /dev/spidev<bus>.<device>
+        - mode:        SPI mode (0-3)
+        - speed:       SCLK frequency in Hz
+        """
+        try:
+            import spidev
+        except ImportError:
+            raise SPIError('The spidev transport needs the spidev package (pip3 install spidev).')
+
+        self.logger = logging.getLogger('smb')
+        self.dev = spidev.SpiDev()
+
+        try:
+            self.dev.open(bus, device)
+        except OSError as e:
+            raise SPIError(f'Failed to open /dev/spidev{bus}.{device}: {e}')
+
+        self.dev.mode = mode
+        self.dev.max_speed_hz = speed
+
+        try:
+            self.dev.no_cs = True
+        except OSError:
+            # Not every controller supports SPI_NO_CS, the overlay keeps
+            # its chip select off the board's pins anyway
+            self.logger.warning(f'/dev/spidev{bus}.{device} does not support no_cs')
+
+    def write(self, data):
+        self.dev.writebytes2(data)
+
+    def read(self, size):
+        return bytes(self.dev.readbytes(size))
+
+    def transfer(self, data):
+        return bytes(self.dev.xfer2(list(data)))
+
+    def set_clock(self, level):
+        # SCLK belongs to the SPI controller
+        pass
+
+    def close(self):
+        self.dev.close()
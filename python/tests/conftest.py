@@ -0,0 +1,35 @@
+# conftest.py
+# 10/17/2026
+# Aidan Gray
+# aidan.gray@idg.jhu.edu
+#
+# Lets the tests import the board modules off the Pi. The modules are in
+# the parent directory, and RPi.GPIO is replaced by a module that only
+# remembers pin levels when it is not installed.
+
+import os
+import sys
+import types
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+try:
+    import RPi.GPIO
+except ImportError:
+    GPIO = types.ModuleType('RPi.GPIO')
+    GPIO.BCM = 11
+    GPIO.IN = 1
+    GPIO.OUT = 0
+    GPIO.PUD_UP = 22
+    GPIO.levels = {}
+    GPIO.setmode = lambda mode: None
+    GPIO.setwarnings = lambda flag: None
+    GPIO.setup = lambda pin, direction, **kwargs: None
+    GPIO.cleanup = lambda *args: None
+    GPIO.output = lambda pin, level: GPIO.levels.__setitem__(pin, level)
+    GPIO.input = lambda pin: GPIO.levels.get(pin, 0)
+
+    RPi = types.ModuleType('RPi')
+    RPi.GPIO = GPIO
+    sys.modules['RPi'] = RPi
+    sys.modules['RPi.GPIO'] = GPIO
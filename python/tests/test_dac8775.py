@@ -0,0 +1,98 @@
+# test_dac8775.py
+# 10/17/2026
+# Aidan Gray
+# aidan.gray@idg.jhu.edu
+#
+# DAC8775 channel code shadow against a fake SPI1 bus. The bus records the
+# register writes and can be told to fail, and the io counts nLDAC pulses.
+
+import struct
+
+import pytest
+
+from DAC8775 import DAC, latch
+
+class FakeBus:
+    def __init__(self):
+        self.writes = []        # (register, data)
+        self.failAfter = None   # writes left before one fails
+
+    def set_clock(self, level):
+        pass
+
+    def transfer(self, data):
+        if self.failAfter is not None:
+            if self.failAfter == 0:
+                raise IOError('SPI1 transfer failed')
+            self.failAfter -= 1
+        self.writes.append((data[0], int.from_bytes(data[1:3], byteorder='big')))
+        return bytes(len(data))
+
+class FakeIO:
+    def __init__(self):
+        self.spi1 = FakeBus()
+        self.pin_map = {'nDAC_MSS': 8}
+        self.loads = 0
+
+    def output(self, pin, level, force=False):
+        pass
+
+    def dac_sel(self, idx):
+        pass
+
+    def dac_load(self):
+        self.loads += 1
+
+class DACEeprom:
+    def __init__(self):
+        mem = bytearray(48)
+        mem[20:24] = struct.pack('>f', 300.0)   # HTR_RES, mode left 0
+        self.DACmem = [mem] * 4
+
+@pytest.fixture
+def dac():
+    io = FakeIO()
+    dac = DAC(0, io, DACEeprom(), {})
+    io.spi1.writes.clear()
+    io.loads = 0
+    return dac
+
+def data_writes(dac):
+    return [data for reg, data in dac.spi.writes if reg == 0x05]
+
+def test_unchanged_code_skipped(dac):
+    # mode 0 at start up wrote and latched 0 to every channel
+    assert dac.codes == [0, 0, 0, 0]
+    assert not dac.write_control_var(0, load=False)
+    assert dac.spi.writes == []
+
+    assert dac.write_control_var(0.05, load=False)
+    assert dac.codes == [0, 0, 0, 0]
+    latch(dac.io, [dac])
+    assert dac.codes == dac.buffered
+    assert dac.io.loads == 1
+
+def test_unlatched_code_latched_again(dac):
+    # Staged but the latch never came, e.g. the task was cancelled
+    assert dac.write_control_var(0.05, load=False)
+    writes = len(dac.spi.writes)
+
+    # The buffers already hold the code, only the latch is still owed
+    assert dac.write_control_var(0.05, load=False)
+    assert len(dac.spi.writes) == writes
+    assert dac.write_control_var(0.05) is False
+    assert dac.io.loads == 1
+    assert not dac.write_control_var(0.05, load=False)
+
+def test_failed_write_retried(dac):
+    dac.spi.failAfter = 1
+    with pytest.raises(IOError):
+        dac.write_control_var(0.05, load=False)
+    assert dac.buffered[:2] == [None, None]      # A and B share the failed write
+
+    dac.spi.failAfter = None
+    dac.write_control_var(0.05)
+    assert data_writes(dac)
+    assert dac.io.loads == 1
+    assert dac.codes == dac.buffered
+    assert None not in dac.codes
@@ -0,0 +1,122 @@
+# test_gpiod.py
+# 10/17/2026
+# Aidan Gray
+# aidan.gray@idg.jhu.edu
+#
+# Gpiod against an in-process fake of the libgpiod v1 bindings.
+
+import sys
+import types
+
+import pytest
+
+from gpioBackend import Gpiod, GPIOBackendError, open_backend, CONSUMER
+
+class FakeLines:
+    def __init__(self, chip, offsets):
+        self.chip = chip
+        self.offsets = offsets
+        self.requested = None
+        self.released = False
+        self.calls = []
+
+    def request(self, consumer, type, default_vals):
+        busy = self.chip.busy.intersection(self.offsets)
+        if busy:
+            raise OSError(16, 'Device or resource busy')
+        self.requested = {'consumer': consumer, 'type': type, 'default_vals': default_vals}
+
+    def set_values(self, values):
+        assert isinstance(values, list)
+        self.calls.append(values)
+
+    def release(self):
+        self.released = True
+
+class FakeChip:
+    def __init__(self, name):
+        if name == 'missing':
+            raise FileNotFoundError(2, 'No such file or directory')
+        self.name = name
+        self.busy = set()
+        self.lines = []
+        self.closed = False
+
+    def get_lines(self, offsets):
+        assert isinstance(offsets, list)
+        lines = FakeLines(self, offsets)
+        self.lines.append(lines)
+        return lines
+
+    def close(self):
+        self.closed = True
+
+@pytest.fixture
+def gpiod(monkeypatch):
+    module = types.ModuleType('gpiod')
+    module.LINE_REQ_DIR_OUT = 3
+    module.Chip = FakeChip
+    monkeypatch.setitem(sys.modules, 'gpiod', module)
+    return module
+
+def test_group_request(gpiod):
+    backend = open_backend('gpiod')
+    assert backend.name == 'gpiod'
+    assert backend.bulk
+    assert backend.chip.name == 'gpiochip0'
+
+    backend.group((5, 6, 13, 19, 26), (1, 1, 1, 1, 1))
+    lines = backend.chip.lines[0]
+    assert lines.offsets == [5, 6, 13, 19, 26]
+    assert lines.requested == {'consumer': CONSUMER, 'type': gpiod.LINE_REQ_DIR_OUT, 'default_vals': [1, 1, 1, 1, 1]}
+
+    backend.group((22, 23), (0, 0))
+    assert backend.chip.lines[1].requested['default_vals'] == [0, 0]
+
+def test_set_levels_one_bulk_call(gpiod):
+    backend = Gpiod('gpiochip0')
+    setLevels = backend.group((5, 6, 13), (1, 1, 1))
+    lines = backend.chip.lines[0]
+
+    setLevels((0, 1, 0))
+    assert lines.calls == [[0, 1, 0]]
+
+    setLevels((1, 1, 1))
+    assert lines.calls == [[0, 1, 0], [1, 1, 1]]
+
+def test_request_busy(gpiod):
+    backend = Gpiod('gpiochip0')
+    backend.chip.busy.add(6)
+    with pytest.raises(GPIOBackendError, match=r'Failed to request GPIO lines \(5, 6\)'):
+        backend.group((5, 6), (1, 1))
+
+def test_close_releases(gpiod):
+    backend = Gpiod('gpiochip0')
+    backend.group((5, 6), (1, 1))
+    backend.group((22, 23), (0, 0))
+    chip = backend.chip
+    backend.close()
+
+    assert all(lines.released for lines in chip.lines)
+    assert chip.closed
+    assert backend.requests == []
+
+def test_single_pins_stay_on_rpigpio(gpiod):
+    import RPi.GPIO as GPIO
+    backend = Gpiod('gpiochip0')
+    assert backend.output is GPIO.output
+    assert backend.input is GPIO.input
+
+def test_open_failure(gpiod):
+    with pytest.raises(GPIOBackendError, match='Failed to open missing'):
+        Gpiod('missing')
+
+def test_needs_v1_bindings(gpiod):
+    del gpiod.LINE_REQ_DIR_OUT
+    with pytest.raises(GPIOBackendError, match='v1'):
+        Gpiod('gpiochip0')
+
+def test_missing_bindings(monkeypatch):
+    monkeypatch.setitem(sys.modules, 'gpiod', None)
+    with pytest.raises(GPIOBackendError, match='libgpiod'):
+        Gpiod('gpiochip0')
@@ -0,0 +1,114 @@
+# test_gpiomem.py
+# 10/17/2026
+# Aidan Gray
+# aidan.gray@idg.jhu.edu
+#
+# Gpiomem against a temporary 4 KiB file standing in for the GPIO
+# register block.
+
+import struct
+
+import pytest
+
+from gpioBackend import (Gpiomem, GPIOBackendError, open_backend, BLOCK_SIZE,
+                         GPFSEL0, GPSET0, GPCLR0, GPLEV0, FSEL_INPUT, FSEL_OUTPUT)
+
+def read_reg(path, reg):
+    with open(path, 'rb') as f:
+        f.seek(reg * 4)
+        return struct.unpack('<I', f.read(4))[0]
+
+def write_reg(path, reg, value):
+    with open(path, 'r+b') as f:
+        f.seek(reg * 4)
+        f.write(struct.pack('<I', value))
+
+def set_function(path, pin, fsel):
+    reg = GPFSEL0 + pin // 10
+    shift = (pin % 10) * 3
+    value = read_reg(path, reg) & ~(0b111 << shift)
+    write_reg(path, reg, value | (fsel << shift))
+
+@pytest.fixture
+def block(tmp_path):
+    path = tmp_path / 'gpiomem'
+    path.write_bytes(bytes(BLOCK_SIZE))
+    return path
+
+@pytest.fixture
+def gpio(block):
+    backend = open_backend('gpiomem', str(block))
+    yield backend
+    backend.close()
+
+def test_output_set_clear(gpio, block):
+    gpio.output(17, 1)
+    assert read_reg(block, GPSET0) == 1 << 17
+    assert read_reg(block, GPCLR0) == 0
+
+    gpio.output(4, 0)
+    assert read_reg(block, GPCLR0) == 1 << 4
+    assert read_reg(block, GPSET0) == 1 << 17
+
+def test_output_many_masks(gpio, block):
+    gpio.output_many((5, 6, 13, 19), (1, 0, 1, 0))
+    assert read_reg(block, GPSET0) == (1 << 5) | (1 << 13)
+    assert read_reg(block, GPCLR0) == (1 << 6) | (1 << 19)
+
+def test_output_many_one_direction(gpio, block):
+    # A register with no pin going that way is not stored to
+    write_reg(block, GPCLR0, 0xDEADBEEF)
+    gpio.output_many((2, 3), (1, 1))
+    assert read_reg(block, GPSET0) == (1 << 2) | (1 << 3)
+    assert read_reg(block, GPCLR0) == 0xDEADBEEF
+
+def test_input(gpio, block):
+    write_reg(block, GPLEV0, (1 << 9) | (1 << 31))
+    assert gpio.input(9) == 1
+    assert gpio.input(10) == 0
+    assert gpio.input(31) == 1
+
+def test_group_writes_through_registers(gpio, block):
+    setLevels = gpio.group((22, 23), (1, 1))
+    setLevels((0, 1))
+    assert read_reg(block, GPCLR0) == 1 << 22
+    assert read_reg(block, GPSET0) == 1 << 23
+
+def test_function(gpio, block):
+    set_function(block, 0, FSEL_OUTPUT)
+    set_function(block, 11, FSEL_OUTPUT)
+    set_function(block, 29, 0b100)      # ALT0
+    assert gpio.function(0) == FSEL_OUTPUT
+    assert gpio.function(11) == FSEL_OUTPUT
+    assert gpio.function(12) == FSEL_INPUT
+    assert gpio.function(29) == 0b100
+
+def test_check_ok(gpio, block):
+    for pin in (5, 6, 26):
+        set_function(block, pin, FSEL_OUTPUT)
+    gpio.check(outputs=(5, 6, 26), inputs=(9, 19))
+
+def test_check_not_output(gpio, block):
+    set_function(block, 5, FSEL_OUTPUT)
+    with pytest.raises(GPIOBackendError, match='GPIO6 is not configured as an output'):
+        gpio.check(outputs=(5, 6))
+
+def test_check_not_input(gpio, block):
+    set_function(block, 9, 0b100)       # SPI0_MISO left on ALT0
+    with pytest.raises(GPIOBackendError, match='GPIO9 is not configured as an input'):
+        gpio.check(inputs=(9,))
+
+def test_check_bank_0_only(gpio, block):
+    with pytest.raises(GPIOBackendError, match='GPIO32 is not in bank 0'):
+        gpio.check(outputs=(32,))
+    with pytest.raises(GPIOBackendError, match='GPIO40 is not in bank 0'):
+        gpio.check(inputs=(40,))
+
+def test_map_failure(tmp_path):
+    path = tmp_path / 'short'
+    path.write_bytes(bytes(16))
+    with pytest.raises(GPIOBackendError, match='Failed to map'):
+        Gpiomem(str(path))
+
+    with pytest.raises(GPIOBackendError, match='Failed to map'):
+        Gpiomem(str(tmp_path / 'missing'))
@@ -0,0 +1,175 @@
+# test_heaters.py
+# 10/17/2026
+# Aidan Gray
+# aidan.gray@idg.jhu.edu
+#
+# The heater and PID tasks of CMDLoop with stand-in DACs and ADCs. The
+# stand-ins log what reaches the SPI1 bus, so the tests can check how the
+# tasks stage and latch the DAC codes.
+
+import asyncio
+import time
+
+import pytest
+
+import Gbl
+from cmdHandler import CMDLoop
+
+class StubIO:
+    def __init__(self, log):
+        self.log = log
+
+    def output(self, pin, level, force=False):
+        pass
+
+    def dac_load(self):
+        self.log.append('load')
+
+class StubADC:
+    def __init__(self, idx):
+        self.idx = idx
+        self.sns_units = 0
+        self.interval = 0.0
+        self.ready = True
+        self.reads = 0
+
+    def get_sns_units(self):
+        return self.sns_units
+
+    def get_temperature(self):
+        self.reads += 1
+        return 100.0
+
+    def settling_time(self):
+        return self.interval
+
+    def sample_interval(self):
+        return self.interval
+
+    def sample_ready(self):
+        return self.ready
+
+class StubDAC:
+    def __init__(self, idx, log, mode=0):
+        self.idx = idx
+        self.log = log
+        self.sns_num = idx + 1
+        self.mode = mode
+        self.htr_res = 100.0
+        self.max_current = 0.02
+        self.setPoint = 110.0
+        self.max_temp = 200.0
+        self.min_temp = 0.0
+        self.kp = 1.0
+        self.ki = 0.0
+        self.kd = 0.0
+        self.pid_rate = 0
+        self.power = 0.0
+        self.controlVar = 0.0
+
+    def write_control_var(self, cv, load=True):
+        # Long enough for the other task to get a request in between
+        time.sleep(0.005)
+        self.log.append(f'dac{self.idx+1}')
+        return True
+
+    def fp_update(self, load=True):
+        return self.write_control_var(0.01, load=load)
+
+    def set_current_update(self, load=True):
+        return self.write_control_var(self.controlVar, load=load)
+
+    def power_update(self, power, load=True):
+        return self.write_control_var(power, load=load)
+
+    def latched(self):
+        pass
+
+def make_loop(dacModes, **kwargs):
+    log = []
+    tlm = dict(Gbl.telemetry)
+    dacs = [StubDAC(n, log, mode) for n, mode in enumerate(dacModes)]
+    adcs = [StubADC(n) for n in range(12)]
+    for n in range(12):
+        tlm[f'sns_temp_{n+1}'] = 100.0
+    cmdLoop = CMDLoop(asyncio.Queue(), asyncio.Queue(), None, tlm, {}, StubIO(log), None, None,
+                      [], dacs, adcs, **kwargs)
+    return cmdLoop, log
+
+def test_tasks_latch_their_own_codes():
+    # DAC 1 is driven by the heater task, DAC 2 by the PID task
+    cmdLoop, log = make_loop([1, 2])
+
+    async def run():
+        await cmdLoop.pid_update()      # starts the loop
+        cmdLoop.pid.lastTime[:] -= 10   # and makes it due
+        log.clear()
+        await asyncio.gather(cmdLoop.heater_update(), cmdLoop.pid_update())
+
+    asyncio.run(run())
+
+    # Each task's codes are staged and latched with nothing in between
+    assert sorted([log[0:2], log[2:4]]) == [['dac1', 'load'], ['dac2', 'load']]
+
+def test_pid_rate_limited_by_sensor():
+    cmdLoop, log = make_loop([2, 0])
+    dac = cmdLoop.dacList[0]
+    adc = cmdLoop.adcList[0]
+
+    dac.pid_rate = 20
+    cmdLoop.update_pid_period()
+    assert cmdLoop.scheduler.get_period('pid') == pytest.approx(0.05)
+
+    # A single conversion filter that settles in 0.427s
+    adc.interval = 0.427
+    cmdLoop.update_pid_period()
+    assert cmdLoop.pid_period(dac) == pytest.approx(0.427)
+    assert cmdLoop.scheduler.get_period('pid') == pytest.approx(0.427)
+
+def test_fast_pid_reads_settled_samples_only():
+    cmdLoop, log = make_loop([2, 0], sensorPeriod=1.0)
+    dac = cmdLoop.dacList[0]
+    adc = cmdLoop.adcList[0]
+    dac.pid_rate = 10
+
+    async def step():
+        cmdLoop.pid.lastTime[:] -= 10
+        await cmdLoop.pid_update()
+
+    asyncio.run(step())
+    assert adc.reads == 1
+
+    # The sample read above has not settled, the scanned value is used
+    adc.ready = False
+    cmdLoop.tlm['sns_temp_1'] = 105.0
+    asyncio.run(step())
+    assert adc.reads == 1
+    assert cmdLoop.pid.prevPv[0] == pytest.approx(105.0)
+
+def test_tripped_dac_not_staged(monkeypatch):
+    cmdLoop, log = make_loop([1, 0])
+    dac = cmdLoop.dacList[0]
+
+    # Tripped after the heater task checked the DAC
+    cmdLoop.interlock.trips[dac] = 'max_temp'
+    monkeypatch.setattr(cmdLoop.interlock, 'is_tripped', lambda htr: False)
+    asyncio.run(cmdLoop.heater_update())
+    assert log == []
+
+    cmdLoop.interlock.clear(dac)
+    asyncio.run(cmdLoop.heater_update())
+    assert log == ['dac1', 'load']
+
+def test_interlock_period_stretched():
+    cmdLoop, log = make_loop([1, 0])
+    interlock = cmdLoop.interlock
+    assert interlock.checkPeriod == pytest.approx(0.1)
+
+    cmdLoop.adcList[0].interval = 0.427
+    interlock.check()
+    assert interlock.checkPeriod == pytest.approx(0.427)
+    assert not interlock.trips
+
+    cmdLoop.dacList[0].mode = 0
+    interlock.check()
+    assert interlock.checkPeriod == pytest.approx(0.1)
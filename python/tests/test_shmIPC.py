@@ -0,0 +1,68 @@
+# test_shmIPC.py
+# 10/17/2026
+# Aidan Gray
+# aidan.gray@idg.jhu.edu
+#
+# CmdRing across a fork and with slots whose contents are not visible
+# yet, as the consumer can see them on a weakly ordered CPU.
+
+import multiprocessing
+import zlib
+
+import pytest
+
+from shmIPC import CmdRing, MSG_HDR
+
+@pytest.fixture
+def ring():
+    ring = CmdRing(slots=8, slotSize=256, create=True)
+    yield ring
+    ring.close()
+    ring.unlink()
+
+def test_order_and_full(ring):
+    for n in range(8):
+        assert ring.put_nowait(n, f'msg{n}')
+    assert not ring.put_nowait(8, 'full')
+
+    assert [ring.get_nowait() for n in range(8)] == [(n, f'msg{n}') for n in range(8)]
+    assert ring.get_nowait() is None
+
+def test_index_wraps(ring):
+    ring.idx[0] = ring.idx[1] = 0xFFFFFFFE
+    for n in range(4):
+        assert ring.put_nowait(n, 'x' * n)
+    assert [ring.get_nowait() for n in range(4)] == [(n, 'x' * n) for n in range(4)]
+    assert ring.idx[1] == 2
+
+def test_slot_not_visible_yet(ring):
+    # The head store is seen before the slot it covers
+    ring.idx[0] = 1
+    assert ring.get_nowait() is None
+    assert ring.idx[1] == 0
+
+    # Header seen, payload not yet
+    payload = b'OK,sns_temp=77.0'
+    MSG_HDR.pack_into(ring.shm.buf, 8, 0, 5, len(payload), zlib.crc32(payload))
+    assert ring.get_nowait() is None
+    assert ring.idx[1] == 0
+
+    ring.shm.buf[8+MSG_HDR.size:8+MSG_HDR.size+len(payload)] = payload
+    assert ring.get_nowait() == (5, payload.decode())
+
+def test_fork(ring):
+    def produce(n):
+        for i in range(n):
+            while not ring.put_nowait(i, f'msg{i}' * (i % 20 + 1)):
+                pass
+
+    proc = multiprocessing.get_context('fork').Process(target=produce, args=(200,))
+    proc.start()
+    got = []
+    while len(got) < 200:
+        item = ring.get_nowait()
+        if item is not None:
+            got.append(item)
+    proc.join()
+
+    assert got == [(i, f'msg{i}' * (i % 20 + 1)) for i in range(200)]
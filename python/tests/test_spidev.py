@@ -0,0 +1,256 @@
+# test_spidev.py
+# 10/17/2026
+# Aidan Gray
+# aidan.gray@idg.jhu.edu
+#
+# SpidevSPI against a fake spidev module. The fake device answers like an
+# AD7124: the first byte of a frame is the communications register, a
+# read returns the register's bytes and a write stores them. Chip select
+# is on the GPIO mux, so a frame may be split over several calls, as the
+# AD7124 driver does with write() then read(). The last tests run the
+# AD7124 driver itself over the fake.
+
+import logging
+import sys
+import types
+
+import pytest
+
+import Gbl
+from AD7124 import AD7124, SHADOWED_REGS
+from spiBus import SpidevSPI, SPIError, ADC_SPI_MODE, DAC_SPI_MODE, ADC_SPI_HZ, DAC_SPI_HZ
+
+# AD7124 register sizes in bytes, by address
+REG_SIZES = {0x00: 1, 0x01: 2, 0x02: 3, 0x03: 3, 0x04: 2, 0x05: 1, 0x06: 3, 0x07: 3, 0x08: 1}
+REG_SIZES.update({addr: 2 for addr in range(0x09, 0x21)})   # CHANNEL_0-15, CONFIG_0-7
+REG_SIZES.update({addr: 3 for addr in range(0x21, 0x39)})   # FILTER, OFFSET, GAIN 0-7
+AD7124_ID = 0x14
+
+class FakeSpiDev:
+    noCsSupported = True
+    openError = None
+    devices = []
+
+    def __init__(self):
+        self.regs = {addr: 0 for addr in REG_SIZES}
+        self.regs[0x05] = AD7124_ID
+        self.frame = []         # bytes of the frame in progress
+        self.xfers = []
+        self.mode = 0
+        self.max_speed_hz = 0
+        self.opened = None
+        self.closed = False
+        self.__no_cs = False
+        FakeSpiDev.devices.append(self)
+
+    @property
+    def no_cs(self):
+        return self.__no_cs
+
+    @no_cs.setter
+    def no_cs(self, flag):
+        if not self.noCsSupported:
+            raise OSError(22, 'Invalid argument')
+        self.__no_cs = flag
+
+    def open(self, bus, device):
+        if self.openError:
+            raise self.openError
+        self.opened = (bus, device)
+
+    def close(self):
+        self.closed = True
+
+    def clock(self, byte):
+        """
+        Shift one byte in and return the byte shifted out.
+        """
+        self.frame.append(byte)
+        addr = self.frame[0] & 0x3F
+        read = self.frame[0] & 0x40
+        size = REG_SIZES[addr]
+
+        if len(self.frame) == 1:
+            out = 0
+        elif read:
+            out = self.regs[addr].to_bytes(size, byteorder='big')[len(self.frame) - 2]
+        else:
+            out = 0
+
+        if len(self.frame) == size + 1:
+            if not read:
+                self.regs[addr] = int.from_bytes(bytes(self.frame[1:]), byteorder='big')
+            self.frame = []
+        return out
+
+    def writebytes2(self, data):
+        for byte in data:
+            self.clock(byte)
+
+    def readbytes(self, size):
+        return [self.clock(0) for n in range(size)]
+
+    def xfer2(self, data):
+        assert isinstance(data, list)
+        self.xfers.append(list(data))
+        return [self.clock(byte) for byte in data]
+
+@pytest.fixture
+def spidev(monkeypatch):
+    module = types.ModuleType('spidev')
+    module.SpiDev = FakeSpiDev
+    monkeypatch.setitem(sys.modules, 'spidev', module)
+    monkeypatch.setattr(FakeSpiDev, 'devices', [])
+    monkeypatch.setattr(FakeSpiDev, 'noCsSupported', True)
+    monkeypatch.setattr(FakeSpiDev, 'openError', None)
+    return FakeSpiDev
+
+def test_adc_settings(spidev):
+    spi = SpidevSPI(0, 0, ADC_SPI_MODE, ADC_SPI_HZ)
+    dev = spi.dev
+    assert dev.opened == (0, 0)
+    assert dev.mode == 3
+    assert dev.max_speed_hz == ADC_SPI_HZ
+    assert dev.no_cs is True
+
+def test_dac_settings(spidev):
+    spi = SpidevSPI(1, 0, DAC_SPI_MODE, DAC_SPI_HZ)
+    dev = spi.dev
+    assert dev.opened == (1, 0)
+    assert dev.mode == 2
+    assert dev.max_speed_hz == DAC_SPI_HZ
+    assert dev.no_cs is True
+
+def test_no_cs_unsupported(spidev, caplog):
+    spidev.noCsSupported = False
+    with caplog.at_level(logging.WARNING, logger='smb'):
+        spi = SpidevSPI(0, 0, ADC_SPI_MODE, ADC_SPI_HZ)
+
+    assert 'no_cs' in caplog.text
+    assert spi.dev.mode == 3
+    spi.write(bytes([0x45]))
+    assert spi.read(1) == bytes([AD7124_ID])
+
+def test_open_failure(spidev):
+    spidev.openError = FileNotFoundError(2, 'No such file or directory')
+    with pytest.raises(SPIError, match='spidev0.0'):
+        SpidevSPI(0, 0, ADC_SPI_MODE, ADC_SPI_HZ)
+
+def test_missing_spidev(monkeypatch):
+    monkeypatch.setitem(sys.modules, 'spidev', None)
+    with pytest.raises(SPIError, match='spidev package'):
+        SpidevSPI(0, 0, ADC_SPI_MODE, ADC_SPI_HZ)
+
+def test_read_id_split_frame(spidev):
+    # What AD7124.__adc_read_data does: communications byte, then read
+    spi = SpidevSPI(0, 0, ADC_SPI_MODE, ADC_SPI_HZ)
+    spi.write(bytes([0x40 | 0x05]))
+    data = spi.read(1)
+    assert isinstance(data, bytes)
+    assert data == bytes([AD7124_ID])
+
+def test_write_read_back(spidev):
+    spi = SpidevSPI(0, 0, ADC_SPI_MODE, ADC_SPI_HZ)
+    spi.write(bytes([0x01, 0x05, 0x80]))          # ADC_CONTROL
+    spi.write(bytes([0x21, 0x06, 0x00, 0x60]))    # FILTER_0
+    assert spi.dev.regs[0x01] == 0x0580
+
+    spi.write(bytes([0x41]))
+    assert spi.read(2) == bytes([0x05, 0x80])
+    spi.write(bytes([0x61]))
+    assert spi.read(3) == bytes([0x06, 0x00, 0x60])
+
+def test_transfer_full_duplex(spidev):
+    spi = SpidevSPI(0, 0, ADC_SPI_MODE, ADC_SPI_HZ)
+    spi.transfer(bytes([0x03, 0x00, 0x05, 0x13]))   # IO_CONTROL_1
+    ret = spi.transfer(bytes([0x43, 0x00, 0x00, 0x00]))
+
+    assert isinstance(ret, bytes)
+    assert ret == bytes([0x00, 0x00, 0x05, 0x13])
+    assert spi.dev.xfers == [[0x03, 0x00, 0x05, 0x13], [0x43, 0x00, 0x00, 0x00]]
+
+def test_set_clock_and_close(spidev):
+    spi = SpidevSPI(1, 0, DAC_SPI_MODE, DAC_SPI_HZ)
+    spi.set_clock(0)
+    spi.set_clock(1)
+    assert spi.dev.xfers == []
+    spi.close()
+    assert spi.dev.closed
+
+class ADCBoardIO:
+    """
+    The parts of GPIO_config.io the AD7124 driver uses, with the fake
+    device as the ADC bus.
+    """
+    def __init__(self, spi):
+        self.spi0 = spi
+        self.pin_map = {'nADC_SYNC': 27}
+        self.selected = []
+
+    def output(self, pin, level, force=False):
+        pass
+
+    def adc_sel(self, idx):
+        self.selected.append(idx)
+
+class ADCEeprom:
+    def __init__(self, sns_type):
+        mem = bytearray(85)
+        mem[38] = sns_type      # SNS_TYPE, units and cal mode left 0
+        self.ADCmem = [mem] * 12
+
+def make_adc(sns_type=0):
+    spi = SpidevSPI(0, 0, ADC_SPI_MODE, ADC_SPI_HZ)
+    io = ADCBoardIO(spi)
+    adc = AD7124(3, io, ADCEeprom(sns_type), {}, Gbl.sensor_cal)
+    return adc, spi.dev, io
+
+def test_ad7124_loads_registers(spidev):
+    adc, dev, io = make_adc(sns_type=2)
+    assert set(io.selected) == {3}
+    for name in SHADOWED_REGS:
+        addr, data, size = adc.AD7124_reg_dict[name]
+        assert dev.regs[addr] == data
+    assert adc.verify() == []
+
+def test_ad7124_id(spidev):
+    adc, dev, io = make_adc()
+    assert adc.get_ID() == AD7124_ID
+
+def test_ad7124_single_conversion(spidev):
+    adc, dev, io = make_adc()
+    dev.regs[0x02] = 0x123456
+    dev.regs[0x01] = 0xFFFF
+
+    # A single conversion read restarts the next one
+    assert adc.get_DATA() == 0x123456
+    assert dev.regs[0x01] == adc.adc_control
+    assert dev.frame == []
+
+def test_ad7124_temperature(spidev):
+    adc, dev, io = make_adc(sns_type=2)      # PT-100 4-wire
+    dev.regs[0x02] = 0x0B0000
+    res = (0x0B0000 * 0.98) / (2**24 * 0.000250) / 16
+    temp = adc.get_temperature()
+
+    assert adc.tlm['sns_res_4'] == pytest.approx(res)
+    assert temp == pytest.approx(adc.calib_fit.calib_t(res))
+    assert 0 < temp < 400
+
+def test_ad7124_unsettled_read_not_restarted(spidev):
+    adc, dev, io = make_adc()
+    dev.regs[0x02] = 0x111111
+    assert adc.get_DATA() == 0x111111
+
+    # Read again before the restarted conversion settled: the chip would
+    # return the same sample, and writing ADC_CONTROL would restart it
+    dev.regs[0x02] = 0x222222
+    dev.regs[0x01] = 0xFFFF
+    assert not adc.sample_ready()
+    assert adc.get_DATA() == 0x111111
+    assert dev.regs[0x01] == 0xFFFF
+
+    adc.lastRead -= adc.sample_interval()
+    assert adc.sample_ready()
+    assert adc.get_DATA() == 0x222222
+    assert dev.regs[0x01] == adc.adc_control
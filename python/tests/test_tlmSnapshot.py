@@ -0,0 +1,53 @@
+# test_tlmSnapshot.py
+# 10/17/2026
+# Aidan Gray
+# aidan.gray@idg.jhu.edu
+#
+# TLMWriter publishing the live telemetry and versioning it for
+# '$get,tlm_since'.
+
+from tlmSnapshot import TelemetryDict, TLMWriter, read_snapshot
+
+def make_writer():
+    tlm = TelemetryDict({'tlm_seq': 0, 'sns_temp_1': 0.0, 'hipwr_current_1': 0.0})
+    return tlm, TLMWriter(tlm)
+
+def test_task_writes_published_when_it_finishes():
+    tlm, writer = make_writer()
+    with writer.updating():
+        tlm['sns_temp_1'] = 20.5
+        assert writer.published['sns_temp_1'] == 0.0
+
+    assert writer.published['sns_temp_1'] == 20.5
+    assert read_snapshot(writer.published)['sns_temp_1'] == 20.5
+    assert writer.version == 1
+    assert writer.since(0) == (1, {'sns_temp_1': 20.5, 'hipwr_current_1': 0.0})
+
+def test_unchanged_commit_keeps_version():
+    tlm, writer = make_writer()
+    with writer.updating():
+        tlm['sns_temp_1'] = 20.5
+    seq = writer.published['tlm_seq']
+
+    # e.g. the current task reading the same value again
+    for n in range(10):
+        with writer.updating():
+            tlm['hipwr_current_1'] = 0.0
+        with writer.updating():
+            pass
+
+    assert writer.published['tlm_seq'] == seq
+    assert writer.since(writer.version) == (1, {})
+
+    with writer.updating():
+        tlm['hipwr_current_1'] = 0.25
+    assert writer.since(1) == (2, {'hipwr_current_1': 0.25})
+
+def test_loose_writes_published_with_next_commit():
+    tlm, writer = make_writer()
+    tlm['sns_temp_1'] = 4.0     # outside any task
+    with writer.updating():
+        pass
+
+    assert writer.published['sns_temp_1'] == 4.0
+    assert not tlm.loose
@@ -0,0 +1,124 @@
+# tlmPublisher.py
+# 10/17/2026
+# Aidan Gray
+# aidan.gray@idg.jhu.edu
+#
+# Telemetry subscriptions for the TCP Server. '$set,subscribe,<fields>,<period>'
+# makes the server push a 'TLM,field=value,...' line to the connection
+# every period seconds, '$set,unsubscribe' stops it. <fields> is 'all' or
+# a space separated list of field prefixes, e.g. 'sns_temp env'.
+#
+# Connections asking for the same fields at the same period share one
+# task, which formats each snapshot once and puts the same bytes on the
+# Transmit Queue for every subscriber. The task is cancelled when its
+# last subscriber leaves.
+
+import asyncio
+import logging
+import time
+from CMD_DICT import cmd_set_dict
+from cmdHandler import compile_validator, CmdArgError, SET_RANGE_MSGS
+from tlmSnapshot import read_snapshot
+
+SNAPSHOT_RETRY = 0.005  # seconds between tries while a scan is updating tlm
+
+class TLMPublisher:
+    def __init__(self, tlm, qXmit):
+        self.logger = logging.getLogger('smb')
+        self.tlm = tlm
+        self.qXmit = qXmit
+        self.groups = {}  # (prefixes, period) -> [task, set of writers]
+        self.subs = {}    # writer -> (prefixes, period)
+        self.validate = compile_validator(cmd_set_dict['subscribe'], 2, SET_RANGE_MSGS)
+
+    def is_command(self, rawCmd):
+        cmdStr = rawCmd.strip()
+        return cmdStr == '$set,unsubscribe' or cmdStr.startswith('$set,subscribe,')
+
+    def parse_command(self, writer, rawCmd):
+        """
+        Handle a subscription command sent on its own line.
+
+        Output:
+        - the response string, or None if rawCmd is not a subscription
+          command
+        """
+        cmdStr = rawCmd.strip()
+
+        if cmdStr == '$set,unsubscribe':
+            self.unsubscribe(writer)
+            return 'OK'
+
+        if not cmdStr.startswith('$set,subscribe,'):
+            return None
+
+        try:
+            fields, period = self.validate(cmdStr[15:].split(','))
+        except CmdArgError as e:
+            return f'BAD,{e}'
+        except ValueError as e:
+            return f'BAD,command failure: expected args float or int = {e}'
+
+        if fields == 'all':
+            prefixes = ('',)
+        else:
+            prefixes = tuple(sorted(set(fields.split())))
+
+        if not any(key.startswith(prefixes) for key in self.tlm):
+            return f'BAD,command failure: no telemetry fields match {fields!r}'
+
+        self.subscribe(writer, prefixes, period)
+        return 'OK'
+
+    def subscribe(self, writer, prefixes, period):
+        # One subscription per connection, a new one replaces the old one
+        self.unsubscribe(writer)
+
+        key = (prefixes, period)
+        if key not in self.groups:
+            self.groups[key] = [asyncio.create_task(self.publish(key)), set()]
+
+        self.groups[key][1].add(writer)
+        self.subs[writer] = key
+        self.logger.info(f'subscribed {writer.get_extra_info("peername")!r} to {prefixes!r} every {period}s')
+
+    def unsubscribe(self, writer):
+        key = self.subs.pop(writer, None)
+        if key is None:
+            return
+
+        task, writers = self.groups[key]
+        writers.discard(writer)
+
+        if not writers:
+            task.cancel()
+            del self.groups[key]
+
+    async def publish(self, key):
+        prefixes, period = key
+        writers = self.groups[key][1]
+        nextTime = time.perf_counter()
+
+        while True:
+            data = read_snapshot(self.tlm)
+            while data is None:
+                await asyncio.sleep(SNAPSHOT_RETRY)
+                data = read_snapshot(self.tlm)
+
+            fields = ','.join([f'{k}={v}' for k, v in data.items() if k.startswith(prefixes)])
+            msg = ('TLM,'+fields+'\n').encode()
+
+            for writer in list(writers):
+                if writer.is_closing():
+                    self.unsubscribe(writer)
+                else:
+                    self.qXmit.put_nowait((writer, msg))
+
+            nextTime += period
+            delay = nextTime - time.perf_counter()
+
+            if delay < 0:
+                nextTime = time.perf_counter()
+                delay = 0
+
+            await asyncio.sleep(delay)
@@ -0,0 +1,200 @@
+# tlmSnapshot.py
+# 10/17/2026
+# Aidan Gray
+# aidan.gray@idg.jhu.edu
+#
+# Consistent copies of the Telemetry dictionary. The drivers write into
+# the live telemetry, a TelemetryDict that remembers which fields each
+# periodic task wrote. The tasks wrap their work in TLMWriter.updating(),
+# and when one finishes, the writer copies just the fields it wrote into
+# the published telemetry that readers use. A task that is still running
+# never holds up readers, and the fields it has written so far stay
+# unpublished until it finishes.
+#
+# The published copy keeps 'tlm_seq' odd while a commit is copying
+# fields into it. A reader copies it only when the sequence number is
+# even and unchanged across the copy. Commits run on the event loop and
+# never yield, so this only matters for the shared memory copy that the
+# network process reads with --split. A commit that changes any field
+# also bumps the version (tlm_seq // 2) and tags those fields with it, for
+# '$get,tlm_since,<version>'. A commit that changes nothing leaves the
+# version alone, so clients polling tlm_since see when nothing happened.
+
+import asyncio
+import contextvars
+import json
+import logging
+from contextlib import contextmanager
+
+SEQ_KEY = 'tlm_seq'
+TLM_FORMATS = ('csv', 'json')
+
+# Fields written by the task running in this context, None outside
+# TLMWriter.updating(). BusWorker.run carries it to the bus threads.
+jobWrites = contextvars.ContextVar('jobWrites', default=None)
+
+class SnapshotError(ValueError):
+    pass
+
+class TelemetryDict(dict):
+    """
+    Live telemetry. Every write is recorded against the task that made
+    it, or in loose if it was made outside any task (set commands, the
+    interlock thread).
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.loose = set()
+
+    def __setitem__(self, key, val):
+        dict.__setitem__(self, key, val)
+        writes = jobWrites.get()
+        if writes is None:
+            writes = self.loose
+        writes.add(key)
+
+def read_snapshot(tlm):
+    """
+    Copy published telemetry if no commit is in progress.
+
+    Output:
+    - dict, or None if a commit is in progress or one started during
+      the copy
+    """
+    seq = tlm[SEQ_KEY]
+    if seq & 1:
+        return None
+
+    data = dict(tlm)
+    if tlm[SEQ_KEY] != seq:
+        return None
+
+    return data
+
+def format_tlm(data, p1=None, p2=None):
+    """
+    Format a snapshot for '$get,tlm[,prefix][,csv|json]'.
+
+    Input:
+    - data: snapshot from read_snapshot()
+    - p1:   field prefix, or the format if p2 is None
+    - p2:   format, 'csv' (default) or 'json'
+
+    Output:
+    - 'field=value,...' or a JSON object
+    """
+    if p2 is None and p1 in TLM_FORMATS:
+        prefix, fmt = None, p1
+    else:
+        prefix, fmt = p1, p2 or 'csv'
+
+    if fmt not in TLM_FORMATS:
+        raise SnapshotError(f'unknown format {fmt!r}, must be csv or json')
+
+    if prefix:
+        data = {key: val for key, val in data.items() if key.startswith(prefix)}
+        if not data:
+            raise SnapshotError(f'no telemetry fields match {prefix!r}')
+
+    if fmt == 'json':
+        return json.dumps(data, separators=(',', ':'))
+    else:
+        return ','.join([f'{key}={val}' for key, val in data.items()])
+
+class TLMWriter:
+    """
+    Publishes the live telemetry written by the tasks on one event loop.
+    Updates may overlap, each one is published when it finishes.
+    """
+    def __init__(self, tlm, published=None):
+        """
+        Input:
+        - tlm:       live telemetry. A plain mapping works too, but then
+                     every commit publishes every field that changed.
+        - published: mapping the readers use, e.g. the shared memory
+                     block. A copy of tlm if None.
+        """
+        self.logger = logging.getLogger('smb')
+        self.tlm = tlm
+        self.published = dict(tlm) if published is None else published
+
+        for key, val in tlm.items():
+            if key != SEQ_KEY:
+                self.published[key] = val
+
+        self.version = self.published[SEQ_KEY] // 2
+        self.last = dict(self.published)         # values as of the last commit
+        self.versions = {key: 0 for key in tlm if key != SEQ_KEY}  # field -> version that last changed it
+
+    @contextmanager
+    def updating(self):
+        writes = set()
+        token = jobWrites.set(writes)
+
+        try:
+            yield
+        finally:
+            jobWrites.reset(token)
+            self.commit(writes)
+
+    def commit(self, keys=()):
+        """
+        Publish the fields in keys, and any written outside a task since
+        the last commit, and tag the ones that changed with a new version.
+        Nothing is published, and the version stays, if none changed.
+        """
+        loose = getattr(self.tlm, 'loose', None)
+        if loose is None:
+            keys = self.tlm.keys()
+        else:
+            keys = set(keys)
+            # pop() is atomic, a field added meanwhile waits for the next commit
+            while loose:
+                keys.add(loose.pop())
+
+        changed = {}
+        for key in keys:
+            val = self.tlm[key]
+            if key in self.versions and self.last[key] != val:
+                changed[key] = val
+
+        if not changed:
+            return
+
+        published = self.published
+        published[SEQ_KEY] += 1
+        for key, val in changed.items():
+            published[key] = val
+        published[SEQ_KEY] += 1
+
+        self.version = published[SEQ_KEY] // 2
+        for key, val in changed.items():
+            self.last[key] = val
+            self.versions[key] = self.version
+
+    def since(self, version):
+        """
+        Input:
+        - version: last version the client has seen. 0, or a version newer
+                   than the current one (e.g. after a restart), returns every
+                   field.
+
+        Output:
+        - (current version, {field: value} changed after version)
+        """
+        if version == 0 or version > self.version:
+            version = -1
+
+        changed = {key: self.last[key] for key, ver in self.versions.items() if ver > version}
+        return self.version, changed
+
+    async def snapshot(self):
+        """
+        Copy the published telemetry. Commits on this loop never leave it
+        part way, so this only retries if another process is writing it.
+        """
+        while True:
+            data = read_snapshot(self.published)
+            if data is not None:
+                return data
+            await asyncio.sleep(0)
@@ -0,0 +1,85 @@
+# benchADC.py
+# 10/17/2026
+# Aidan Gray
+# aidan.gray@idg.jhu.edu
+#
+# AD7124 sampling benchmark, run on the board with the SMB service
+# stopped. For each conversion mode it reports samples/second reading
+# one channel back to back, and per channel over a full 12 channel scan.
+# Single-shot reads do not wait for the conversion they restarted, so
+# past the conversion rate their samples are stale. The driver returns
+# such a read without a bus transfer, which is bypassed here to time the
+# transfers. Continuous reads only return fresh conversions.
+#
+# It then times switching the timed ADC between two sensor types and
+# back, and restores its original type.
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+def read(adc):
+    # As if the last read was long ago, so single mode goes to the bus
+    adc.lastRead = 0.0
+    adc.get_DATA()
+
+def run(opts):
+    import GPIO_config
+    import Gbl
+    from EEPROM import EEPROM
+    from AD7124 import AD7124, CONVERSION_MODES
+
+    eeprom = EEPROM(reset=False)
+    pins = GPIO_config.io(spi=opts.spi, gpio=opts.gpio)
+    tlm = dict(Gbl.telemetry)
+    adcList = [AD7124(i, pins, eeprom, tlm, Gbl.sensor_cal) for i in range(12)]
+
+    print(f'{"mode":10s} {"case":10s} {"per second":>10s}')
+    for mode in CONVERSION_MODES:
+        for adc in adcList:
+            adc.set_conversion_mode(mode)
+
+        adc = adcList[opts.channel - 1]
+        read(adc)
+        t0 = time.perf_counter()
+        for n in range(opts.number):
+            read(adc)
+        single = opts.number / (time.perf_counter() - t0)
+
+        t0 = time.perf_counter()
+        for n in range(opts.number):
+            for adc in adcList:
+                read(adc)
+        scan = opts.number / (time.perf_counter() - t0)
+
+        print(f'{mode:10s} {"channel":10s} {single:10.1f}')
+        print(f'{mode:10s} {"scan":10s} {scan:10.1f}')
+
+    for adc in adcList:
+        adc.set_conversion_mode('single')
+
+    # a PT-100 2-wire <-> PT-1000 4-wire switch changes both IO_CONTROL_1
+    # and CONFIG_0
+    adc = adcList[opts.channel - 1]
+    snsType = adc.get_sns_type()
+    t0 = time.perf_counter()
+    for n in range(opts.number):
+        adc.set_sns_type(1)
+        adc.set_sns_type(4)
+    reconfig = 2 * opts.number / (time.perf_counter() - t0)
+    adc.set_sns_type(snsType)
+
+    print(f'{"":10s} {"sns_type":10s} {reconfig:10.1f}')
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--number', type=int, default=50, help='samples (or scans) per case')
+    parser.add_argument('--channel', type=int, default=1, choices=range(1, 13), help='ADC timed on its own')
+    parser.add_argument('--spi', type=str, default='bitbang', help='SPI transport, as for main.py')
+    parser.add_argument('--gpio', type=str, default='rpigpio', help='GPIO backend, as for main.py')
+    opts = parser.parse_args()
+
+    run(opts)
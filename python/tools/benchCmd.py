@@ -0,0 +1,134 @@
+#!/usr/local/bin/python3.8
+# benchCmd.py
+# 10/17/2026
+# Aidan Gray
+# aidan.gray@idg.jhu.edu
+#
+# Command Handler throughput benchmark. Runs a mix of set and get commands
+# through CMDLoop.parse_raw_command with stand-in hardware objects, so it
+# only measures parsing, range checking and dispatch. Pass --handler to
+# time a different copy of cmdHandler.py, e.g. an older revision:
+#
+#   git show <rev>:python/cmdHandler.py > /tmp/cmdHandler_old.py
+#   python3 tools/benchCmd.py --handler /tmp/cmdHandler_old.py
+
+import argparse
+import asyncio
+import importlib.util
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import Gbl
+
+# Spread over the whole command table, including the ones at the end of
+# the old if/elif chains. Commands that touch a bus or the eeprom are left
+# out since the stand-ins have no hardware behind them.
+CMDS = ['$get,id',
+        '$get,sns_temp,5',
+        '$get,env,all',
+        '$get,dac_setpoint,2',
+        '$get,dac_d,1',
+        '$get,hipwr_state,1',
+        '$get,hipwr_hysteresis,1',
+        '$get,hipwr_min_temp,2',
+        '$get,sns_type,7',
+        '$get,sns_units,12',
+        '$set,dac_setpoint,1,25.5',
+        '$set,dac_p,2,10',
+        '$set,dac_d,1,0.5',
+        '$set,hipwr_hysteresis,1,2',
+        '$set,hipwr_max_temp,2,80',
+        '$set,hipwr_min_temp,2,-80',
+        '$set,dac_lcs,1,0',
+        '$set,sns_units,3,K',
+        '$set,dac_fp,3,0.5',     # out of range
+        '$set,dac_mode,1,x']     # not a number
+
+class StubADC:
+    def __init__(self, idx):
+        self.idx = idx
+        self.sns_units = 0
+        self.sns_type = 1
+
+    def set_sns_units(self, sns_units):
+        self.sns_units = sns_units
+
+    def get_sns_units(self):
+        return self.sns_units
+
+    def settling_time(self):
+        return 0.0
+
+    def sample_interval(self):
+        return 0.0
+
+class StubHeater:
+    def __init__(self, idx):
+        self.idx = idx
+        self.sns_num = 0
+        self.mode = 0
+        self.htr_res = 0
+        self.setPoint = 0.0
+        self.max_temp = 0.0
+        self.min_temp = 0.0
+        self.hysteresis = 0.0
+        self.state = 0
+        self.kp = 0
+        self.ki = 0
+        self.kd = 0
+        self.pid_rate = 0
+
+    def status(self):
+        return self.state
+
+class StubIO:
+    issued = 0
+    skipped = 0
+
+    def output(self, pin, level, force=False):
+        pass
+
+    def dac_load(self):
+        pass
+
+def load_handler(path):
+    spec = importlib.util.spec_from_file_location('cmdHandler_bench', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+async def bench(opts):
+    module = load_handler(opts.handler)
+    tlm = dict(Gbl.telemetry)
+
+    cmdLoop = module.CMDLoop(asyncio.Queue(), asyncio.Queue(), None, tlm, {}, StubIO(), None, None,
+                             [StubHeater(0), StubHeater(1)],
+                             [StubHeater(0), StubHeater(1)],
+                             [StubADC(n) for n in range(12)])
+
+    best = 0
+    for rep in range(opts.repeat):
+        t0 = time.perf_counter()
+        for n in range(opts.number):
+            await cmdLoop.parse_raw_command(CMDS[n % len(CMDS)])
+        rate = opts.number / (time.perf_counter() - t0)
+        best = max(best, rate)
+
+    print(f'{opts.handler}: {best:,.0f} commands/s (best of {opts.repeat} x {opts.number})')
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--handler', type=str, default=os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'cmdHandler.py'),
+                        help='cmdHandler.py file to benchmark')
+    parser.add_argument('--number', type=int, default=100000, help='commands per repeat')
+    parser.add_argument('--repeat', type=int, default=5, help='number of repeats')
+    opts = parser.parse_args()
+
+    # Errors are expected for the out of range command
+    logging.getLogger('smb').setLevel(logging.CRITICAL)
+
+    asyncio.run(bench(opts))
@@ -0,0 +1,117 @@
+#!/usr/local/bin/python3.8
+# benchGPIO.py
+# 10/17/2026
+# Aidan Gray
+# aidan.gray@idg.jhu.edu
+#
+# GPIO backend benchmark. Reports pin toggles/second through RPi.GPIO,
+# through the gpiomem backend's output() and through raw GPSET0/GPCLR0
+# stores, plus ADC select and SPI write rates for each backend (gpiod is
+# included when its bindings are installed). On the board it toggles
+# SPI0_SCLK with every ADC bank deselected. --mem FILE
+# maps a plain file instead of /dev/gpiomem to time the Python side on
+# any machine (RPi.GPIO is not timed then).
+
+import argparse
+import os
+import sys
+import time
+import types
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+SCLK = 11
+ADC_SEL_PINS = (16, 27, 22, 7, 24)
+SPI0_PINS = (10, 9, 11)  # MOSI, MISO, SCLK
+
+def rate(func, count, number, repeat):
+    best = 0
+    for rep in range(repeat):
+        t0 = time.perf_counter()
+        for n in range(number):
+            func()
+        best = max(best, count * number / (time.perf_counter() - t0))
+    return best
+
+def cases(gpio):
+    """
+    Output:
+    - list of (name, unit, items per call, function)
+    """
+    output = gpio.output
+
+    def toggle():
+        output(SCLK, 0)
+        output(SCLK, 1)
+
+    select = gpio.group(ADC_SEL_PINS, (1, 1, 1, 1, 1))
+
+    def adc_sel():
+        select((1, 0, 1, 1, 0))
+        select((1, 1, 1, 1, 1))
+
+    result = [('output()', 'toggles/s', 2, toggle), ('adc_sel', 'selects/s', 2, adc_sel)]
+
+    if gpio.name == 'gpiomem':
+        from gpioBackend import GPSET0, GPCLR0
+        regs = gpio.regs
+        mask = 1 << SCLK
+
+        def store():
+            regs[GPCLR0] = mask
+            regs[GPSET0] = mask
+
+        result.insert(1, ('store', 'toggles/s', 2, store))
+        from spiBus import GpiomemSPI as engine
+    else:
+        from spiBus import BitBangSPI as engine
+
+    spi = engine(*SPI0_PINS, mosiLevel=0, gpio=gpio)
+    result.append(('spi write', 'bytes/s', 4, lambda: spi.write(b'\x21\x16\x07\xFF')))
+    return result
+
+def run(opts):
+    backends = []
+
+    if opts.mem:
+        # The pins are never set up here, so RPi.GPIO is not timed. The
+        # backends still import it.
+        try:
+            import RPi.GPIO
+        except ImportError:
+            stub = types.ModuleType('RPi.GPIO')
+            sys.modules['RPi'] = types.ModuleType('RPi')
+            sys.modules['RPi'].GPIO = stub
+            sys.modules['RPi.GPIO'] = stub
+
+        with open(opts.mem, 'ab') as f:
+            f.truncate(max(os.path.getsize(opts.mem), 4096))
+    else:
+        import GPIO_config
+        io = GPIO_config.io()  # leaves every ADC bank and the DAC MSS deselected
+
+    from gpioBackend import open_backend, GPIOBackendError
+
+    if not opts.mem:
+        backends.append(open_backend('rpigpio'))
+    backends.append(open_backend('gpiomem', opts.mem))
+    if not opts.mem:
+        try:
+            backends.append(open_backend('gpiod'))
+        except GPIOBackendError as e:
+            print(f'skipping gpiod: {e}')
+
+    print(f'{"backend":8s} {"case":10s} {"rate":>14s}')
+    for gpio in backends:
+        for name, unit, count, func in cases(gpio):
+            best = rate(func, count, opts.number, opts.repeat)
+            print(f'{gpio.name:8s} {name:10s} {best:14,.0f} {unit}')
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--number', type=int, default=20000, help='calls per repeat')
+    parser.add_argument('--repeat', type=int, default=3, help='number of repeats')
+    parser.add_argument('--mem', type=str, default=None, help='file to map in place of /dev/gpiomem')
+    opts = parser.parse_args()
+
+    run(opts)
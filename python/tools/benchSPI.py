@@ -0,0 +1,176 @@
+#!/usr/local/bin/python3.8
+# benchSPI.py
+# 10/17/2026
+# Aidan Gray
+# aidan.gray@idg.jhu.edu
+#
+# Bit-bang SPI benchmark. Times the three transaction types used by the
+# drivers with the spiBus engine and with the old per-bit loops, and
+# reports bytes/second and GPIO calls per byte. On the board it toggles
+# the real SPI pins with every ADC bank and the DAC MSS deselected, so no
+# device sees the traffic. --sim replaces RPi.GPIO with a call counter
+# to measure the Python overhead alone on any machine. --spidev times the
+# hardware SPI transport instead (the pins then belong to the SPI
+# controllers, so the bit-bang engines are not run).
+
+import argparse
+import os
+import sys
+import time
+import types
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+DELAY = 0.00000000004  # the old AD7124 post-transaction sleep
+
+class SimGPIO(types.ModuleType):
+    """
+    Stand-in for RPi.GPIO that only counts calls.
+    """
+    BCM = OUT = IN = PUD_UP = 0
+
+    def __init__(self):
+        super().__init__('RPi.GPIO')
+        self.calls = 0
+
+    def setmode(self, *args, **kwargs):
+        pass
+
+    def setup(self, *args, **kwargs):
+        pass
+
+    def output(self, pin, val):
+        self.calls += 1
+
+    def input(self, pin):
+        self.calls += 1
+        return 1
+
+class LegacySPI:
+    """
+    The per-bit loops the drivers used before spiBus.
+    """
+    def __init__(self, GPIO, mosi, miso, sclk):
+        self.GPIO = GPIO
+        self.mosi = mosi
+        self.miso = miso
+        self.sclk = sclk
+
+    def write(self, data):
+        GPIO = self.GPIO
+        for writeByte in data:
+            for i in range(8):
+                GPIO.output(self.sclk, 0)
+                if writeByte & 2**(7-i):
+                    GPIO.output(self.mosi, 1)
+                else:
+                    GPIO.output(self.mosi, 0)
+                GPIO.output(self.sclk, 1)
+        GPIO.output(self.sclk, 1)
+
+    def read(self, size):
+        GPIO = self.GPIO
+        returnBytes = bytearray(0)
+        for n in range(size):
+            readByte = 0
+            GPIO.output(self.sclk, 1)
+            for i in range(8):
+                GPIO.output(self.sclk, 0)
+                bitVal = GPIO.input(self.miso)
+                GPIO.output(self.sclk, 1)
+                if bitVal == 1:
+                    readByte = readByte | 2**(7-i)
+            GPIO.output(self.sclk, 1)
+            returnBytes.append(readByte)
+        return bytes(returnBytes)
+
+    def transfer(self, data):
+        GPIO = self.GPIO
+        returnBytes = bytearray(0)
+        for writeByte in data:
+            readByte = 0
+            for i in range(8):
+                if writeByte & 2**(7-i):
+                    GPIO.output(self.mosi, 1)
+                else:
+                    GPIO.output(self.mosi, 0)
+                GPIO.output(self.sclk, 0)
+                bitVal = GPIO.input(self.miso)
+                GPIO.output(self.sclk, 1)
+                if bitVal == 1:
+                    readByte = readByte | 2**(7-i)
+            returnBytes.append(readByte)
+        return bytes(returnBytes)
+
+def transactions(spi0, spi1, sleep):
+    """
+    Output:
+    - list of (name, bytes per transaction, function)
+    """
+    def adc_write():
+        spi0.write(b'\x21\x16\x07\xFF')  # FILTER_0 register write
+        if sleep:
+            time.sleep(DELAY)
+
+    def adc_read():
+        spi0.write(b'\x42')              # DATA register read
+        spi0.read(3)
+        if sleep:
+            time.sleep(DELAY)
+
+    def dac_write():
+        spi1.transfer(b'\x05\x80\x00')   # DAC data register
+
+    return [('adc_write', 4, adc_write), ('adc_read', 4, adc_read), ('dac_write', 3, dac_write)]
+
+def run(opts):
+    if opts.sim:
+        GPIO = SimGPIO()
+        sys.modules['RPi'] = types.ModuleType('RPi')
+        sys.modules['RPi'].GPIO = GPIO
+        sys.modules['RPi.GPIO'] = GPIO
+        pins = {'SPI0_MOSI': 10, 'SPI0_MISO': 9, 'SPI0_SCLK': 11, 'SPI1_MOSI': 20, 'SPI1_MISO': 19, 'SPI1_SCLK': 21}
+    else:
+        import RPi.GPIO as GPIO
+        import GPIO_config
+        io = GPIO_config.io(spi='spidev' if opts.spidev else 'bitbang')  # leaves every ADC bank and the DAC MSS deselected
+        pins = io.pin_map
+
+    from spiBus import BitBangSPI
+
+    if opts.spidev:
+        engines = {'spidev': (io.spi0, io.spi1, False)}
+    else:
+        engines = {
+            'legacy': (LegacySPI(GPIO, pins['SPI0_MOSI'], pins['SPI0_MISO'], pins['SPI0_SCLK']),
+                       LegacySPI(GPIO, pins['SPI1_MOSI'], pins['SPI1_MISO'], pins['SPI1_SCLK']), True),
+            'spiBus': (BitBangSPI(pins['SPI0_MOSI'], pins['SPI0_MISO'], pins['SPI0_SCLK'], mosiLevel=0),
+                       BitBangSPI(pins['SPI1_MOSI'], pins['SPI1_MISO'], pins['SPI1_SCLK'], mosiLevel=0), False),
+        }
+
+    print(f'{"engine":8s} {"transaction":12s} {"bytes/s":>12s} {"GPIO calls/byte":>16s}')
+    for name, (spi0, spi1, sleep) in engines.items():
+        for txName, size, func in transactions(spi0, spi1, sleep):
+            best = 0
+            for rep in range(opts.repeat):
+                calls = getattr(GPIO, 'calls', 0)
+                t0 = time.perf_counter()
+                for n in range(opts.number):
+                    func()
+                rate = size * opts.number / (time.perf_counter() - t0)
+                best = max(best, rate)
+            perByte = (getattr(GPIO, 'calls', 0) - calls) / (size * opts.number) if opts.sim else float('nan')
+            print(f'{name:8s} {txName:12s} {best:12,.0f} {perByte:16.1f}')
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--number', type=int, default=2000, help='transactions per repeat')
+    parser.add_argument('--repeat', type=int, default=3, help='number of repeats')
+    parser.add_argument('--sim', action='store_true', help='count GPIO calls instead of driving the pins')
+    parser.add_argument('--spidev', action='store_true', help='time the hardware SPI transport on the board')
+    opts = parser.parse_args()
+
+    if opts.sim and opts.spidev:
+        parser.error('--spidev needs the board, it cannot be combined with --sim')
+
+    run(opts)
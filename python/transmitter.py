@@ -3,26 +3,124 @@
 # Aidan Gray
 # aidan.gray@idg.jhu.edu
 #
-# The Transmit Loop. It runs in parallel with the Command Handler and 
-# TCP Server loops. It monitors the Transmit Queue for new messages, 
-# then sends out the message to the correct client.
+# The Transmit Loop. It runs in parallel with the Command Handler and
+# TCP Server loops. It monitors the Transmit Queue for new messages,
+# then hands each message to the sending task of the correct client.
+# Messages may be str or already encoded bytes (subscription pushes are
+# encoded once and shared by every subscriber).
+#
+# Every client has its own bounded outgoing queue and sending task, so a
+# slow client only delays itself. Whatever is waiting when the task wakes
+# up is sent with one write() and one drain(). A client whose queue is
+# full either loses its oldest messages ('drop') or is disconnected
+# ('disconnect').
 
+import asyncio
 import logging
+from collections import deque
+
+SLOW_CLIENT_POLICIES = ('drop', 'disconnect')
+
+class TransmitError(ValueError):
+    pass
 
 class Transmitter:
-    def __init__(self, qXmit):
+    def __init__(self, qXmit, maxPending=256, slowClient='drop'):
+        if slowClient not in SLOW_CLIENT_POLICIES:
+            raise TransmitError(f'Invalid slow client policy: {slowClient!r}. Must be one of {SLOW_CLIENT_POLICIES}')
+
         self.logger = logging.getLogger('smb')
         self.qXmit = qXmit
+        self.maxPending = maxPending
+        self.slowClient = slowClient
+        self.clients = {}  # writer -> ClientSender
 
     async def start(self):
         while True:
-            cmd = await self.qXmit.get()  
+            cmd = await self.qXmit.get()
             writer = cmd[0]
             msg = cmd[1]
-            if not writer.is_closing():
-                addr = writer.get_extra_info('peername')
-                self.logger.info(f'sending: {msg!r} to {addr!r}')
-                writer.write(msg.encode())
-                await writer.drain()
-            else:
-                self.logger.warn(f'Warning: peer disconnected')
\ No newline at end of file
+
+            client = self.clients.get(writer)
+            if client is None:
+                if writer.is_closing():
+                    self.logger.warning(f'Warning: peer disconnected')
+                    continue
+                client = ClientSender(self, writer)
+                self.clients[writer] = client
+
+            client.put(msg)
+
+class ClientSender:
+    """
+    Outgoing queue and sending task for one connection.
+    """
+    def __init__(self, transmitter, writer):
+        self.logger = transmitter.logger
+        self.transmitter = transmitter
+        self.writer = writer
+        self.addr = writer.get_extra_info('peername')
+        self.pending = deque()
+        self.ready = asyncio.Event()
+        self.dropped = 0
+        self.task = asyncio.create_task(self.run())
+
+        # Wake the task when the connection goes away so it does not wait
+        # forever on a client that will get no more messages
+        self.closed = asyncio.ensure_future(writer.wait_closed())
+        self.closed.add_done_callback(self.__closed)
+
+    def __closed(self, fut):
+        if not fut.cancelled():
+            fut.exception()
+        self.ready.set()
+
+    def put(self, msg):
+        if self.writer.is_closing():
+            return
+
+        if isinstance(msg, str):
+            msg = msg.encode()
+
+        if len(self.pending) >= self.transmitter.maxPending:
+            if self.transmitter.slowClient == 'disconnect':
+                self.logger.warning(f'{self.addr!r} fell {len(self.pending)} messages behind, disconnecting')
+                self.pending.clear()
+                self.writer.close()
+                self.ready.set()
+                return
+
+            self.pending.popleft()
+            self.dropped += 1
+
+        self.pending.append(msg)
+        self.ready.set()
+
+    async def run(self):
+        try:
+            while True:
+                await self.ready.wait()
+                self.ready.clear()
+
+                if self.writer.is_closing():
+                    self.logger.warning(f'Warning: peer disconnected')
+                    break
+
+                if self.dropped:
+                    self.logger.warning(f'{self.addr!r} is falling behind, dropped {self.dropped} messages')
+                    self.dropped = 0
+
+                data = b''.join(self.pending)
+                self.pending.clear()
+
+                self.logger.info(f'sending: {data!r} to {self.addr!r}')
+                self.writer.write(data)
+                await self.writer.drain()
+
+        except (ConnectionError, OSError) as e:
+            self.logger.warning(f'send to {self.addr!r} failed: {e}')
+            self.writer.close()
+
+        finally:
+            self.closed.cancel()
+            self.transmitter.clients.pop(self.writer, None)